@@ -0,0 +1,216 @@
+import io
+import json
+import os
+import random
+import struct
+import sys
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from os import path, makedirs, utime, walk
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__)))) # Repository root, the benchmarks import the app's own modules
+from organizer_core import getEventDirectory
+from capture_time import MP4_EPOCH_OFFSET
+
+# Synthetic photo libraries in the app's Year/Month/yyyy-MM-dd: Event/CODE_N.ext layout for run_benchmarks.py.
+# Images are real (small) JPEG/PNG/HEIC files with an EXIF capture time, videos are minimal MP4 headers with an mvhd creation time.
+# Same arguments and seed always give the same library, so runs on different commits can be compared
+#
+#   python benchmarks/generate_library.py /tmp/library --files 500000 --years 2018-2025 --events-per-month 4 --formats jpg=70,heic=20,png=5,mp4=5
+#   python benchmarks/generate_library.py /tmp/card --media-location --files 5000
+
+LIBRARY_MARKER_FILE_NAME = "benchmarkLibrary.json" # Generator arguments of an existing library, so it gets reused instead of regenerated
+PAYLOAD_VARIANTS = 8 # Distinct payloads per format; files reuse them so generating 500k files is bound by the file system, not by encoders
+defaultFormatMix = "jpg=70,heic=20,png=5,mp4=5"
+mediaCodes = ["WPPH", "BDAY", "CORP", "FAMI"]
+
+def parseFormatMix(formatMixText):
+    # "jpg=70,heic=20" -> [("jpg", 70.0), ("heic", 20.0)]
+    formatMix = []
+
+    for formatWeight in formatMixText.split(","):
+        mediaFormat, _, weight = formatWeight.partition("=")
+        formatMix.append((mediaFormat.strip().lower().lstrip("."), float(weight or 1)))
+
+    return formatMix
+
+def createImagePayload(mediaFormat, imageSize, captureTime, payloadVariant):
+    from PIL import Image # Only the generator needs Pillow's encoders, the app itself never encodes media
+
+    if mediaFormat in ("heic", "heif"):
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+
+    # Gradient with a per-variant tint compresses like a real photo far better than flat color or noise does
+    gradientImage = Image.linear_gradient("L").resize(imageSize)
+    mediaImage = Image.merge("RGB", (gradientImage, gradientImage.rotate(90 * payloadVariant), Image.new("L", imageSize, 32 * payloadVariant % 256)))
+    mediaExif = Image.Exif()
+    mediaExif[0x0132] = captureTime.strftime("%Y:%m:%d %H:%M:%S") # DateTime
+    mediaExif.get_ifd(0x8769)[0x9003] = captureTime.strftime("%Y:%m:%d %H:%M:%S") # DateTimeOriginal
+    payloadBuffer = io.BytesIO()
+    mediaImage.save(payloadBuffer, {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "heic": "HEIF", "heif": "HEIF"}[mediaFormat], exif=mediaExif.tobytes())
+
+    return payloadBuffer.getvalue()
+
+def createMp4Payload(captureTime):
+    # ftyp + moov/mvhd is all capture_time.readMp4CreationTime() reads; no decoder in the app opens video files
+    creationTime = int(captureTime.timestamp()) + MP4_EPOCH_OFFSET
+    mvhdPayload = struct.pack(">B3xIIII", 0, creationTime, creationTime, 1000, 60_000) + bytes(80)
+    mvhdBox = struct.pack(">I4s", 8 + len(mvhdPayload), b"mvhd") + mvhdPayload
+    moovBox = struct.pack(">I4s", 8 + len(mvhdBox), b"moov") + mvhdBox
+    ftypBox = struct.pack(">I4s4sI4s4s", 24, b"ftyp", b"isom", 512, b"isom", b"mp41")
+
+    return ftypBox + moovBox
+
+def createPayloads(formatMix, imageSize, firstCaptureTime):
+    # {format: [payload bytes]}, every variant with its own capture time
+    mediaPayloads = {}
+
+    for mediaFormat, _ in formatMix:
+        mediaPayloads[mediaFormat] = []
+
+        for payloadVariant in range(PAYLOAD_VARIANTS):
+            captureTime = firstCaptureTime + timedelta(minutes=7 * payloadVariant)
+            mediaPayloads[mediaFormat].append(createMp4Payload(captureTime) if mediaFormat in ("mp4", "mov") else createImagePayload(mediaFormat, imageSize, captureTime, payloadVariant))
+
+    return mediaPayloads
+
+def writeMediaFiles(mediaDirectory, mediaNames, mediaPayloads, firstMediaTime, randomGenerator):
+    makedirs(mediaDirectory, exist_ok=True)
+    writtenBytes = 0
+
+    for mediaNumber, (mediaName, mediaFormat) in enumerate(mediaNames):
+        mediaPayload = randomGenerator.choice(mediaPayloads[mediaFormat])
+
+        with open(f"{mediaDirectory}/{mediaName}", "wb") as mediaFile:
+            mediaFile.write(mediaPayload)
+
+        mediaTime = firstMediaTime + 3 * mediaNumber # Shot a few seconds apart, in name order
+        utime(f"{mediaDirectory}/{mediaName}", (mediaTime, mediaTime))
+        writtenBytes += len(mediaPayload)
+
+    return writtenBytes
+
+def getFormatChooser(formatMix, randomGenerator):
+    mediaFormats = [mediaFormat for mediaFormat, _ in formatMix]
+    formatWeights = [weight for _, weight in formatMix]
+
+    return lambda: randomGenerator.choices(mediaFormats, formatWeights)[0]
+
+def settleDirectoryTimes(rootDirectory, directoryTime):
+    # A library that isn't being written to has old directory mtimes; without this every index would treat them as racy and rescan
+    for currentDirectory, _, _ in walk(rootDirectory, topdown=False):
+        utime(currentDirectory, (directoryTime, directoryTime))
+
+def generateLibrary(libraryDirectory, fileCount, firstYear=2018, lastYear=2025, eventsPerMonth=4, subdirectoryDepth=0, formatMix=None, imageSize=(320, 240), seed=1):
+    randomGenerator = random.Random(seed)
+    formatMix = formatMix or parseFormatMix(defaultFormatMix)
+    chooseFormat = getFormatChooser(formatMix, randomGenerator)
+    mediaPayloads = createPayloads(formatMix, imageSize, datetime(firstYear, 1, 1, 9, 0))
+    eventDates = [(eventYear, eventMonth, 1 + eventNumber * 28 // eventsPerMonth) for eventYear in range(firstYear, lastYear + 1) for eventMonth in range(1, 13) for eventNumber in range(eventsPerMonth)]
+    mediaNumber, writtenBytes = 1, 0
+
+    # Files are spread over the events as evenly as possible, numbers keep counting up across the whole library like the app does
+    for eventIndex, (eventYear, eventMonth, eventDay) in enumerate(eventDates):
+        eventFileCount = fileCount // len(eventDates) + (1 if eventIndex < fileCount % len(eventDates) else 0)
+        mediaCode = randomGenerator.choice(mediaCodes)
+        eventDirectory = getEventDirectory(libraryDirectory, eventYear, eventMonth, eventDay, f"Event {eventIndex + 1}")
+        mediaDirectory = path.join(eventDirectory, *[f"Set {depthLevel + 1}" for depthLevel in range(subdirectoryDepth)]) # Nested card/camera folders some studios keep inside events
+        mediaNames = []
+
+        for _ in range(eventFileCount):
+            mediaFormat = chooseFormat()
+            mediaNames.append((f"{mediaCode}_{mediaNumber}.{mediaFormat}", mediaFormat))
+            mediaNumber += 1
+
+        makedirs(eventDirectory, exist_ok=True)
+        writtenBytes += writeMediaFiles(mediaDirectory, mediaNames, mediaPayloads, datetime(eventYear, eventMonth, eventDay, 10, 0).timestamp(), randomGenerator)
+
+    settleDirectoryTimes(libraryDirectory, time.time() - 86400)
+
+    return {"files": fileCount, "events": len(eventDates), "bytes": writtenBytes}
+
+def generateMediaLocation(mediaLocationDirectory, fileCount, formatMix=None, imageSize=(320, 240), seed=1):
+    # Flat camera card dump: IMG_0001.JPG, IMG_0002.HEIC, ...
+    randomGenerator = random.Random(seed)
+    formatMix = formatMix or parseFormatMix(defaultFormatMix)
+    chooseFormat = getFormatChooser(formatMix, randomGenerator)
+    mediaPayloads = createPayloads(formatMix, imageSize, datetime(2024, 6, 1, 9, 0))
+    mediaNames = []
+
+    for mediaNumber in range(1, fileCount + 1):
+        mediaFormat = chooseFormat()
+        mediaNames.append((f"IMG_{mediaNumber:05d}.{mediaFormat.upper()}", mediaFormat))
+
+    writtenBytes = writeMediaFiles(mediaLocationDirectory, mediaNames, mediaPayloads, datetime(2024, 6, 1, 9, 0).timestamp(), randomGenerator)
+    settleDirectoryTimes(mediaLocationDirectory, time.time() - 86400)
+
+    return {"files": fileCount, "bytes": writtenBytes}
+
+def parseArguments(arguments):
+    argumentParser = ArgumentParser(description="Generate a synthetic photo library (or a flat media location) for the benchmarks.")
+    argumentParser.add_argument("directory", help="Directory to generate into")
+    argumentParser.add_argument("--files", type=int, default=50_000, help="Number of media files")
+    argumentParser.add_argument("--years", default="2018-2025", help="First-last year of the library's events")
+    argumentParser.add_argument("--events-per-month", type=int, default=4)
+    argumentParser.add_argument("--depth", type=int, default=0, help="Extra directory levels inside every event directory")
+    argumentParser.add_argument("--formats", default=defaultFormatMix, help="Format mix as format=weight pairs")
+    argumentParser.add_argument("--image-size", default="320x240", help="Pixel size of the image payloads")
+    argumentParser.add_argument("--seed", type=int, default=1)
+    argumentParser.add_argument("--media-location", action="store_true", help="Generate a flat media location instead of a library")
+
+    return argumentParser.parse_args(arguments)
+
+def getGeneratorSettings(parsedArguments):
+    firstYear, _, lastYear = parsedArguments.years.partition("-")
+    imageWidth, _, imageHeight = parsedArguments.image_size.partition("x")
+
+    return {
+        "files": parsedArguments.files,
+        "firstYear": int(firstYear),
+        "lastYear": int(lastYear or firstYear),
+        "eventsPerMonth": parsedArguments.events_per_month,
+        "depth": parsedArguments.depth,
+        "formats": parsedArguments.formats,
+        "imageSize": [int(imageWidth), int(imageHeight)],
+        "seed": parsedArguments.seed
+    }
+
+def ensureLibrary(libraryDirectory, generatorSettings):
+    # Reuses a library generated with the same settings, anything else gets generated from scratch next to it
+    markerPath = path.join(libraryDirectory, LIBRARY_MARKER_FILE_NAME)
+
+    try:
+        with open(markerPath, "r") as markerFile:
+            if json.load(markerFile) == generatorSettings:
+                return False
+    except (OSError, ValueError):
+        pass
+
+    if path.exists(libraryDirectory) and os.listdir(libraryDirectory):
+        raise SystemExit(f"{libraryDirectory} is not empty and was not generated with these settings")
+
+    generateLibrary(libraryDirectory, generatorSettings["files"], generatorSettings["firstYear"], generatorSettings["lastYear"], generatorSettings["eventsPerMonth"], generatorSettings["depth"], parseFormatMix(generatorSettings["formats"]), tuple(generatorSettings["imageSize"]), generatorSettings["seed"])
+
+    with open(markerPath, "w") as markerFile:
+        json.dump(generatorSettings, markerFile, indent=4)
+
+    settleDirectoryTimes(libraryDirectory, time.time() - 86400) # The marker itself touched the root
+
+    return True
+
+def main(arguments=None):
+    parsedArguments = parseArguments(sys.argv[1:] if arguments is None else arguments)
+    generatorSettings = getGeneratorSettings(parsedArguments)
+    startTime = time.perf_counter()
+
+    if parsedArguments.media_location:
+        generatedSummary = generateMediaLocation(parsedArguments.directory, generatorSettings["files"], parseFormatMix(generatorSettings["formats"]), tuple(generatorSettings["imageSize"]), generatorSettings["seed"])
+    else:
+        generatedSummary = {"generated": ensureLibrary(parsedArguments.directory, generatorSettings), **generatorSettings}
+
+    print(json.dumps({**generatedSummary, "seconds": round(time.perf_counter() - startTime, 3)}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, SUPPRESS
+from datetime import datetime
+from os import path, walk
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__)))) # Repository root, the benchmarks import the app's own modules
+from generate_library import ensureLibrary, generateMediaLocation, getGeneratorSettings, parseFormatMix, defaultFormatMix, LIBRARY_MARKER_FILE_NAME
+from organizer_core import OrganizeJob, supportedImageFormats, eventMonths, getMediaIndex
+from media_snapshot import forgetMediaSnapshot
+from media_index import INDEX_DIRECTORY_NAME, INDEX_FILE_NAME
+from event_catalog import EventCatalog, CATALOG_FILE_NAME
+from rename_journal import getUndoableJournal, undoRenameJournal
+
+# Headless benchmarks of the app's hot paths against a synthetic library (see generate_library.py). Every benchmark runs in its own
+# process so its peak RSS is its own; results are printed (or written with --output) as one JSON document that can be diffed between runs
+#
+#   python benchmarks/run_benchmarks.py --files 500000 --output results.json
+#   python benchmarks/run_benchmarks.py --library /mnt/nas/library --only mediaCountWarm eventCatalogWarm --repeat 5
+#
+# Cold benchmarks delete the app's persistent index first, warm ones reuse what the previous run saved
+
+def getPeakRssMegabytes():
+    try:
+        import resource # Not available on Windows
+    except ImportError:
+        return None
+
+    peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return round(peakRss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) # Bytes on macOS, kilobytes everywhere else
+
+def getLibraryMedia(libraryDirectory, mediaFormats):
+    libraryMedia = []
+
+    for currentDirectory, subdirectories, fileNames in walk(libraryDirectory):
+        subdirectories[:] = sorted(subdirectory for subdirectory in subdirectories if subdirectory != INDEX_DIRECTORY_NAME)
+        libraryMedia.extend(f"{currentDirectory}/{fileName}" for fileName in sorted(fileNames) if fileName.lower().endswith(tuple(mediaFormats)))
+
+    return libraryMedia
+
+def removeIndexFile(libraryDirectory, indexFileName):
+    try:
+        os.remove(path.join(libraryDirectory, INDEX_DIRECTORY_NAME, indexFileName))
+    except FileNotFoundError:
+        pass
+
+def getQtApplication():
+    # Media list and preview benchmarks need Qt's plugins and signals, but never a display
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtGui import QGuiApplication
+
+    return QGuiApplication.instance() or QGuiApplication([])
+
+# Every benchmark does its setup, times only the hot path and returns (files processed, seconds)
+
+def benchmarkMediaCount(benchmarkSettings, isCold):
+    # MediaIndex.reserveMediaNumbers(): media index refresh + count of the whole media root destination every rename plan starts with
+    if isCold:
+        removeIndexFile(benchmarkSettings["library"], INDEX_FILE_NAME)
+    elif not path.exists(path.join(benchmarkSettings["library"], INDEX_DIRECTORY_NAME, INDEX_FILE_NAME)):
+        getMediaIndex(benchmarkSettings["library"]).refresh() # Warm run without a previous cold one
+
+    startTime = time.perf_counter()
+    mediaIndex = getMediaIndex(benchmarkSettings["library"])
+    mediaIndex.refresh()
+    mediaCount = mediaIndex.getMediaCount()
+
+    return mediaCount, time.perf_counter() - startTime
+
+def benchmarkEventCatalog(benchmarkSettings, isCold):
+    # Worker.addEventDirectories(): catalog refresh + the month lookup of every month the calendar can show
+    if isCold:
+        removeIndexFile(benchmarkSettings["library"], CATALOG_FILE_NAME)
+    elif not path.exists(path.join(benchmarkSettings["library"], INDEX_DIRECTORY_NAME, CATALOG_FILE_NAME)):
+        EventCatalog(benchmarkSettings["library"], eventMonths).refresh()
+
+    startTime = time.perf_counter()
+    eventCatalog = EventCatalog(benchmarkSettings["library"], eventMonths)
+    eventCatalog.refresh()
+    eventCount = sum(len(eventCatalog.getEventsInMonth(eventYear, eventMonth)) for eventYear in range(benchmarkSettings["firstYear"], benchmarkSettings["lastYear"] + 1) for eventMonth in range(1, 13))
+
+    return eventCount, time.perf_counter() - startTime
+
+def benchmarkMediaList(benchmarkSettings, mediaOrdering):
+    # Worker.addMediaListItems(): streamed scan of a flat media location into the list model, on one thread so only the work itself is timed
+    getQtApplication()
+    from media_list_model import MediaScanTask, MediaListModel
+    from capture_time import MetadataCache
+
+    mediaLocationDirectory = path.join(benchmarkSettings["scratch"], "mediaList")
+    generateMediaLocation(mediaLocationDirectory, benchmarkSettings["mediaLocationFiles"], parseFormatMix(benchmarkSettings["formats"]), tuple(benchmarkSettings["imageSize"]), benchmarkSettings["seed"])
+    shutil.rmtree(path.join(benchmarkSettings["scratch"], "metadata"), ignore_errors=True)
+    metadataCache = MetadataCache(path.join(benchmarkSettings["scratch"], "metadata")) # Empty, so capture ordering reads every header
+    mediaListModel = MediaListModel()
+    forgetMediaSnapshot(mediaLocationDirectory) # Times the cold listing, not the snapshot of the previous repeat
+    mediaScanTask = MediaScanTask(mediaLocationDirectory, 1, mediaOrdering, metadataCache)
+    mediaScanTask.signals.batchScanned.connect(lambda scanGeneration, mediaBatch: mediaListModel.addMedia(mediaBatch)) # Same thread, so the slot runs right away
+
+    startTime = time.perf_counter()
+    mediaScanTask.run()
+
+    return mediaListModel.rowCount(), time.perf_counter() - startTime
+
+def benchmarkRenameMedia(benchmarkSettings):
+    # Worker.renameMedia(): OrganizeJob from a media location on the library's device into a new event directory, undone again afterwards
+    mediaLocationDirectory = path.join(benchmarkSettings["scratch"], "renameMedia")
+    generateMediaLocation(mediaLocationDirectory, benchmarkSettings["mediaLocationFiles"], parseFormatMix(benchmarkSettings["formats"]), tuple(benchmarkSettings["imageSize"]), benchmarkSettings["seed"])
+    mediaIndex = getMediaIndex(benchmarkSettings["library"])
+    organizeJob = OrganizeJob(mediaLocationDirectory, f"{benchmarkSettings['library']}/1999/January/1999-01-01: Benchmark", "BENCH", mediaIndex)
+    organizeJob.onLog = lambda logMessage: None
+
+    startTime = time.perf_counter()
+    organizeResult = organizeJob.run()
+    renameSeconds = time.perf_counter() - startTime
+
+    # Leaves the library as it was for the next run
+    renameJournal = getUndoableJournal(benchmarkSettings["library"], organizeResult["journal"])
+    undoRenameJournal(renameJournal, onLog=lambda logMessage: None)
+    os.remove(renameJournal.journalPath)
+
+    return len(organizeResult["renamed"]), renameSeconds
+
+def benchmarkPreviewDecode(benchmarkSettings, isCold):
+    # PreviewLoader's decodePreviewImage() over a fixed sample of library images; warm runs hit the preview cache the cold run filled
+    getQtApplication()
+    from preview_cache import PreviewCache
+    from preview_loader import decodePreviewImage
+
+    previewCacheDirectory = path.join(benchmarkSettings["scratch"], "previews")
+
+    if isCold:
+        shutil.rmtree(previewCacheDirectory, ignore_errors=True)
+
+    libraryImages = getLibraryMedia(benchmarkSettings["library"], supportedImageFormats)
+    sampleStep = max(len(libraryImages) // benchmarkSettings["previewSample"], 1)
+    sampledImages = libraryImages[::sampleStep][:benchmarkSettings["previewSample"]]
+    previewCache = PreviewCache(previewCacheDirectory)
+
+    startTime = time.perf_counter()
+    decodedImages = sum(not decodePreviewImage(mediaPath, previewCache, supportedImageFormats).isNull() for mediaPath in sampledImages)
+
+    return decodedImages, time.perf_counter() - startTime
+
+def benchmarkThumbnails(benchmarkSettings):
+    # Contact sheet thumbnails (ThumbnailBatchTask's decodeThumbnail()) over the same sample of library images, without any preview cache
+    getQtApplication()
+    from preview_cache import PreviewCache
+    from thumbnail_loader import decodeThumbnail
+
+    libraryImages = getLibraryMedia(benchmarkSettings["library"], supportedImageFormats)
+    sampleStep = max(len(libraryImages) // benchmarkSettings["previewSample"], 1)
+    sampledImages = libraryImages[::sampleStep][:benchmarkSettings["previewSample"]]
+    previewCache = PreviewCache(path.join(benchmarkSettings["scratch"], "noPreviews"))
+
+    startTime = time.perf_counter()
+    decodedThumbnails = sum(decodeThumbnail(mediaPath, previewCache.getCachedPreviewPath(mediaPath), supportedImageFormats) is not None for mediaPath in sampledImages)
+
+    return decodedThumbnails, time.perf_counter() - startTime
+
+def benchmarkPooledThumbnails(benchmarkSettings):
+    # The same sample in ThumbnailLoader's batches through the decoder processes (PEO_DECODER_PROCESSES sets how many), one thread per process
+    getQtApplication()
+    from concurrent.futures import ThreadPoolExecutor
+    from decode_service import DecodeService
+    from thumbnail_loader import THUMBNAIL_BATCH_SIZE
+
+    libraryImages = getLibraryMedia(benchmarkSettings["library"], supportedImageFormats)
+    sampleStep = max(len(libraryImages) // benchmarkSettings["previewSample"], 1)
+    sampledImages = libraryImages[::sampleStep][:benchmarkSettings["previewSample"]]
+    mediaBatches = [[(mediaPath, None) for mediaPath in sampledImages[batchStart:batchStart + THUMBNAIL_BATCH_SIZE]] for batchStart in range(0, len(sampledImages), THUMBNAIL_BATCH_SIZE)]
+    decodeService = DecodeService()
+
+    for decoderProcess in decodeService.decoderProcesses: # Process start-up is not part of the measurement
+        decoderProcess.start()
+
+    startTime = time.perf_counter()
+
+    with ThreadPoolExecutor(decodeService.getThreadCount()) as batchExecutor:
+        decodedBatches = list(batchExecutor.map(lambda mediaBatch: decodeService.decode("thumbnails", (supportedImageFormats, mediaBatch)) or [], mediaBatches))
+
+    benchmarkSeconds = time.perf_counter() - startTime
+    decodeService.close()
+
+    return sum(mediaImage is not None for decodedBatch in decodedBatches for mediaImage, _ in decodedBatch), benchmarkSeconds
+
+# Launches the GUI the way main.py does in a fresh interpreter and quits once Worker.finishStartup() marked it ready
+coldStartScript = """
+import json, sys
+from instrumentation import startupTimer
+from ui_components import ApplicationWindow
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QTimer
+startupTimer.mark("imported")
+app = QApplication([])
+applicationWindow = ApplicationWindow(app.primaryScreen().geometry())
+applicationWindow.show()
+readyTimer = QTimer()
+readyTimer.timeout.connect(lambda: app.quit() if "ready" in startupTimer.startupMarks else None)
+readyTimer.start(5)
+app.exec()
+print(json.dumps(startupTimer.startupMarks))
+"""
+
+def benchmarkColdStart(benchmarkSettings):
+    # main.py from launch to ready (window painted, media code collection loaded); the interpreter's own startup is not included
+    startupProcess = subprocess.run([sys.executable, "-c", coldStartScript], cwd=path.dirname(path.dirname(path.abspath(__file__))), env={**os.environ, "QT_QPA_PLATFORM": os.environ.get("QT_QPA_PLATFORM", "offscreen")}, capture_output=True, text=True, check=True)
+    startupMarks = json.loads(startupProcess.stdout.strip().splitlines()[-1])
+
+    return 1, startupMarks["ready"] / 1000
+
+hotPathBenchmarks = {
+    "coldStart": benchmarkColdStart,
+    "mediaCountCold": lambda benchmarkSettings: benchmarkMediaCount(benchmarkSettings, True),
+    "mediaCountWarm": lambda benchmarkSettings: benchmarkMediaCount(benchmarkSettings, False),
+    "eventCatalogCold": lambda benchmarkSettings: benchmarkEventCatalog(benchmarkSettings, True),
+    "eventCatalogWarm": lambda benchmarkSettings: benchmarkEventCatalog(benchmarkSettings, False),
+    "mediaListMtime": lambda benchmarkSettings: benchmarkMediaList(benchmarkSettings, "mtime"),
+    "mediaListCapture": lambda benchmarkSettings: benchmarkMediaList(benchmarkSettings, "capture"),
+    "renameMedia": benchmarkRenameMedia,
+    "previewDecodeCold": lambda benchmarkSettings: benchmarkPreviewDecode(benchmarkSettings, True),
+    "previewDecodeWarm": lambda benchmarkSettings: benchmarkPreviewDecode(benchmarkSettings, False),
+    "thumbnails": benchmarkThumbnails,
+    "thumbnailsPooled": benchmarkPooledThumbnails
+}
+
+def runChildBenchmark(benchmarkName, benchmarkSettings):
+    # Runs inside the child process; the last stdout line is the result
+    processedFiles, benchmarkSeconds = hotPathBenchmarks[benchmarkName](benchmarkSettings)
+    print(json.dumps({"files": processedFiles, "seconds": benchmarkSeconds, "peakRssMB": getPeakRssMegabytes()}))
+
+def runBenchmark(benchmarkName, benchmarkSettings, repeatCount):
+    benchmarkRuns = []
+
+    for _ in range(repeatCount):
+        childProcess = subprocess.run([sys.executable, path.abspath(__file__), "--child", benchmarkName, "--settings", json.dumps(benchmarkSettings)], capture_output=True, text=True)
+
+        if childProcess.returncode != 0:
+            return {"name": benchmarkName, "error": childProcess.stderr.strip().splitlines()[-1] if childProcess.stderr.strip() else f"Exit code {childProcess.returncode}"}
+
+        benchmarkRuns.append(json.loads(childProcess.stdout.strip().splitlines()[-1]))
+
+    # Median wall time is the number to compare, every run is kept to see the spread
+    medianSeconds = statistics.median(benchmarkRun["seconds"] for benchmarkRun in benchmarkRuns)
+    peakRssValues = [benchmarkRun["peakRssMB"] for benchmarkRun in benchmarkRuns if benchmarkRun["peakRssMB"] is not None]
+
+    return {
+        "name": benchmarkName,
+        "files": benchmarkRuns[0]["files"],
+        "seconds": round(medianSeconds, 4),
+        "filesPerSecond": round(benchmarkRuns[0]["files"] / medianSeconds, 1) if medianSeconds > 0 else None,
+        "peakRssMB": max(peakRssValues) if peakRssValues else None,
+        "runs": [round(benchmarkRun["seconds"], 4) for benchmarkRun in benchmarkRuns]
+    }
+
+def getCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=path.dirname(path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): # Not a git checkout (e.g. a source archive)
+        return None
+
+def parseArguments(arguments):
+    argumentParser = ArgumentParser(description="Benchmark the app's hot paths headless against a synthetic library.")
+    argumentParser.add_argument("--library", help="Library to benchmark; generated here if missing (default: a reusable directory in the temp directory)")
+    argumentParser.add_argument("--files", type=int, default=50_000, help="Library size when generating")
+    argumentParser.add_argument("--years", default="2018-2025")
+    argumentParser.add_argument("--events-per-month", type=int, default=4)
+    argumentParser.add_argument("--depth", type=int, default=0, help="Extra directory levels inside every event directory")
+    argumentParser.add_argument("--formats", default=defaultFormatMix, help="Format mix as format=weight pairs")
+    argumentParser.add_argument("--image-size", default="320x240")
+    argumentParser.add_argument("--seed", type=int, default=1)
+    argumentParser.add_argument("--media-location-files", type=int, default=5_000, help="Size of the flat media location the list and rename benchmarks use")
+    argumentParser.add_argument("--preview-sample", type=int, default=200, help="Images decoded by the preview benchmarks")
+    argumentParser.add_argument("--only", nargs="+", choices=list(hotPathBenchmarks), help="Benchmarks to run (default: all, in order)")
+    argumentParser.add_argument("--repeat", type=int, default=1, help="Runs per benchmark; the median is reported")
+    argumentParser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    argumentParser.add_argument("--child", help=SUPPRESS) # Internal options of the child processes stay out of --help
+    argumentParser.add_argument("--settings", help=SUPPRESS)
+
+    return argumentParser.parse_args(arguments)
+
+def main(arguments=None):
+    parsedArguments = parseArguments(sys.argv[1:] if arguments is None else arguments)
+
+    if parsedArguments.child:
+        runChildBenchmark(parsedArguments.child, json.loads(parsedArguments.settings))
+        return 0
+
+    generatorSettings = getGeneratorSettings(parsedArguments)
+    libraryDirectory = path.abspath(parsedArguments.library or path.join(tempfile.gettempdir(), f"peo-benchmark-library-{parsedArguments.files}-{parsedArguments.seed}"))
+
+    if parsedArguments.library and path.isdir(libraryDirectory) and not path.exists(path.join(libraryDirectory, LIBRARY_MARKER_FILE_NAME)):
+        # Real library, the benchmarks only read it (renameMedia undoes itself); the generator settings still shape the media locations
+        generatorSettings["firstYear"], generatorSettings["lastYear"] = 1900, datetime.now().year
+    else:
+        print(f"Preparing library {libraryDirectory}...", file=sys.stderr)
+        ensureLibrary(libraryDirectory, generatorSettings)
+
+    benchmarkSettings = {
+        **generatorSettings,
+        "library": libraryDirectory,
+        "scratch": tempfile.mkdtemp(prefix="peo-benchmark-", dir=path.dirname(libraryDirectory)), # Same device as the library, so renameMedia renames instead of copying; shared by all benchmarks of one session
+        "mediaLocationFiles": parsedArguments.media_location_files,
+        "previewSample": parsedArguments.preview_sample
+    }
+    benchmarkResults = []
+
+    try:
+        for benchmarkName in parsedArguments.only or hotPathBenchmarks:
+            print(f"Running {benchmarkName}...", file=sys.stderr)
+            benchmarkResults.append(runBenchmark(benchmarkName, benchmarkSettings, parsedArguments.repeat))
+    finally:
+        shutil.rmtree(benchmarkSettings["scratch"], ignore_errors=True)
+
+    benchmarkReport = {
+        "createdAt": datetime.now().isoformat(timespec="seconds"),
+        "commit": getCommit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "library": {key: value for key, value in benchmarkSettings.items() if key != "scratch"},
+        "results": benchmarkResults
+    }
+
+    if parsedArguments.output:
+        with open(parsedArguments.output, "w") as outputFile:
+            json.dump(benchmarkReport, outputFile, indent=4)
+    else:
+        print(json.dumps(benchmarkReport, indent=4))
+
+    return 1 if any("error" in benchmarkResult for benchmarkResult in benchmarkResults) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
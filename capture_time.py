@@ -0,0 +1,422 @@
+import json
+import struct
+import os
+from os import path, makedirs, replace
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from instrumentation import tracedPhase, traceCount
+
+# Capture timestamps straight from the file headers (EXIF DateTimeOriginal, HEIC Exif item, MP4/MOV mvhd creation time), the
+# thumbnail cameras embed in the JPEG Exif segment, and the duration and resolution of MP4/MOV videos. Only the bytes a header needs are read, never the image or video data. Must never import PyQt6, the command line batch mode uses it too
+
+METADATA_CACHE_FILE_NAME = "captureTimes.json"
+METADATA_CACHE_VERSION = 1
+MAX_METADATA_CACHE_ENTRIES = 200_000 # Roughly 20 MB on disk; oldest entries are dropped first
+JPEG_MAX_HEADER_BYTES = 256 * 1024 # APP1 (Exif) is near the start of every JPEG; gives up after this many bytes of other segments
+MP4_EPOCH_OFFSET = 2082844800 # Seconds between 1904-01-01 (QuickTime epoch) and 1970-01-01
+isobmffVideoFormats = (".mp4", ".mov", ".m4v", ".3gp")
+
+def readCaptureTime(mediaPath):
+    # Returns seconds since the epoch, or None if the media has no readable capture time
+    lowerMediaPath = mediaPath.lower()
+
+    try:
+        with open(mediaPath, "rb") as mediaFile:
+            if lowerMediaPath.endswith((".jpg", ".jpeg")):
+                return getExifCaptureTime(readJpegExif(mediaFile))
+            if lowerMediaPath.endswith((".heic", ".heif")):
+                return getExifCaptureTime(readHeifExif(mediaFile))
+            if lowerMediaPath.endswith((".tif", ".tiff", ".raw")): # TIFF based formats are one big EXIF structure already
+                return getExifCaptureTime(mediaFile.read(JPEG_MAX_HEADER_BYTES))
+            if lowerMediaPath.endswith(isobmffVideoFormats):
+                return readMp4CreationTime(mediaFile)
+    except (OSError, ValueError, IndexError, struct.error): # Truncated or corrupted headers fall back to the modification time
+        return None
+
+    return None
+
+def readJpegExif(mediaFile):
+    if mediaFile.read(2) != b"\xff\xd8": # Not a JPEG after all
+        return None
+
+    while mediaFile.tell() < JPEG_MAX_HEADER_BYTES:
+        segmentHeader = mediaFile.read(4)
+
+        if len(segmentHeader) < 4 or segmentHeader[0] != 0xFF:
+            return None
+
+        segmentType = segmentHeader[1]
+        segmentLength = struct.unpack(">H", segmentHeader[2:])[0]
+
+        if segmentType in (0xDA, 0xD9): # Start of scan or end of image, no metadata comes after this
+            return None
+
+        if segmentType == 0xE1:
+            segmentData = mediaFile.read(segmentLength - 2)
+
+            if segmentData.startswith(b"Exif\x00\x00"):
+                return segmentData[6:]
+        else:
+            mediaFile.seek(segmentLength - 2, os.SEEK_CUR)
+
+    return None
+
+def readExifThumbnail(mediaPath):
+    # Returns (JPEG bytes of the ~160x120 thumbnail in the Exif segment, EXIF orientation of the media), or None if it has none
+    try:
+        with open(mediaPath, "rb") as mediaFile:
+            tiffData = readJpegExif(mediaFile)
+
+        if not tiffData or len(tiffData) < 8:
+            return None
+
+        byteOrder = {b"II": "<", b"MM": ">"}.get(tiffData[:2])
+
+        if byteOrder is None:
+            return None
+
+        imageIfdOffset = struct.unpack_from(f"{byteOrder}I", tiffData, 4)[0]
+        imageTags = readIfdTags(tiffData, imageIfdOffset, byteOrder)
+        thumbnailIfdOffset = struct.unpack_from(f"{byteOrder}I", tiffData, imageIfdOffset + 2 + struct.unpack_from(f"{byteOrder}H", tiffData, imageIfdOffset)[0] * 12)[0] # IFD1 follows IFD0's entries
+
+        if not thumbnailIfdOffset:
+            return None
+
+        thumbnailTags = readIfdTags(tiffData, thumbnailIfdOffset, byteOrder)
+        thumbnailStart, thumbnailLength = thumbnailTags.get(0x0201), thumbnailTags.get(0x0202) # JPEGInterchangeFormat, JPEGInterchangeFormatLength
+
+        if not thumbnailStart or not thumbnailLength or thumbnailStart + thumbnailLength > len(tiffData):
+            return None
+
+        return tiffData[thumbnailStart:thumbnailStart + thumbnailLength], imageTags.get(0x0112, 1) # Thumbnails are stored unrotated, like the image itself
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+
+def iterateBoxes(boxData, boxStart, boxEnd):
+    # Yields (box type, payload start, box end) of the ISO base media boxes inside boxData[boxStart:boxEnd]
+    while boxStart + 8 <= boxEnd:
+        boxSize, boxType = struct.unpack_from(">I4s", boxData, boxStart)
+        payloadStart = boxStart + 8
+
+        if boxSize == 1:
+            boxSize = struct.unpack_from(">Q", boxData, payloadStart)[0]
+            payloadStart += 8
+        elif boxSize == 0:
+            boxSize = boxEnd - boxStart
+
+        if boxSize < payloadStart - boxStart:
+            return
+
+        yield boxType, payloadStart, min(boxStart + boxSize, boxEnd)
+        boxStart += boxSize
+
+def findTopLevelBox(mediaFile, wantedBoxType):
+    # Walks the top-level boxes by seeking over them, so a 4 GB mdat costs one 16 byte read; returns (payload offset, payload size)
+    for boxType, payloadStart, boxEnd in iterateFileBoxes(mediaFile, 0, os.fstat(mediaFile.fileno()).st_size):
+        if boxType == wantedBoxType:
+            return payloadStart, boxEnd - payloadStart
+
+    return None
+
+def iterateFileBoxes(mediaFile, boxStart, boxEnd):
+    # Same as iterateBoxes(), but reads only the box headers from the file; the payloads are seeked over
+    while boxStart + 8 <= boxEnd:
+        mediaFile.seek(boxStart)
+        boxHeader = mediaFile.read(16)
+
+        if len(boxHeader) < 8:
+            return
+
+        boxSize, boxType = struct.unpack_from(">I4s", boxHeader)
+        headerSize = 8
+
+        if boxSize == 1:
+            boxSize = struct.unpack_from(">Q", boxHeader, 8)[0]
+            headerSize = 16
+        elif boxSize == 0:
+            boxSize = boxEnd - boxStart
+
+        if boxSize < headerSize:
+            return
+
+        yield boxType, boxStart + headerSize, min(boxStart + boxSize, boxEnd)
+        boxStart += boxSize
+
+def readHeifExif(mediaFile):
+    metaBox = findTopLevelBox(mediaFile, b"meta")
+
+    if metaBox is None:
+        return None
+
+    mediaFile.seek(metaBox[0])
+    metaData = mediaFile.read(metaBox[1])
+    exifItemId = None
+    itemLocations = {}
+
+    for boxType, payloadStart, boxEnd in iterateBoxes(metaData, 4, len(metaData)): # meta is a full box, children start after version/flags
+        if boxType == b"iinf":
+            exifItemId = getExifItemId(metaData, payloadStart, boxEnd)
+        elif boxType == b"iloc":
+            itemLocations = getItemLocations(metaData, payloadStart)
+
+    if exifItemId is None:
+        return None
+
+    exifLocation = itemLocations.get(exifItemId)
+
+    if exifLocation is None:
+        return None
+
+    mediaFile.seek(exifLocation[0])
+    exifItem = mediaFile.read(exifLocation[1])
+    tiffHeaderOffset = struct.unpack_from(">I", exifItem)[0]
+    exifData = exifItem[4 + tiffHeaderOffset:]
+
+    return exifData[6:] if exifData.startswith(b"Exif\x00\x00") else exifData
+
+def getExifItemId(metaData, payloadStart, boxEnd):
+    iinfVersion = metaData[payloadStart]
+    entriesStart = payloadStart + (6 if iinfVersion == 0 else 8) # version/flags + entry count
+
+    for boxType, infeStart, _ in iterateBoxes(metaData, entriesStart, boxEnd):
+        if boxType != b"infe" or metaData[infeStart] < 2: # Only version 2+ item infos carry an item type
+            continue
+
+        if metaData[infeStart] == 2:
+            itemId = struct.unpack_from(">H", metaData, infeStart + 4)[0]
+            itemType = metaData[infeStart + 8:infeStart + 12]
+        else:
+            itemId = struct.unpack_from(">I", metaData, infeStart + 4)[0]
+            itemType = metaData[infeStart + 10:infeStart + 14]
+
+        if itemType == b"Exif":
+            return itemId
+
+    return None
+
+def getItemLocations(metaData, payloadStart):
+    # item ID -> (file offset, length) of the first extent, only for items stored in the file itself (construction method 0)
+    ilocVersion = metaData[payloadStart]
+    offsetSize, lengthSize = metaData[payloadStart + 4] >> 4, metaData[payloadStart + 4] & 0x0F
+    baseOffsetSize, indexSize = metaData[payloadStart + 5] >> 4, metaData[payloadStart + 5] & 0x0F
+    readPosition = payloadStart + 6
+    itemLocations = {}
+
+    def readNumber(numberSize):
+        nonlocal readPosition
+        number = int.from_bytes(metaData[readPosition:readPosition + numberSize], "big")
+        readPosition += numberSize
+        return number
+
+    itemCount = readNumber(2 if ilocVersion < 2 else 4)
+
+    for _ in range(itemCount):
+        itemId = readNumber(2 if ilocVersion < 2 else 4)
+        constructionMethod = readNumber(2) & 0x0F if ilocVersion in (1, 2) else 0
+        readNumber(2) # Data reference index
+        baseOffset = readNumber(baseOffsetSize)
+        extentCount = readNumber(2)
+        itemExtents = []
+
+        for _ in range(extentCount):
+            if ilocVersion in (1, 2) and indexSize > 0:
+                readNumber(indexSize)
+
+            itemExtents.append((baseOffset + readNumber(offsetSize), readNumber(lengthSize)))
+
+        if constructionMethod == 0 and itemExtents:
+            itemLocations[itemId] = itemExtents[0]
+
+    return itemLocations
+
+def readMp4CreationTime(mediaFile):
+    moovBox = findTopLevelBox(mediaFile, b"moov")
+
+    if moovBox is None:
+        return None
+
+    childStart = moovBox[0]
+
+    # mvhd is (almost) always the first child of moov, so the sample tables after it are never read
+    while childStart + 8 <= moovBox[0] + moovBox[1]:
+        mediaFile.seek(childStart)
+        childSize, childType = struct.unpack(">I4s", mediaFile.read(8))
+
+        if childType == b"mvhd":
+            mvhdVersion = mediaFile.read(4)[0]
+            creationTime = struct.unpack(">Q", mediaFile.read(8))[0] if mvhdVersion == 1 else struct.unpack(">I", mediaFile.read(4))[0]
+
+            return creationTime - MP4_EPOCH_OFFSET if creationTime else None # Cameras without a clock write 0
+
+        if childSize < 8:
+            return None
+
+        childStart += childSize
+
+    return None
+
+def readVideoInfo(mediaPath):
+    # Returns (duration in seconds or None, width, height) of MP4/MOV videos, width and height as played back (rotation applied);
+    # None for other containers and unreadable headers
+    if not mediaPath.lower().endswith(isobmffVideoFormats):
+        return None
+
+    try:
+        with open(mediaPath, "rb") as mediaFile:
+            return readMp4VideoInfo(mediaFile)
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+
+def readMp4VideoInfo(mediaFile):
+    moovBox = findTopLevelBox(mediaFile, b"moov")
+
+    if moovBox is None:
+        return None
+
+    videoDuration, videoSize = None, None
+
+    # Only mvhd and the tkhd of every track are read; the sample tables next to them can be megabytes on long clips
+    for childType, childStart, childEnd in iterateFileBoxes(mediaFile, moovBox[0], moovBox[0] + moovBox[1]):
+        if childType == b"mvhd":
+            mediaFile.seek(childStart)
+            mvhdVersion = mediaFile.read(4)[0]
+            mediaFile.seek(16 if mvhdVersion == 1 else 8, 1) # Creation and modification time
+            timeScale, duration = struct.unpack(">IQ", mediaFile.read(12)) if mvhdVersion == 1 else struct.unpack(">II", mediaFile.read(8))
+            videoDuration = duration / timeScale if timeScale else None
+        elif childType == b"trak" and videoSize is None:
+            videoSize = readTrackSize(mediaFile, childStart, childEnd)
+
+    if videoSize is None:
+        return None
+
+    return videoDuration, *videoSize
+
+def readTrackSize(mediaFile, trakStart, trakEnd):
+    # (width, height) of a video track, None for audio and other tracks (their tkhd size is 0)
+    for childType, childStart, _ in iterateFileBoxes(mediaFile, trakStart, trakEnd):
+        if childType != b"tkhd":
+            continue
+
+        mediaFile.seek(childStart)
+        tkhdVersion = mediaFile.read(4)[0]
+        mediaFile.seek((32 if tkhdVersion == 1 else 20) + 16, 1) # Times, track ID and duration, then layer, group and volume
+        transformMatrix = struct.unpack(">9i", mediaFile.read(36))
+        trackWidth, trackHeight = (trackDimension >> 16 for trackDimension in struct.unpack(">II", mediaFile.read(8))) # 16.16 fixed point
+
+        if not trackWidth or not trackHeight:
+            return None
+
+        if transformMatrix[0] == 0 and abs(transformMatrix[1]) == 0x10000: # Rotated by 90 or 270 degrees, e.g. portrait phone clips
+            return trackHeight, trackWidth
+
+        return trackWidth, trackHeight
+
+    return None
+
+def getExifCaptureTime(tiffData):
+    if not tiffData or len(tiffData) < 8:
+        return None
+
+    byteOrder = {b"II": "<", b"MM": ">"}.get(tiffData[:2])
+
+    if byteOrder is None:
+        return None
+
+    imageTags = readIfdTags(tiffData, struct.unpack_from(f"{byteOrder}I", tiffData, 4)[0], byteOrder)
+    exifTags = readIfdTags(tiffData, imageTags[0x8769], byteOrder) if 0x8769 in imageTags else {} # Exif sub-IFD
+    captureDateText = exifTags.get(0x9003) or exifTags.get(0x9004) or imageTags.get(0x0132) # DateTimeOriginal, DateTimeDigitized, DateTime
+
+    if not isinstance(captureDateText, str):
+        return None
+
+    try:
+        return datetime.strptime(captureDateText.strip("\x00 ")[:19], "%Y:%m:%d %H:%M:%S").timestamp() # Camera local time, same as the file's mtime would be
+    except ValueError: # "0000:00:00 00:00:00" and friends
+        return None
+
+def readIfdTags(tiffData, ifdOffset, byteOrder):
+    # Only the tag types the capture time and the thumbnail need: ASCII strings, single LONG offsets and single SHORTs (orientation)
+    ifdTags = {}
+    tagCount = struct.unpack_from(f"{byteOrder}H", tiffData, ifdOffset)[0]
+
+    for tagRow in range(tagCount):
+        tagId, tagType, valueCount, valueOffset = struct.unpack_from(f"{byteOrder}HHII", tiffData, ifdOffset + 2 + tagRow * 12)
+
+        if tagType == 4 and valueCount == 1:
+            ifdTags[tagId] = valueOffset
+        elif tagType == 3 and valueCount == 1: # SHORT values sit in the first two bytes of the value field
+            ifdTags[tagId] = struct.unpack_from(f"{byteOrder}H", tiffData, ifdOffset + 2 + tagRow * 12 + 8)[0]
+        elif tagType == 2:
+            valueStart = ifdOffset + 2 + tagRow * 12 + 8 if valueCount <= 4 else valueOffset
+            ifdTags[tagId] = tiffData[valueStart:valueStart + valueCount].decode("ascii", "replace")
+
+    return ifdTags
+
+class MetadataCache:
+    # Persistent capture time cache keyed by path + size + mtime, so a second pass over the same media never opens a file
+    def __init__(self, cacheDirectory):
+        self.cachePath = path.join(cacheDirectory, METADATA_CACHE_FILE_NAME)
+        self.captureTimes = None # Cache key -> capture time or None, oldest first; loaded lazily on first use
+        self.hasChanges = False
+        self.lock = Lock() # Media list scans and rename jobs look up capture times from different threads
+
+    def load(self):
+        try:
+            with open(self.cachePath, "r") as cacheFile:
+                cacheData = json.load(cacheFile)
+
+            self.captureTimes = OrderedDict(cacheData["captureTimes"]) if cacheData.get("version") == METADATA_CACHE_VERSION else OrderedDict()
+        except (OSError, ValueError, KeyError, TypeError, AttributeError): # Missing or corrupted cache simply gets rebuilt
+            self.captureTimes = OrderedDict()
+
+    def save(self):
+        with self.lock:
+            if not self.hasChanges:
+                return
+
+            try:
+                makedirs(path.dirname(self.cachePath), exist_ok=True)
+
+                with open(f"{self.cachePath}.{os.getpid()}.tmp", "w") as cacheFile:
+                    json.dump({"version": METADATA_CACHE_VERSION, "captureTimes": list(self.captureTimes.items())}, cacheFile)
+
+                replace(f"{self.cachePath}.{os.getpid()}.tmp", self.cachePath)
+                self.hasChanges = False
+            except OSError as ose:
+                print(f"Could not save metadata cache: {ose}")
+
+    def getCacheKey(self, mediaPath, mediaStat):
+        return f"{path.abspath(mediaPath)}|{mediaStat.st_size}|{mediaStat.st_mtime_ns}"
+
+    @tracedPhase
+    def getCaptureTimes(self, mediaFiles, maxWorkers=None):
+        # mediaFiles are (media path, os.stat_result or MediaEntry) pairs; returns {media path: capture time or None}
+        with self.lock:
+            if self.captureTimes is None:
+                self.load()
+
+            cacheKeys = {mediaPath: self.getCacheKey(mediaPath, mediaStat) for mediaPath, mediaStat in mediaFiles}
+            captureTimes = {mediaPath: self.captureTimes[cacheKey] for mediaPath, cacheKey in cacheKeys.items() if cacheKey in self.captureTimes}
+
+        uncachedMediaPaths = [mediaPath for mediaPath in cacheKeys if mediaPath not in captureTimes]
+        traceCount(files=len(cacheKeys), cacheHits=len(captureTimes), headerReads=len(uncachedMediaPaths))
+
+        if uncachedMediaPaths:
+            # Header reads are tiny and mostly waiting on the disk or network, so more threads than cores still pay off
+            with ThreadPoolExecutor(max_workers=maxWorkers or min(16, (os.cpu_count() or 2) * 2)) as headerReaders:
+                readCaptureTimes = dict(zip(uncachedMediaPaths, headerReaders.map(readCaptureTime, uncachedMediaPaths)))
+
+            with self.lock:
+                for mediaPath, captureTime in readCaptureTimes.items():
+                    self.captureTimes[cacheKeys[mediaPath]] = captureTime
+
+                while len(self.captureTimes) > MAX_METADATA_CACHE_ENTRIES:
+                    self.captureTimes.popitem(last=False)
+
+                self.hasChanges = True
+
+            captureTimes.update(readCaptureTimes)
+
+        return captureTimes
@@ -0,0 +1,125 @@
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QStyle
+from PyQt6.QtGui import QColor
+from PyQt6.QtCore import Qt, QSize, QRect, QTimer
+from thumbnail_loader import THUMBNAIL_DIMENSION
+
+CELL_PADDING = 8
+CELL_LABEL_HEIGHT = 20
+REQUEST_DELAY_MS = 30 # Scrolling only asks for thumbnails once it pauses for a moment
+PREFETCH_SCREENS = 2 # Screens of cells above and below the visible ones that get thumbnails ahead of time
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    # Paints one contact sheet cell: the thumbnail (or an empty box until it's decoded) with the media name below
+    def __init__(self, contactSheetView):
+        super().__init__(contactSheetView)
+        self.contactSheetView = contactSheetView
+
+    def sizeHint(self, option, index):
+        return self.contactSheetView.gridSize()
+
+    def paint(self, painter, option, index):
+        painter.save()
+
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, QColor("#44475A"))
+
+        mediaName = index.data()
+        imageRect = QRect(option.rect.x() + CELL_PADDING, option.rect.y() + CELL_PADDING, THUMBNAIL_DIMENSION, THUMBNAIL_DIMENSION)
+        isKnown, mediaImage = self.contactSheetView.getThumbnail(mediaName)
+
+        if not isKnown: # Not decoded yet, it's already requested
+            painter.fillRect(imageRect, QColor("#233044"))
+        else:
+            mediaImage = mediaImage if mediaImage is not None else self.contactSheetView.thumbnailLoader.getPlaceholderImage()
+            scaledSize = mediaImage.size().scaled(imageRect.size(), Qt.AspectRatioMode.KeepAspectRatio) if max(mediaImage.width(), mediaImage.height()) > THUMBNAIL_DIMENSION else mediaImage.size()
+            painter.drawImage(QRect(imageRect.x() + (imageRect.width() - scaledSize.width()) // 2, imageRect.y() + (imageRect.height() - scaledSize.height()) // 2, scaledSize.width(), scaledSize.height()), mediaImage)
+
+        labelRect = QRect(option.rect.x() + CELL_PADDING, imageRect.bottom() + 2, THUMBNAIL_DIMENSION, CELL_LABEL_HEIGHT)
+        painter.setPen(QColor("#F8F8F2"))
+        painter.drawText(labelRect, Qt.AlignmentFlag.AlignCenter, painter.fontMetrics().elidedText(mediaName, Qt.TextElideMode.ElideMiddle, labelRect.width()))
+        painter.restore()
+
+class ContactSheetView(QListView):
+    # Grid of thumbnails over the same filtered media list model as the media list. Cells show up right away and fill in as
+    # batches of thumbnails come back from the background pool: visible cells first, nearest to the selection (or the middle of
+    # the screen) first, then a couple of screens around them. Memory stays bounded, see thumbnail_loader.MEMORY_CACHE_BYTES
+    def __init__(self):
+        super().__init__()
+        self.thumbnailLoader = None # Set by the Worker, see setThumbnailLoader()
+        self.mediaDirectory = None # Directory the listed media names belong to
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.setGridSize(QSize(THUMBNAIL_DIMENSION + 2 * CELL_PADDING, THUMBNAIL_DIMENSION + CELL_LABEL_HEIGHT + 2 * CELL_PADDING))
+        self.setItemDelegate(ThumbnailDelegate(self))
+        self.requestTimer = QTimer(self)
+        self.requestTimer.setSingleShot(True)
+        self.requestTimer.setInterval(REQUEST_DELAY_MS)
+        self.requestTimer.timeout.connect(self.requestThumbnails)
+        self.verticalScrollBar().valueChanged.connect(self.scheduleRequest)
+
+    def setModel(self, mediaModel):
+        super().setModel(mediaModel)
+
+        # Streamed scans, filtering and re-sorting all change what's on screen
+        mediaModel.rowsInserted.connect(self.scheduleRequest)
+        mediaModel.rowsRemoved.connect(self.scheduleRequest)
+        mediaModel.layoutChanged.connect(self.scheduleRequest)
+        mediaModel.modelReset.connect(self.scheduleRequest)
+
+    def setThumbnailLoader(self, thumbnailLoader):
+        self.thumbnailLoader = thumbnailLoader
+        self.thumbnailLoader.thumbnailsReady.connect(self.viewport().update) # One repaint per batch
+
+    def setMediaDirectory(self, mediaDirectory):
+        self.mediaDirectory = mediaDirectory
+
+        if mediaDirectory is None and self.thumbnailLoader is not None:
+            self.thumbnailLoader.cancelRequests()
+
+    def getThumbnail(self, mediaName):
+        if self.thumbnailLoader is None or self.mediaDirectory is None:
+            return True, None
+
+        return self.thumbnailLoader.getThumbnail(f"{self.mediaDirectory}/{mediaName}")
+
+    def scheduleRequest(self):
+        if self.isVisible():
+            self.requestTimer.start()
+
+    def showEvent(self, showEvent):
+        super().showEvent(showEvent)
+        self.scheduleRequest()
+
+    def resizeEvent(self, resizeEvent):
+        super().resizeEvent(resizeEvent)
+        self.scheduleRequest()
+
+    def getVisibleRows(self):
+        # Cells are laid out row by row on a fixed grid, so the scroll position tells which ones are on screen without asking every cell
+        cellSize = self.gridSize()
+        cellColumns = max(1, self.viewport().width() // cellSize.width())
+        scrollTop = self.verticalScrollBar().value()
+        firstVisibleRow = scrollTop // cellSize.height() * cellColumns
+        lastVisibleRow = min(self.model().rowCount() - 1, ((scrollTop + self.viewport().height()) // cellSize.height() + 1) * cellColumns - 1)
+
+        return firstVisibleRow, lastVisibleRow
+
+    def requestThumbnails(self):
+        # Everything missing on screen is asked for nearest first, then a couple of screens around it
+        mediaModel = self.model()
+
+        if self.thumbnailLoader is None or self.mediaDirectory is None or not self.isVisible() or mediaModel.rowCount() == 0:
+            return
+
+        firstVisibleRow, lastVisibleRow = self.getVisibleRows()
+        currentRow = self.currentIndex().row()
+        centerRow = currentRow if firstVisibleRow <= currentRow <= lastVisibleRow else (firstVisibleRow + lastVisibleRow) // 2
+        visibleRows = sorted(range(firstVisibleRow, lastVisibleRow + 1), key=lambda visibleRow: (abs(visibleRow - centerRow), visibleRow < centerRow))
+        prefetchCount = min((lastVisibleRow - firstVisibleRow + 1) * PREFETCH_SCREENS, self.thumbnailLoader.getCapacity() // 2 - len(visibleRows))
+        prefetchRows = [prefetchRow for distance in range(1, max(prefetchCount, 0) + 1) for prefetchRow in (lastVisibleRow + distance, firstVisibleRow - distance) if 0 <= prefetchRow < mediaModel.rowCount()] # Below before above, most people scroll down
+        self.thumbnailLoader.requestThumbnails([f"{self.mediaDirectory}/{mediaModel.index(mediaRow, 0).data()}" for mediaRow in visibleRows + prefetchRows[:max(prefetchCount, 0)]])
@@ -0,0 +1,227 @@
+import atexit
+import os
+import queue
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+from threading import Lock
+from instrumentation import tracedPhase, traceAnnotate
+
+# Decodes untrusted media in a pool of worker processes, which also spreads big batches (a contact sheet of a whole event) over every core: a corrupt HEIC or a huge TIFF/EXR that hangs or crashes its codec only
+# takes down one worker, which gets restarted, while the app shows no_preview.png for that media. Pixels come back through one
+# shared memory slot per worker instead of being pickled. PEO_DECODER_PROCESSES=0 decodes inside the app process instead
+
+DECODER_PROCESSES_ENVIRONMENT_VARIABLE = "PEO_DECODER_PROCESSES"
+MAX_DECODER_PROCESSES = 8
+SHARED_SLOT_BYTES = 2048 * 2048 * 4 + 1024 * 1024 # One preview-sized RGBA image (see preview_cache.PREVIEW_MAX_DIMENSION) or a batch of thumbnails
+DECODE_TIMEOUT_SECONDS = 15 # Per preview
+THUMBNAIL_TIMEOUT_SECONDS = 2 # Per thumbnail of a batch, on top of BATCH_TIMEOUT_SECONDS
+BATCH_TIMEOUT_SECONDS = 5
+
+def getDefaultProcessCount():
+    processSetting = os.environ.get(DECODER_PROCESSES_ENVIRONMENT_VARIABLE, "")
+
+    try:
+        return max(0, int(processSetting))
+    except ValueError: # Unset or garbage, one worker per core
+        return min(os.cpu_count() or 2, MAX_DECODER_PROCESSES)
+
+def runDecodeJob(jobKind, jobArguments):
+    # Runs inside a worker process (or in the app with PEO_DECODER_PROCESSES=0); returns [(QImage or None, extra value)]
+    if jobKind == "preview":
+        from preview_loader import decodeMediaImage
+        mediaPath, = jobArguments
+        mediaImage, isWorthCaching = decodeMediaImage(mediaPath)
+
+        return [(mediaImage, isWorthCaching)]
+
+    if jobKind == "thumbnails":
+        from thumbnail_loader import decodeThumbnail
+        supportedImageFormats, mediaFiles = jobArguments
+
+        return [(decodeThumbnail(mediaPath, cachedPreviewPath, supportedImageFormats), None) for mediaPath, cachedPreviewPath in mediaFiles]
+
+    raise ValueError(f"Unknown decode job {jobKind}")
+
+def runDecoderProcess(jobConnection, slotName):
+    # Worker process main loop: one job at a time, pixels are written one after another into the shared slot
+    from PyQt6.QtGui import QImage
+
+    sharedSlot = shared_memory.SharedMemory(name=slotName)
+    directFormats = {QImage.Format.Format_RGB32, QImage.Format.Format_ARGB32, QImage.Format.Format_ARGB32_Premultiplied, QImage.Format.Format_RGBA8888, QImage.Format.Format_RGBA8888_Premultiplied, QImage.Format.Format_RGB888, QImage.Format.Format_Grayscale8}
+
+    while True:
+        try:
+            jobKind, jobArguments = jobConnection.recv()
+        except (EOFError, OSError): # The app closed the pool or exited
+            break
+
+        try:
+            decodedImages = runDecodeJob(jobKind, jobArguments)
+        except Exception as e: # General error catching, the app falls back to no_preview.png
+            jobConnection.send(("error", f"{type(e).__name__}: {e}"))
+            continue
+
+        imageInfos = []
+        slotOffset = 0
+
+        for mediaImage, extraValue in decodedImages:
+            if mediaImage is None or mediaImage.isNull():
+                imageInfos.append((None, extraValue))
+                continue
+
+            if mediaImage.format() not in directFormats: # 16 bit, indexed, ... become plain 32 bit so the slot size stays predictable
+                mediaImage = mediaImage.convertToFormat(QImage.Format.Format_ARGB32)
+
+            imageBytes = mediaImage.sizeInBytes()
+
+            if slotOffset + imageBytes > sharedSlot.size:
+                imageInfos.append((None, extraValue))
+                continue
+
+            imageBits = mediaImage.constBits()
+            imageBits.setsize(imageBytes)
+            sharedSlot.buf[slotOffset:slotOffset + imageBytes] = imageBits.asstring()
+            imageInfos.append(((slotOffset, imageBytes, mediaImage.width(), mediaImage.height(), mediaImage.bytesPerLine(), mediaImage.format().value), extraValue))
+            slotOffset += imageBytes
+
+        try:
+            jobConnection.send(("ok", imageInfos))
+        except OSError: # The app gave up waiting (timeout) and is restarting this worker
+            break
+
+    sharedSlot.close()
+
+class DecoderProcess:
+    # One worker process, the pipe to it and its shared memory slot; only used by one decoding thread at a time
+    def __init__(self, processNumber):
+        self.processNumber = processNumber
+        self.sharedSlot = shared_memory.SharedMemory(create=True, size=SHARED_SLOT_BYTES)
+        self.process = None
+        self.jobConnection = None
+        self.isClosed = False # The app is exiting, jobs still running on background threads just fail instead of starting workers again
+
+    def start(self):
+        processContext = multiprocessing.get_context("spawn") # Forking a process that runs Qt threads is not safe
+        self.jobConnection, workerConnection = processContext.Pipe()
+        self.process = processContext.Process(target=runDecoderProcess, args=(workerConnection, self.sharedSlot.name), name=f"PEODecoder-{self.processNumber}", daemon=True)
+        self.process.start()
+        workerConnection.close()
+
+    def stop(self):
+        if self.process is not None:
+            self.jobConnection.close() # A healthy worker leaves its loop on its own
+            self.process.join(0.5)
+
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+
+            self.process = None
+
+    def restart(self, reason):
+        if self.isClosed:
+            return
+
+        print(f"Restarting decoder process {self.processNumber}: {reason}")
+        self.stop()
+        self.start()
+
+    def runJob(self, jobKind, jobArguments, timeoutSeconds):
+        from PyQt6.QtGui import QImage
+
+        if self.isClosed:
+            return None
+
+        if self.process is None or not self.process.is_alive():
+            self.start()
+
+        try:
+            self.jobConnection.send((jobKind, jobArguments))
+
+            if not self.jobConnection.poll(timeoutSeconds):
+                self.restart(f"{jobKind} of {self.describeJob(jobArguments)} took longer than {timeoutSeconds} s")
+                return None
+
+            jobStatus, jobResult = self.jobConnection.recv()
+        except (EOFError, OSError): # Crashed inside a codec (segfault, out of memory kill, ...)
+            self.process.join(1)
+            self.restart(f"{jobKind} of {self.describeJob(jobArguments)} crashed it (exit code {self.process.exitcode})")
+            return None
+
+        if jobStatus != "ok":
+            print(f"Could not decode {self.describeJob(jobArguments)}: {jobResult}")
+            return None
+
+        decodedImages = []
+
+        for imageInfo, extraValue in jobResult:
+            if imageInfo is None:
+                decodedImages.append((None, extraValue))
+                continue
+
+            slotOffset, imageBytes, imageWidth, imageHeight, bytesPerLine, formatValue = imageInfo
+            decodedImages.append((QImage(bytes(self.sharedSlot.buf[slotOffset:slotOffset + imageBytes]), imageWidth, imageHeight, bytesPerLine, QImage.Format(formatValue)).copy(), extraValue)) # copy() owns its pixels, the slot gets reused by the next job
+
+        return decodedImages
+
+    def describeJob(self, jobArguments):
+        return jobArguments[0] if isinstance(jobArguments[0], str) else f"{len(jobArguments[1])} media"
+
+    def close(self):
+        self.isClosed = True
+        self.stop()
+        self.sharedSlot.close()
+        self.sharedSlot.unlink()
+
+class DecodeService:
+    # decode() blocks the calling (background) thread until a worker is free and done, so at most processCount decodes run at once.
+    # Workers start on first use; warmUp() starts the first one ahead of time
+    def __init__(self, processCount=None):
+        self.processCount = getDefaultProcessCount() if processCount is None else processCount
+        self.idleProcesses = queue.LifoQueue() # Most recently used worker first, the others may never have to start
+        self.decoderProcesses = []
+        self.lock = Lock()
+
+        try:
+            for processNumber in range(self.processCount):
+                decoderProcess = DecoderProcess(processNumber + 1)
+                self.decoderProcesses.append(decoderProcess)
+                self.idleProcesses.put(decoderProcess)
+        except OSError as ose: # No shared memory (e.g. a read-only /dev/shm), decodes in the app process like before
+            print(f"Could not create decoder processes, decoding in the app process: {ose}")
+            self.processCount = 0
+
+        atexit.register(self.close)
+
+    def getThreadCount(self):
+        # Background threads worth feeding the pool with
+        return max(self.processCount, 1)
+
+    def warmUp(self):
+        with self.lock:
+            if self.decoderProcesses and self.decoderProcesses[-1].process is None:
+                self.decoderProcesses[-1].start() # Last in the LIFO queue, so it's the first one handed out
+
+    @tracedPhase
+    def decode(self, jobKind, jobArguments, timeoutSeconds=DECODE_TIMEOUT_SECONDS):
+        # Returns [(QImage or None, extra value)] in job order, or None if the job failed, timed out or crashed its worker
+        if self.processCount == 0:
+            try:
+                return runDecodeJob(jobKind, jobArguments)
+            except Exception as e: # General error catching, same fallback as a failed worker
+                print(f"Could not decode: {e}")
+                return None
+
+        waitStartTime = time.perf_counter()
+        decoderProcess = self.idleProcesses.get()
+        traceAnnotate(process=decoderProcess.processNumber, waitedMs=round((time.perf_counter() - waitStartTime) * 1000, 1)) # Time spent waiting for a free worker
+
+        try:
+            return decoderProcess.runJob(jobKind, jobArguments, timeoutSeconds)
+        finally:
+            self.idleProcesses.put(decoderProcess)
+
+    def close(self):
+        while self.decoderProcesses:
+            self.decoderProcesses.pop().close()
@@ -0,0 +1,35 @@
+import json
+from os import makedirs, replace, path
+from media_index import INDEX_DIRECTORY_NAME
+
+SETTINGS_FILE_NAME = "settings.json"
+defaultDestinationSettings = {
+    "copyConcurrency": 2, # Parallel copy streams for cross-device moves; keep it low for spinning disks, raise it for SSD/RAID destinations
+    "mediaOrdering": "mtime" # "mtime" or "capture"; order of the media list and of the CODE_N numbers
+}
+
+# Per-destination settings stored next to the media index so every machine importing into the same library shares them
+def loadDestinationSettings(mediaRootDirectory):
+    destinationSettings = dict(defaultDestinationSettings)
+
+    try:
+        with open(path.join(mediaRootDirectory, INDEX_DIRECTORY_NAME, SETTINGS_FILE_NAME), "r") as settingsFile:
+            destinationSettings.update(json.load(settingsFile))
+    except (OSError, ValueError, TypeError): # Missing or corrupted settings fall back to the defaults
+        pass
+
+    return destinationSettings
+
+def saveDestinationSettings(mediaRootDirectory, destinationSettings):
+    settingsDirectory = path.join(mediaRootDirectory, INDEX_DIRECTORY_NAME)
+    settingsPath = path.join(settingsDirectory, SETTINGS_FILE_NAME)
+
+    try:
+        makedirs(settingsDirectory, exist_ok=True)
+
+        with open(f"{settingsPath}.tmp", "w") as settingsFile:
+            json.dump(destinationSettings, settingsFile, indent=4)
+
+        replace(f"{settingsPath}.tmp", settingsPath)
+    except OSError as ose:
+        print(f"Could not save destination settings: {ose}")
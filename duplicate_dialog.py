@@ -0,0 +1,70 @@
+from os import path
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, QTableWidgetItem, QComboBox, QDialogButtonBox, QHeaderView
+
+duplicateActionLabels = {"skip": "Skip", "link": "Link", "keep": "Keep"}
+
+class DuplicateDialog(QDialog):
+    # Lets the user decide per duplicate: skip (stays in the media location), link (event directory points to the library copy) or keep (moved anyway)
+    def __init__(self, duplicateMedia, mediaRootDirectory, parentWidget=None):
+        super().__init__(parentWidget)
+        self.duplicateMedia = duplicateMedia
+        self.setWindowTitle("Duplicates Found!")
+        self.resize(800, 450)
+        self.dialogLayout = QVBoxLayout(self)
+        self.dialogLayout.addWidget(QLabel(f"{len(duplicateMedia)} media ({getReadableSize(sum(mediaSize for _, mediaSize in duplicateMedia.values()))}) are already in the library."))
+
+        # One row per duplicate, sorted by media name
+        self.duplicateTable = QTableWidget(len(duplicateMedia), 4)
+        self.duplicateTable.setHorizontalHeaderLabels(["Media", "Size", "Already In Library As", "Action"])
+        self.duplicateTable.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
+        self.duplicateTable.verticalHeader().hide()
+        self.actionComboBoxes = {}
+
+        for mediaRow, (mediaName, (libraryMediaPath, mediaSize)) in enumerate(sorted(duplicateMedia.items())):
+            actionComboBox = QComboBox()
+
+            for duplicateAction, actionLabel in duplicateActionLabels.items():
+                actionComboBox.addItem(actionLabel, duplicateAction)
+
+            self.duplicateTable.setItem(mediaRow, 0, QTableWidgetItem(mediaName))
+            self.duplicateTable.setItem(mediaRow, 1, QTableWidgetItem(getReadableSize(mediaSize)))
+            self.duplicateTable.setItem(mediaRow, 2, QTableWidgetItem(path.relpath(libraryMediaPath, mediaRootDirectory)))
+            self.duplicateTable.setCellWidget(mediaRow, 3, actionComboBox)
+            self.actionComboBoxes[mediaName] = actionComboBox
+
+        self.duplicateTable.resizeColumnsToContents()
+        self.dialogLayout.addWidget(self.duplicateTable)
+
+        # Shortcuts for setting every row at once
+        self.setAllLayout = QHBoxLayout()
+        self.setAllLayout.addWidget(QLabel("Set all to:"))
+
+        for duplicateAction, actionLabel in duplicateActionLabels.items():
+            setAllButton = QPushButton(actionLabel)
+            setAllButton.clicked.connect(lambda _, duplicateAction=duplicateAction: self.setAllActions(duplicateAction))
+            self.setAllLayout.addWidget(setAllButton)
+
+        self.setAllLayout.addStretch()
+        self.dialogLayout.addLayout(self.setAllLayout)
+
+        self.dialogButtons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        self.dialogButtons.accepted.connect(self.accept)
+        self.dialogButtons.rejected.connect(self.reject)
+        self.dialogLayout.addWidget(self.dialogButtons)
+
+    def setAllActions(self, duplicateAction):
+        for actionComboBox in self.actionComboBoxes.values():
+            actionComboBox.setCurrentIndex(actionComboBox.findData(duplicateAction))
+
+    def getDuplicateActions(self):
+        # Media name -> (action, library media path), the format OrganizeJob expects
+        return {mediaName: (actionComboBox.currentData(), self.duplicateMedia[mediaName][0]) for mediaName, actionComboBox in self.actionComboBoxes.items()}
+
+def getReadableSize(sizeInBytes):
+    for sizeUnit in ["B", "KB", "MB", "GB"]:
+        if sizeInBytes < 1024:
+            return f"{sizeInBytes:.1f} {sizeUnit}" if sizeUnit != "B" else f"{sizeInBytes} B"
+
+        sizeInBytes /= 1024
+
+    return f"{sizeInBytes:.1f} TB"
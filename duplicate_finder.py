@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import time
+from os import scandir, stat, makedirs, replace, path
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from media_index import INDEX_DIRECTORY_NAME, RACY_MTIME_WINDOW_NS
+from instrumentation import tracedPhase, traceCount
+
+# Finds media that are already in the library before they get moved there. Candidates are narrowed down in stages that each cost
+# more than the previous one: same size (free, from the index), same first/last block hash, same full hash. Must never import PyQt6
+
+HASH_INDEX_FILE_NAME = "hashIndex.json"
+HASH_INDEX_VERSION = 1
+PARTIAL_HASH_BLOCK_SIZE = 64 * 1024 # Hashed from the start and the end of the file; headers and trailers differ between almost all media
+FULL_HASH_CHUNK_SIZE = 1024 * 1024
+duplicateActions = ["skip", "keep", "link"] # Leave the duplicate in the media location, move it anyway, or link the library copy under the new name
+
+def getPartialHash(mediaPath):
+    with open(mediaPath, "rb") as mediaFile:
+        mediaSize = os.fstat(mediaFile.fileno()).st_size
+        partialHash = hashlib.blake2b(mediaFile.read(PARTIAL_HASH_BLOCK_SIZE), digest_size=16)
+
+        if mediaSize > PARTIAL_HASH_BLOCK_SIZE:
+            mediaFile.seek(max(mediaSize - PARTIAL_HASH_BLOCK_SIZE, PARTIAL_HASH_BLOCK_SIZE))
+            partialHash.update(mediaFile.read(PARTIAL_HASH_BLOCK_SIZE))
+
+    return partialHash.hexdigest()
+
+def getFullHash(mediaPath):
+    fullHash = hashlib.blake2b(digest_size=32)
+    hashBuffer = bytearray(FULL_HASH_CHUNK_SIZE)
+    hashView = memoryview(hashBuffer)
+
+    with open(mediaPath, "rb", buffering=0) as mediaFile:
+        while True:
+            readBytes = mediaFile.readinto(hashBuffer)
+
+            if not readBytes:
+                break
+
+            fullHash.update(hashView[:readBytes]) # hashlib releases the GIL for big updates, so parallel hashing really runs in parallel
+
+    return fullHash.hexdigest()
+
+mediaHashers = {"partial": getPartialHash, "full": getFullHash}
+
+class HashIndex:
+    # Persistent per-destination record of every library media's size and (lazily computed) hashes:
+    # {relative directory: {"mtime": st_mtime_ns, "files": {media name: [size, st_mtime_ns, partial hash, full hash]}}}
+    # Only directories whose mtime changed get listed again and hashes are only ever computed for media that share a size with new media
+    def __init__(self, mediaRootDirectory, mediaFormats):
+        self.mediaRootDirectory = path.normpath(mediaRootDirectory)
+        self.indexPath = path.join(self.mediaRootDirectory, INDEX_DIRECTORY_NAME, HASH_INDEX_FILE_NAME)
+        self.mediaFormats = tuple(mediaFormats)
+        self.directories = {}
+        self.mediaBySize = {} # Size -> [(relative directory, media name)]
+        self.hasChanges = False
+        self.lock = Lock() # Hashes get recorded from the hashing threads
+        self.checkLock = Lock() # Held for a whole duplicate check, see organizer_core.findDuplicateMedia()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.indexPath, "r") as indexFile:
+                indexData = json.load(indexFile)
+
+            if indexData.get("version") == HASH_INDEX_VERSION:
+                self.directories = indexData["directories"]
+        except (OSError, ValueError, KeyError, AttributeError): # Missing or corrupted index simply gets rebuilt on the next refresh
+            self.directories = {}
+
+    def save(self):
+        if not self.hasChanges:
+            return
+
+        try:
+            makedirs(path.dirname(self.indexPath), exist_ok=True)
+
+            with open(f"{self.indexPath}.tmp", "w") as indexFile:
+                json.dump({"version": HASH_INDEX_VERSION, "directories": self.directories}, indexFile)
+
+            replace(f"{self.indexPath}.tmp", self.indexPath) # Atomic swap so a crash never leaves a half-written index behind
+            self.hasChanges = False
+        except OSError as ose: # Read-only destinations still work, they just hash candidates again next time
+            print(f"Could not save hash index: {ose}")
+
+    @tracedPhase
+    def refresh(self):
+        refreshedDirectories = {}
+        directoriesToVisit = [""]
+
+        while directoriesToVisit:
+            relativeDirectory = directoriesToVisit.pop()
+            fullDirectory = path.join(self.mediaRootDirectory, relativeDirectory)
+
+            try:
+                directoryMtime = stat(fullDirectory).st_mtime_ns
+            except OSError: # Directory was removed outside the app
+                continue
+
+            directoryRecord = self.directories.get(relativeDirectory)
+
+            if directoryRecord is None or directoryRecord["mtime"] != directoryMtime:
+                directoryRecord = self.scanDirectory(fullDirectory, directoryMtime, directoryRecord)
+                self.hasChanges = True
+
+                if directoryRecord is None:
+                    continue
+
+            refreshedDirectories[relativeDirectory] = directoryRecord
+            directoriesToVisit.extend(path.join(relativeDirectory, subdirectory) for subdirectory in directoryRecord["subdirectories"])
+
+        self.hasChanges = self.hasChanges or refreshedDirectories.keys() != self.directories.keys()
+        self.directories = refreshedDirectories
+        traceCount(directories=len(refreshedDirectories), stats=len(refreshedDirectories))
+        self.mediaBySize = {}
+
+        for relativeDirectory, directoryRecord in self.directories.items():
+            for mediaName, (mediaSize, *_) in directoryRecord["files"].items():
+                self.mediaBySize.setdefault(mediaSize, []).append((relativeDirectory, mediaName))
+
+    def scanDirectory(self, fullDirectory, directoryMtime, previousRecord):
+        previousFiles = previousRecord["files"] if previousRecord is not None else {}
+        indexedFiles = {}
+        subdirectories = []
+
+        try:
+            with scandir(fullDirectory) as scannedItems:
+                for scannedItem in scannedItems:
+                    if scannedItem.is_dir(follow_symlinks=False):
+                        if scannedItem.name != INDEX_DIRECTORY_NAME:
+                            subdirectories.append(scannedItem.name)
+                    elif scannedItem.name.lower().endswith(self.mediaFormats) and not scannedItem.is_symlink():
+                        mediaStat = scannedItem.stat()
+                        previousFile = previousFiles.get(scannedItem.name)
+
+                        if previousFile is not None and previousFile[0] == mediaStat.st_size and previousFile[1] == mediaStat.st_mtime_ns:
+                            indexedFiles[scannedItem.name] = previousFile # Unchanged media keep their hashes
+                        else:
+                            indexedFiles[scannedItem.name] = [mediaStat.st_size, mediaStat.st_mtime_ns, None, None]
+        except OSError as ose:
+            print(f"Could not index {fullDirectory}: {ose}")
+            return None
+
+        traceCount(rescanned=1, files=len(indexedFiles), stats=len(indexedFiles))
+        trustedMtime = -1 if time.time_ns() - directoryMtime < RACY_MTIME_WINDOW_NS else directoryMtime # Forces a rescan next time since more changes could land without bumping the mtime
+
+        return {"mtime": trustedMtime, "files": indexedFiles, "subdirectories": subdirectories}
+
+    def getRelativeDirectory(self, fullDirectory):
+        relativeDirectory = path.relpath(path.abspath(fullDirectory), self.mediaRootDirectory)
+
+        return "" if relativeDirectory == "." else relativeDirectory
+
+    def getLibraryPath(self, libraryMedia):
+        return path.join(self.mediaRootDirectory, *libraryMedia)
+
+    def getLibraryHash(self, libraryMedia, hashKind):
+        # Cached hashes are only trusted while the media's size and mtime are still the recorded ones
+        relativeDirectory, mediaName = libraryMedia
+        mediaRecord = self.directories[relativeDirectory]["files"][mediaName]
+        libraryPath = self.getLibraryPath(libraryMedia)
+        mediaStat = stat(libraryPath)
+        hashSlot = 2 if hashKind == "partial" else 3
+
+        if mediaRecord[0] == mediaStat.st_size and mediaRecord[1] == mediaStat.st_mtime_ns and mediaRecord[hashSlot] is not None:
+            return mediaRecord[hashSlot]
+
+        mediaHash = mediaHashers[hashKind](libraryPath)
+
+        with self.lock:
+            if mediaRecord[0] != mediaStat.st_size or mediaRecord[1] != mediaStat.st_mtime_ns: # Edited in place, the other hash is stale too
+                mediaRecord[:] = [mediaStat.st_size, mediaStat.st_mtime_ns, None, None]
+
+            mediaRecord[hashSlot] = mediaHash
+            self.hasChanges = True
+
+        return mediaHash
+
+@tracedPhase
+def findDuplicates(mediaFiles, hashIndex, maxWorkers=4, onStage=lambda stageName, candidateCount: None):
+    # mediaFiles are (media path, os.stat_result or MediaEntry) pairs of the new media; returns {media path: full path of the identical library media}
+    hashIndex.refresh()
+    newLibraryMedia = {(hashIndex.getRelativeDirectory(path.dirname(mediaPath)), path.basename(mediaPath)) for mediaPath, _ in mediaFiles} # Media location inside the library is never compared against itself
+    libraryMatchesBySize = {}
+    candidates = {}
+
+    # Stage 1: same size as some library media, empty files never count as duplicates
+    for mediaPath, mediaStat in mediaFiles:
+        if mediaStat.st_size not in libraryMatchesBySize:
+            libraryMatchesBySize[mediaStat.st_size] = [libraryMedia for libraryMedia in hashIndex.mediaBySize.get(mediaStat.st_size, []) if libraryMedia not in newLibraryMedia] if mediaStat.st_size > 0 else []
+
+        if libraryMatchesBySize[mediaStat.st_size]:
+            candidates[mediaPath] = libraryMatchesBySize[mediaStat.st_size]
+
+    traceCount(files=len(mediaFiles), sizeCandidates=len(candidates))
+
+    with ThreadPoolExecutor(max_workers=maxWorkers) as hashingPool:
+        # Stage 2 narrows down by first/last block, stage 3 confirms byte for byte equality with the full hash
+        for hashKind in ("partial", "full"):
+            onStage(hashKind, len(candidates))
+            libraryMediaToHash = sorted({libraryMedia for libraryMatches in candidates.values() for libraryMedia in libraryMatches})
+            newMediaToHash = list(candidates)
+            traceCount(**{f"{hashKind}Hashes": len(libraryMediaToHash) + len(newMediaToHash)})
+            libraryHashes = dict(zip(libraryMediaToHash, hashingPool.map(lambda libraryMedia: getHashOrNone(hashIndex.getLibraryHash, libraryMedia, hashKind), libraryMediaToHash)))
+            newHashes = dict(zip(newMediaToHash, hashingPool.map(lambda mediaPath: getHashOrNone(getMediaHash, mediaPath, hashKind), newMediaToHash)))
+            candidates = {mediaPath: [libraryMedia for libraryMedia in libraryMatches if libraryHashes[libraryMedia] is not None and libraryHashes[libraryMedia] == newHashes[mediaPath]] for mediaPath, libraryMatches in candidates.items()}
+            candidates = {mediaPath: libraryMatches for mediaPath, libraryMatches in candidates.items() if libraryMatches}
+
+    hashIndex.save()
+
+    return {mediaPath: hashIndex.getLibraryPath(libraryMatches[0]) for mediaPath, libraryMatches in candidates.items()}
+
+def getMediaHash(mediaPath, hashKind):
+    return mediaHashers[hashKind](mediaPath)
+
+def getHashOrNone(hashFunction, mediaToHash, hashKind):
+    try:
+        return hashFunction(mediaToHash, hashKind)
+    except (OSError, KeyError) as e: # Removed or unreadable media can't be proven to be duplicates
+        print(f"Could not hash {mediaToHash}: {e}")
+        return None
@@ -0,0 +1,166 @@
+import json
+import time
+from bisect import bisect_left, bisect_right
+from os import scandir, stat, makedirs, replace, path
+from re import compile as compileRegex
+from media_index import INDEX_DIRECTORY_NAME, RACY_MTIME_WINDOW_NS
+from instrumentation import tracedPhase, traceCount
+
+CATALOG_FILE_NAME = "eventCatalog.json"
+CATALOG_VERSION = 1
+CATALOG_REFRESH_INTERVAL_SECONDS = 2 # Date changes and searches refresh the catalog at most this often, see Worker.getEventCatalog()
+yearDirectoryPattern = compileRegex(r"^\d{4}$")
+eventDirectoryPattern = compileRegex(r"^(\d{4})-(\d{2})-(\d{2}): (.*)$") # yyyy-MM-dd: Event Name; groups are year, month, day and event name
+
+class EventCatalog:
+    # Persistent catalog of every Year/Month/yyyy-MM-dd: Event directory of a media root destination, indexed by date and name.
+    # Keeps one record per root, year and month directory: {"mtime": st_mtime_ns, "entries": [names]} where month entries are
+    # [event name, year, month, day]. Only directories whose mtime changed get rescanned, so lookups never touch the disk
+    def __init__(self, mediaRootDirectory, eventMonths):
+        self.mediaRootDirectory = path.normpath(mediaRootDirectory)
+        self.catalogPath = path.join(self.mediaRootDirectory, INDEX_DIRECTORY_NAME, CATALOG_FILE_NAME)
+        self.eventMonths = list(eventMonths)
+        self.directories = {} # Relative directory path ("" is the root itself) -> directory record
+        self.events = [] # (yyyymmdd, event name, year, month, day) sorted by date, then name
+        self.eventDateKeys = [] # yyyymmdd of every event in self.events, bisected for range queries
+        self.eventsByDate = {} # (year, month, day) -> [event names]
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.catalogPath, "r") as catalogFile:
+                catalogData = json.load(catalogFile)
+
+            if catalogData.get("version") == CATALOG_VERSION:
+                self.directories = catalogData["directories"]
+        except (OSError, ValueError, KeyError, AttributeError): # Missing or corrupted catalog simply gets rebuilt on the next refresh
+            self.directories = {}
+
+        self.buildLookups()
+
+    def save(self):
+        try:
+            makedirs(path.dirname(self.catalogPath), exist_ok=True)
+
+            with open(f"{self.catalogPath}.tmp", "w") as catalogFile:
+                json.dump({"version": CATALOG_VERSION, "directories": self.directories}, catalogFile)
+
+            replace(f"{self.catalogPath}.tmp", self.catalogPath) # Atomic swap so a crash never leaves a half-written catalog behind
+        except OSError as ose: # Read-only destinations still work, they just rescan changed directories every time
+            print(f"Could not save event catalog: {ose}")
+
+    @tracedPhase
+    def refresh(self):
+        # Root lists years, years list months, months list events; nothing deeper is ever visited
+        refreshedDirectories = {}
+        directoriesToVisit = [("", 0)] # (relative directory, depth)
+        wasRescanned = False
+
+        while directoriesToVisit:
+            relativeDirectory, directoryDepth = directoriesToVisit.pop()
+            fullDirectory = path.join(self.mediaRootDirectory, relativeDirectory)
+
+            try:
+                directoryMtime = stat(fullDirectory).st_mtime_ns
+            except OSError: # Directory was removed outside the app
+                wasRescanned = wasRescanned or relativeDirectory in self.directories
+                continue
+
+            directoryRecord = self.directories.get(relativeDirectory)
+
+            if directoryRecord is None or directoryRecord["mtime"] != directoryMtime:
+                directoryRecord = self.scanDirectory(fullDirectory, directoryMtime, directoryDepth)
+                wasRescanned = True
+
+                if directoryRecord is None:
+                    continue
+
+            refreshedDirectories[relativeDirectory] = directoryRecord
+
+            if directoryDepth < 2:
+                directoriesToVisit.extend((path.join(relativeDirectory, subdirectory), directoryDepth + 1) for subdirectory in directoryRecord["entries"])
+
+        wasRescanned = wasRescanned or refreshedDirectories.keys() != self.directories.keys()
+        self.directories = refreshedDirectories
+        traceCount(directories=len(refreshedDirectories), stats=len(refreshedDirectories))
+
+        if wasRescanned: # Unchanged destinations don't rewrite the catalog on every refresh
+            self.buildLookups()
+            self.save()
+
+    def scanDirectory(self, fullDirectory, directoryMtime, directoryDepth):
+        directoryEntries = []
+
+        try:
+            with scandir(fullDirectory) as scannedItems:
+                for scannedItem in scannedItems:
+                    if not scannedItem.is_dir(follow_symlinks=False):
+                        continue
+
+                    if directoryDepth == 0 and yearDirectoryPattern.match(scannedItem.name):
+                        directoryEntries.append(scannedItem.name)
+                    elif directoryDepth == 1 and scannedItem.name in self.eventMonths:
+                        directoryEntries.append(scannedItem.name)
+                    elif directoryDepth == 2:
+                        matchedEventDirectory = eventDirectoryPattern.match(scannedItem.name)
+
+                        if matchedEventDirectory: # Anything that doesn't follow yyyy-MM-dd: Event Name is skipped instead of crashing the parse
+                            eventYear, eventMonth, eventDay, eventName = matchedEventDirectory.groups()
+                            directoryEntries.append([eventName, int(eventYear), int(eventMonth), int(eventDay)])
+        except OSError as ose:
+            print(f"Could not catalog {fullDirectory}: {ose}")
+            return None
+
+        traceCount(rescanned=1)
+
+        return {"mtime": self.getTrustedMtime(directoryMtime), "entries": directoryEntries}
+
+    def getTrustedMtime(self, directoryMtime):
+        if time.time_ns() - directoryMtime < RACY_MTIME_WINDOW_NS:
+            return -1 # Forces a rescan next time since more changes could land without bumping the mtime
+
+        return directoryMtime
+
+    def buildLookups(self):
+        self.events = []
+        self.eventsByDate = {}
+
+        for relativeDirectory, directoryRecord in self.directories.items():
+            if relativeDirectory.count(path.sep) != 1: # Only Year/Month records hold events
+                continue
+
+            for eventName, eventYear, eventMonth, eventDay in directoryRecord["entries"]:
+                self.events.append((eventYear * 10000 + eventMonth * 100 + eventDay, eventName, eventYear, eventMonth, eventDay))
+
+        self.events.sort()
+        self.eventDateKeys = [eventDateKey for eventDateKey, *_ in self.events]
+
+        for _, eventName, eventYear, eventMonth, eventDay in self.events:
+            self.eventsByDate.setdefault((eventYear, eventMonth, eventDay), []).append(eventName)
+
+    def getEventsOn(self, eventYear, eventMonth, eventDay):
+        return self.eventsByDate.get((eventYear, eventMonth, eventDay), [])
+
+    def getEventsBetween(self, firstDate, lastDate):
+        # Dates are (year, month, day) tuples, both ends included; returns (event name, year, month, day) oldest first
+        firstEventRow = bisect_left(self.eventDateKeys, firstDate[0] * 10000 + firstDate[1] * 100 + firstDate[2])
+        lastEventRow = bisect_right(self.eventDateKeys, lastDate[0] * 10000 + lastDate[1] * 100 + lastDate[2])
+
+        return [(eventName, eventYear, eventMonth, eventDay) for _, eventName, eventYear, eventMonth, eventDay in self.events[firstEventRow:lastEventRow]]
+
+    def getEventsInMonth(self, eventYear, eventMonth):
+        return self.getEventsBetween((eventYear, eventMonth, 1), (eventYear, eventMonth, 31))
+
+    def findEvents(self, searchText):
+        # "2024", "2024-06" and "2024-06-14" are date range queries, anything else matches event names case-insensitively
+        searchText = searchText.strip()
+        dateParts = searchText.split("-")
+
+        if searchText and len(dateParts) <= 3 and all(datePart.isdigit() for datePart in dateParts) and len(dateParts[0]) == 4:
+            dateParts = [int(datePart) for datePart in dateParts]
+
+            return self.getEventsBetween(tuple(dateParts + [1, 1][len(dateParts) - 1:]), tuple(dateParts + [12, 31][len(dateParts) - 1:]))
+
+        searchText = searchText.lower()
+
+        return [(eventName, eventYear, eventMonth, eventDay) for _, eventName, eventYear, eventMonth, eventDay in self.events if searchText in eventName.lower()]
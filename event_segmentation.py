@@ -0,0 +1,112 @@
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from organizer_core import getEventDirectory, getMediaSortTime
+from media_snapshot import getMediaSnapshot
+from instrumentation import tracedPhase, traceCount
+
+# Splits one media location (e.g. a card with a whole weekend on it) into events wherever the capture times jump by more than a
+# threshold or cross into the next day. Capture times are read and sorted once; after that a threshold change is a binary search
+# over the pre-sorted gaps, so the slider re-segments a 20k file card in a few milliseconds. Must never import PyQt6 either
+
+DEFAULT_GAP_MINUTES = 120
+DEFAULT_DAY_START_HOUR = 0 # Midnight; e.g. 4 keeps a party that runs past midnight in one event
+SECONDS_PER_DAY = 24 * 60 * 60
+WALL_CLOCK_EPOCH = datetime(1970, 1, 1)
+
+class CaptureTimeline:
+    # Media names and capture times (modification time if there is none) of one media location, oldest first
+    def __init__(self, mediaLocationDirectory, mediaNames, captureTimes):
+        self.mediaLocationDirectory = mediaLocationDirectory
+        self.mediaNames = mediaNames
+        self.captureTimes = array("d", captureTimes)
+        self.wallClockSeconds = array("q", (int((datetime.fromtimestamp(captureTime) - WALL_CLOCK_EPOCH).total_seconds()) for captureTime in captureTimes)) # Local time in seconds, so days break at local midnight
+        captureGaps = [nextCaptureTime - captureTime for captureTime, nextCaptureTime in zip(self.captureTimes, self.captureTimes[1:])]
+        self.gapRows = sorted(range(len(captureGaps)), key=captureGaps.__getitem__) # Gap rows shortest first; gap row N lies between media N and N + 1
+        self.sortedGaps = array("d", (captureGaps[gapRow] for gapRow in self.gapRows))
+        self.dayBoundaries = {} # Day start hour -> rows that start a new day
+
+    def __len__(self):
+        return len(self.mediaNames)
+
+    def getDayBoundaries(self, dayStartHour):
+        if dayStartHour not in self.dayBoundaries:
+            mediaDays = [self.getDayNumber(wallClockSecond, dayStartHour) for wallClockSecond in self.wallClockSeconds]
+            self.dayBoundaries[dayStartHour] = [mediaRow for mediaRow in range(1, len(mediaDays)) if mediaDays[mediaRow] != mediaDays[mediaRow - 1]]
+
+        return self.dayBoundaries[dayStartHour]
+
+    def getDayNumber(self, wallClockSecond, dayStartHour):
+        return (wallClockSecond - dayStartHour * 3600) // SECONDS_PER_DAY
+
+    def segment(self, gapMinutes, splitAtDays=True, dayStartHour=DEFAULT_DAY_START_HOUR):
+        # Returns (first row, end row) of every event, end row excluded
+        splitRows = {gapRow + 1 for gapRow in self.gapRows[bisect_right(self.sortedGaps, gapMinutes * 60):]} # Only the gaps longer than the threshold
+
+        if splitAtDays:
+            splitRows.update(self.getDayBoundaries(dayStartHour))
+
+        eventBoundaries = [0] + sorted(splitRows) + [len(self.mediaNames)]
+
+        return [(firstRow, endRow) for firstRow, endRow in zip(eventBoundaries, eventBoundaries[1:]) if endRow > firstRow]
+
+    def getEventDate(self, mediaRow, dayStartHour=DEFAULT_DAY_START_HOUR):
+        # (year, month, day) the media counts towards; shortly after midnight still belongs to the day before if the day starts later
+        eventDate = WALL_CLOCK_EPOCH + timedelta(days=self.getDayNumber(self.wallClockSeconds[mediaRow], dayStartHour))
+
+        return eventDate.year, eventDate.month, eventDate.day
+
+class EventProposal:
+    # One proposed event: a run of the timeline, its date and the (editable) event name
+    def __init__(self, firstRow, endRow, eventDate, eventName):
+        self.firstRow = firstRow
+        self.endRow = endRow
+        self.eventDate = eventDate
+        self.eventName = eventName
+
+    def getMediaCount(self):
+        return self.endRow - self.firstRow
+
+@tracedPhase
+def loadCaptureTimeline(mediaLocationDirectory, metadataCache=None):
+    # Raises OSError if the media location is gone. Capture times come from the metadata cache wherever it has them
+    mediaEntries = getMediaSnapshot(mediaLocationDirectory).mediaEntries
+    captureTimes = {}
+
+    if metadataCache is not None:
+        captureTimes = metadataCache.getCaptureTimes([(f"{mediaLocationDirectory}/{mediaEntry.name}", mediaEntry) for mediaEntry in mediaEntries])
+        metadataCache.save()
+
+    mediaTimes = sorted((getMediaSortTime(captureTimes.get(f"{mediaLocationDirectory}/{mediaEntry.name}"), mediaEntry), mediaEntry.name) for mediaEntry in mediaEntries)
+    traceCount(files=len(mediaTimes))
+
+    return CaptureTimeline(mediaLocationDirectory, [mediaName for _, mediaName in mediaTimes], [mediaTime for mediaTime, _ in mediaTimes])
+
+def proposeEvents(captureTimeline, eventSegments, eventCatalog=None, dayStartHour=DEFAULT_DAY_START_HOUR):
+    # Prefills the names of events the library already has on the same date, in order, so a second card of the same day lands next to the first
+    eventProposals = []
+    proposalsByDate = {}
+
+    for firstRow, endRow in eventSegments:
+        eventDate = captureTimeline.getEventDate(firstRow, dayStartHour)
+        knownEventNames = eventCatalog.getEventsOn(*eventDate) if eventCatalog is not None else []
+        dateProposalCount = proposalsByDate.get(eventDate, 0)
+        eventProposals.append(EventProposal(firstRow, endRow, eventDate, knownEventNames[dateProposalCount] if dateProposalCount < len(knownEventNames) else ""))
+        proposalsByDate[eventDate] = dateProposalCount + 1
+
+    return eventProposals
+
+def getMediaDestinations(captureTimeline, eventProposals, mediaRootDirectory):
+    # Media name -> event directory, the format OrganizeJob takes; media of events without a name stay in the media location
+    mediaDestinations = {}
+
+    for eventProposal in eventProposals:
+        if not eventProposal.eventName.strip():
+            continue
+
+        eventDirectory = getEventDirectory(mediaRootDirectory, *eventProposal.eventDate, eventProposal.eventName.strip())
+
+        for mediaName in captureTimeline.mediaNames[eventProposal.firstRow:eventProposal.endRow]:
+            mediaDestinations[mediaName] = eventDirectory
+
+    return mediaDestinations
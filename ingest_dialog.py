@@ -0,0 +1,83 @@
+from os import path
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, QTableWidgetItem, QComboBox, QHeaderView, QProgressBar
+from duplicate_dialog import duplicateActionLabels, getReadableSize
+
+ingestJobStateLabels = {"queued": "Waiting for device", "running": "Renaming", "finished": "Done", "failed": "Failed", "cancelled": "Cancelled"}
+
+class IngestDialog(QDialog):
+    # Non-modal list of the ingest queue: one row per queued media location with its own progress, the queue's total throughput at the bottom
+    def __init__(self, ingestQueue, parentWidget=None):
+        super().__init__(parentWidget)
+        self.ingestQueue = ingestQueue
+        self.setWindowTitle("Ingest Queue")
+        self.resize(1000, 400)
+        self.dialogLayout = QVBoxLayout(self)
+        self.dialogLayout.addWidget(QLabel("Media locations on different devices are renamed at the same time, media locations on the same device one after another."))
+
+        self.jobTable = QTableWidget(0, 6)
+        self.jobTable.setHorizontalHeaderLabels(["Media Location", "Event Directory", "Code", "Device", "Progress", "State"])
+        self.jobTable.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.jobTable.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.Stretch)
+        self.jobTable.verticalHeader().hide()
+        self.jobRows = {} # Job number -> table row
+        self.dialogLayout.addWidget(self.jobTable)
+
+        self.queueFooterLayout = QHBoxLayout()
+        self.throughputLabel = QLabel()
+        self.queueFooterLayout.addWidget(self.throughputLabel)
+        self.queueFooterLayout.addStretch()
+
+        # Applies to media locations queued from now on, nobody is around to answer a duplicate dialog per card
+        self.queueFooterLayout.addWidget(QLabel("Duplicates:"))
+        self.duplicateActionComboBox = QComboBox()
+
+        for duplicateAction, actionLabel in duplicateActionLabels.items():
+            self.duplicateActionComboBox.addItem(actionLabel, duplicateAction)
+
+        self.duplicateActionComboBox.setCurrentIndex(self.duplicateActionComboBox.findData("keep"))
+        self.queueFooterLayout.addWidget(self.duplicateActionComboBox)
+        self.clearButton = QPushButton("Clear Finished")
+        self.clearButton.clicked.connect(self.clearFinishedJobs)
+        self.cancelButton = QPushButton("Cancel All")
+        self.cancelButton.clicked.connect(self.ingestQueue.cancelAll)
+        self.queueFooterLayout.addWidget(self.clearButton)
+        self.queueFooterLayout.addWidget(self.cancelButton)
+        self.dialogLayout.addLayout(self.queueFooterLayout)
+        self.showThroughput()
+
+    def getDuplicateAction(self):
+        return self.duplicateActionComboBox.currentData()
+
+    def showJob(self, ingestJob):
+        if ingestJob.jobNumber not in self.jobRows:
+            jobRow = self.jobTable.rowCount()
+            self.jobTable.insertRow(jobRow)
+            self.jobTable.setItem(jobRow, 0, QTableWidgetItem(ingestJob.mediaLocationDirectory))
+            self.jobTable.setItem(jobRow, 1, QTableWidgetItem(path.basename(ingestJob.mediaDestinationDirectory)))
+            self.jobTable.setItem(jobRow, 2, QTableWidgetItem(ingestJob.mediaCode))
+            self.jobTable.setItem(jobRow, 3, QTableWidgetItem(ingestJob.deviceKey))
+            self.jobTable.setCellWidget(jobRow, 4, QProgressBar())
+            self.jobTable.setItem(jobRow, 5, QTableWidgetItem())
+            self.jobRows[ingestJob.jobNumber] = jobRow
+
+        jobRow = self.jobRows[ingestJob.jobNumber]
+        jobProgressBar = self.jobTable.cellWidget(jobRow, 4)
+        jobProgressBar.setMaximum(max(ingestJob.totalMediaCount, 1))
+        jobProgressBar.setValue(ingestJob.renamedMediaCount)
+        jobProgressBar.setFormat(f"{ingestJob.renamedMediaCount}/{ingestJob.totalMediaCount} media  •  {ingestJob.filesPerSecond:.1f} files/s  •  {ingestJob.megabytesPerSecond:.1f} MB/s" if ingestJob.state == "running" else f"{ingestJob.renamedMediaCount}/{ingestJob.totalMediaCount} media")
+        self.jobTable.item(jobRow, 5).setText(ingestJob.error or ingestJobStateLabels[ingestJob.state])
+        self.showThroughput()
+
+    def showThroughput(self):
+        filesPerSecond, megabytesPerSecond = self.ingestQueue.getThroughput()
+        renamedMediaBytes = sum(ingestJob.renamedMediaBytes for ingestJob in self.ingestQueue.ingestJobs)
+        runningJobCount = len([ingestJob for ingestJob in self.ingestQueue.ingestJobs if ingestJob.state == "running"])
+        self.throughputLabel.setText(f"{runningJobCount} running  •  {filesPerSecond:.1f} files/s  •  {megabytesPerSecond:.1f} MB/s  •  {getReadableSize(renamedMediaBytes)} moved")
+
+    def clearFinishedJobs(self):
+        self.ingestQueue.clearFinishedJobs()
+        self.jobTable.setRowCount(0)
+        self.jobRows = {}
+
+        for ingestJob in self.ingestQueue.ingestJobs:
+            self.showJob(ingestJob)
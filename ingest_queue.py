@@ -0,0 +1,184 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+from threading import Event, Lock
+from organizer_core import OrganizeJob, findDuplicateMedia
+
+# Runs several organize jobs (one per card reader / media location) at once: jobs whose media locations are on different physical
+# devices run in parallel, jobs on the same device wait for each other so the device never seeks between two streams.
+# CODE_N numbers stay unique across jobs of one destination through MediaIndex.reserveMediaNumbers(). Must never import PyQt6,
+# the command line batch mode uses it too
+
+MAX_PARALLEL_DEVICES = 8
+JOB_PROGRESS_INTERVAL_SECONDS = 0.2 # Per file progress is coalesced, four busy card readers would otherwise flood the GUI thread
+
+def getDeviceKey(mediaLocationDirectory):
+    # Partitions of one disk share its spindle (or flash controller), so on Linux they map to the whole disk; elsewhere st_dev is the best guess
+    deviceNumber = os.stat(mediaLocationDirectory).st_dev
+
+    try:
+        blockDevicePath = path.realpath(f"/sys/dev/block/{os.major(deviceNumber)}:{os.minor(deviceNumber)}")
+
+        if path.exists(path.join(blockDevicePath, "partition")):
+            blockDevicePath = path.dirname(blockDevicePath)
+
+        if path.exists(blockDevicePath):
+            return path.basename(blockDevicePath) # e.g. "sdb" for /dev/sdb1 and /dev/sdb2
+    except (AttributeError, OSError): # No os.major() on Windows
+        pass
+
+    return str(deviceNumber)
+
+class IngestJob:
+    # One queued (media location, code, event directory) job and its live progress; read by the GUI thread, written by the device thread
+    def __init__(self, jobNumber, mediaLocationDirectory, mediaDestinationDirectory, mediaCode, mediaIndex, copyConcurrency=1, mediaOrdering="mtime", metadataCache=None, duplicateAction="keep", hashIndex=None):
+        self.jobNumber = jobNumber
+        self.mediaLocationDirectory = mediaLocationDirectory
+        self.mediaDestinationDirectory = mediaDestinationDirectory
+        self.mediaCode = mediaCode
+        self.mediaIndex = mediaIndex
+        self.copyConcurrency = copyConcurrency
+        self.mediaOrdering = mediaOrdering
+        self.metadataCache = metadataCache
+        self.duplicateAction = duplicateAction # "skip", "link" or "keep" for every duplicate of this job, like --duplicates
+        self.hashIndex = hashIndex
+        self.deviceKey = getDeviceKey(mediaLocationDirectory)
+        self.cancelEvent = Event()
+        self.state = "queued"
+        self.totalMediaCount, self.totalMediaBytes = 0, 0
+        self.renamedMediaCount, self.renamedMediaBytes = 0, 0
+        self.filesPerSecond, self.megabytesPerSecond = 0.0, 0.0
+        self.lastReportTime = 0.0
+        self.result = None # OrganizeJob result once finished
+        self.error = None
+
+    def cancel(self):
+        self.cancelEvent.set() # Queued jobs never start, a running one stops between files
+
+class IngestQueue:
+    # Callbacks are plain functions and get called from the device threads, the GUI forwards them as Qt signals (see rename_engine.IngestQueueSignals)
+    def __init__(self, maxParallelDevices=MAX_PARALLEL_DEVICES):
+        self.ingestJobs = []
+        self.lastJobNumber = 0
+        self.deviceQueues = {} # Device key -> deque of queued jobs, each device is worked off by one thread
+        self.busyDevices = set()
+        self.lock = Lock()
+        self.idleEvent = Event()
+        self.idleEvent.set()
+        self.devicePool = ThreadPoolExecutor(max_workers=maxParallelDevices, thread_name_prefix="IngestDevice")
+        self.busySince = None
+        self.busySeconds = 0.0 # Time any job was running, for the queue's overall throughput
+        self.clearedMediaCount, self.clearedMediaBytes = 0, 0 # Progress of jobs removed from the list still counts towards the throughput
+        self.onJobChanged = lambda ingestJob: None
+        self.onQueueFinished = lambda: None
+        self.onLog = print
+
+    def addJob(self, mediaLocationDirectory, mediaDestinationDirectory, mediaCode, mediaIndex, copyConcurrency=1, mediaOrdering="mtime", metadataCache=None, duplicateAction="keep", hashIndex=None):
+        with self.lock:
+            self.lastJobNumber += 1
+            ingestJob = IngestJob(self.lastJobNumber, mediaLocationDirectory, mediaDestinationDirectory, mediaCode, mediaIndex, copyConcurrency, mediaOrdering, metadataCache, duplicateAction, hashIndex)
+            self.ingestJobs.append(ingestJob)
+            self.deviceQueues.setdefault(ingestJob.deviceKey, deque()).append(ingestJob)
+
+            if ingestJob.deviceKey not in self.busyDevices:
+                if not self.busyDevices:
+                    self.busySince = time.monotonic()
+                    self.idleEvent.clear()
+
+                self.busyDevices.add(ingestJob.deviceKey)
+                self.devicePool.submit(self.runDeviceQueue, ingestJob.deviceKey)
+
+        self.onJobChanged(ingestJob)
+
+        return ingestJob
+
+    def runDeviceQueue(self, deviceKey):
+        while True:
+            with self.lock:
+                if not self.deviceQueues[deviceKey]:
+                    self.busyDevices.discard(deviceKey)
+                    isQueueFinished = not self.busyDevices
+
+                    if isQueueFinished:
+                        self.busySeconds += time.monotonic() - self.busySince
+                        self.busySince = None
+                        self.idleEvent.set()
+
+                    break
+
+                ingestJob = self.deviceQueues[deviceKey].popleft()
+
+            self.runJob(ingestJob)
+
+        if isQueueFinished:
+            self.onQueueFinished()
+
+    def runJob(self, ingestJob):
+        if ingestJob.cancelEvent.is_set():
+            ingestJob.state = "cancelled"
+            self.onJobChanged(ingestJob)
+            return
+
+        ingestJob.state = "running"
+        self.onJobChanged(ingestJob)
+
+        try:
+            duplicateMedia = findDuplicateMedia(ingestJob.mediaLocationDirectory, ingestJob.hashIndex) if ingestJob.duplicateAction != "keep" and ingestJob.hashIndex is not None else {}
+            organizeJob = OrganizeJob(ingestJob.mediaLocationDirectory, ingestJob.mediaDestinationDirectory, ingestJob.mediaCode, ingestJob.mediaIndex, ingestJob.copyConcurrency, ingestJob.cancelEvent, ingestJob.mediaOrdering, ingestJob.metadataCache, {mediaName: (ingestJob.duplicateAction, libraryMediaPath) for mediaName, (libraryMediaPath, _) in duplicateMedia.items()})
+            organizeJob.onStarted = lambda totalMediaCount, totalMediaBytes: self.jobStarted(ingestJob, totalMediaCount, totalMediaBytes)
+            organizeJob.onProgress = lambda renamedMediaCount, renamedMediaBytes, filesPerSecond, megabytesPerSecond, secondsLeft: self.jobProgressed(ingestJob, renamedMediaCount, renamedMediaBytes, filesPerSecond, megabytesPerSecond)
+            organizeJob.onLog = self.onLog
+            ingestJob.result = organizeJob.run()
+            ingestJob.state = "cancelled" if ingestJob.result["cancelled"] else "failed" if ingestJob.result["failed"] else "finished"
+        except Exception as e: # General error catching, the other jobs of the queue keep going
+            ingestJob.error = str(e)
+            ingestJob.state = "failed"
+
+        self.onJobChanged(ingestJob)
+
+    def jobStarted(self, ingestJob, totalMediaCount, totalMediaBytes):
+        ingestJob.totalMediaCount, ingestJob.totalMediaBytes = totalMediaCount, totalMediaBytes
+        self.onJobChanged(ingestJob)
+
+    def jobProgressed(self, ingestJob, renamedMediaCount, renamedMediaBytes, filesPerSecond, megabytesPerSecond):
+        ingestJob.renamedMediaCount, ingestJob.renamedMediaBytes = renamedMediaCount, renamedMediaBytes
+        ingestJob.filesPerSecond, ingestJob.megabytesPerSecond = filesPerSecond, megabytesPerSecond
+
+        if time.monotonic() - ingestJob.lastReportTime >= JOB_PROGRESS_INTERVAL_SECONDS or renamedMediaCount == ingestJob.totalMediaCount:
+            ingestJob.lastReportTime = time.monotonic()
+            self.onJobChanged(ingestJob)
+
+    def getThroughput(self):
+        # (files per second, megabytes per second) of all jobs together over the time the queue was busy
+        with self.lock:
+            busySeconds = self.busySeconds + (time.monotonic() - self.busySince if self.busySince is not None else 0)
+            renamedMediaCount = self.clearedMediaCount + sum(ingestJob.renamedMediaCount for ingestJob in self.ingestJobs)
+            renamedMediaBytes = self.clearedMediaBytes + sum(ingestJob.renamedMediaBytes for ingestJob in self.ingestJobs)
+
+        if busySeconds <= 0:
+            return 0.0, 0.0
+
+        return renamedMediaCount / busySeconds, renamedMediaBytes / busySeconds / (1024 * 1024)
+
+    def isBusy(self):
+        return not self.idleEvent.is_set()
+
+    def isQueued(self, mediaLocationDirectory):
+        # A media location can only be in the queue once at a time, a second job would find its media gone halfway
+        return any(path.normpath(ingestJob.mediaLocationDirectory) == path.normpath(mediaLocationDirectory) for ingestJob in self.ingestJobs if ingestJob.state in ("queued", "running"))
+
+    def cancelAll(self):
+        for ingestJob in self.ingestJobs:
+            ingestJob.cancel()
+
+    def waitUntilIdle(self, timeoutSeconds=None):
+        return self.idleEvent.wait(timeoutSeconds)
+
+    def clearFinishedJobs(self):
+        with self.lock:
+            finishedJobs = [ingestJob for ingestJob in self.ingestJobs if ingestJob.state not in ("queued", "running")]
+            self.clearedMediaCount += sum(ingestJob.renamedMediaCount for ingestJob in finishedJobs)
+            self.clearedMediaBytes += sum(ingestJob.renamedMediaBytes for ingestJob in finishedJobs)
+            self.ingestJobs = [ingestJob for ingestJob in self.ingestJobs if ingestJob not in finishedJobs]
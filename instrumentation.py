@@ -0,0 +1,245 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+from os import path, makedirs, replace
+from utils import getCacheDirectory
+
+# Opt-in timing spans for Worker slots and the phases under them (scans, index refreshes, decodes, moves), exported as a
+# Chrome trace / Perfetto JSON file. Off by default: traced()/tracedPhase() functions then cost a single attribute check and
+# traceCount() returns right away. Turn it on with PEO_TRACE=1 (or PEO_TRACE=/path/to/trace.json), from the trace panel
+# (Ctrl+Shift+T) or with --trace in the command line batch mode. Must never import PyQt6
+
+TRACE_ENVIRONMENT_VARIABLE = "PEO_TRACE"
+STARTUP_REPORT_ENVIRONMENT_VARIABLE = "PEO_STARTUP_REPORT"
+MAX_TRACE_EVENTS = 500_000 # Oldest events are dropped first, roughly 100 MB of trace at most
+RECENT_OPERATIONS = 2000 # Finished spans the trace panel picks the slowest ones from
+DEFAULT_SLOW_OPERATION_MS = 100
+slowOperationThresholdsMs = {
+    # GUI thread slots that run for more than a couple of frames are what users report as "hangs"
+    "imageSelected": 32,
+    "mediaBatchScanned": 32,
+    "filterMediaList": 32,
+    "showEventDirectories": 50,
+    "addEventDirectories": 50,
+    "searchEvents": 32,
+    "showPreview": 32
+}
+
+class TraceSpan:
+    __slots__ = ("tracer", "name", "category", "args", "startTime")
+
+    # Gets executed upon creating an instance of the class
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        getActiveSpans().append(self)
+        self.startTime = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, exceptionTraceback):
+        durationNs = time.perf_counter_ns() - self.startTime
+        getActiveSpans().pop()
+
+        if exceptionType is not None:
+            self.args["error"] = f"{exceptionType.__name__}: {exceptionValue}"
+
+        self.tracer.recordSpan(self, durationNs)
+        return False
+
+    def count(self, **counts):
+        # Files, bytes, stat calls, ...; add up once per phase instead of once per file to stay cheap
+        for countName, countValue in counts.items():
+            self.args[countName] = self.args.get(countName, 0) + countValue
+
+    def annotate(self, **details):
+        self.args.update(details)
+
+class NullSpan:
+    # Stand-in while tracing is off; shared, so turning a phase into a span allocates nothing
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, exceptionTraceback):
+        return False
+
+    def count(self, **counts):
+        pass
+
+    def annotate(self, **details):
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Tracer:
+    # Gets executed upon creating an instance of the class
+    def __init__(self):
+        self.enabled = False
+        self.tracePath = None
+        self.traceEvents = deque(maxlen=MAX_TRACE_EVENTS) # deque.append is atomic, so spans from worker threads need no lock
+        self.recentOperations = deque(maxlen=RECENT_OPERATIONS)
+        self.threadNames = {}
+        self.originTime = time.perf_counter_ns()
+        self.processId = os.getpid()
+        self.onLog = print # The command line batch mode sends these to stderr
+
+    def enable(self, tracePath=None):
+        self.tracePath = tracePath or path.join(getCacheDirectory("traces"), f"peo-trace-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.traceEvents.clear()
+        self.recentOperations.clear()
+        self.threadNames = {}
+
+    def span(self, name, category="phase", **args):
+        return TraceSpan(self, name, category, args) if self.enabled else NULL_SPAN
+
+    def recordSpan(self, traceSpan, durationNs):
+        threadId = threading.get_ident()
+
+        if threadId not in self.threadNames:
+            self.threadNames[threadId] = threading.current_thread().name
+
+        durationMs = durationNs / 1_000_000
+        self.traceEvents.append({"name": traceSpan.name, "cat": traceSpan.category, "ph": "X", "ts": (traceSpan.startTime - self.originTime) / 1000, "dur": durationNs / 1000, "pid": self.processId, "tid": threadId, "args": traceSpan.args})
+        self.recentOperations.append((durationMs, traceSpan.name, self.threadNames[threadId], traceSpan.args))
+
+        if self.isSlow(traceSpan.name, durationMs):
+            self.onLog(f"Slow operation: {traceSpan.name} took {durationMs:.1f} ms {traceSpan.args if traceSpan.args else ''}")
+
+    def addCounter(self, name, **values):
+        # Shows up as a graph track in Perfetto, e.g. renamed media over time
+        if self.enabled:
+            self.traceEvents.append({"name": name, "ph": "C", "ts": (time.perf_counter_ns() - self.originTime) / 1000, "pid": self.processId, "tid": threading.get_ident(), "args": values})
+
+    def addInstant(self, name, **details):
+        # Single point in time, e.g. the window's first paint
+        if self.enabled:
+            self.traceEvents.append({"name": name, "ph": "i", "s": "p", "ts": (time.perf_counter_ns() - self.originTime) / 1000, "pid": self.processId, "tid": threading.get_ident(), "args": details})
+
+    def getSlowestOperations(self, operationLimit=50):
+        # (milliseconds, span name, thread name, counts) of the slowest recent spans, slowest first
+        return sorted(list(self.recentOperations), key=lambda recentOperation: recentOperation[0], reverse=True)[:operationLimit]
+
+    def isSlow(self, name, durationMs):
+        return durationMs >= slowOperationThresholdsMs.get(name, DEFAULT_SLOW_OPERATION_MS)
+
+    def exportTrace(self, tracePath=None):
+        tracePath = tracePath or self.tracePath
+
+        if tracePath is None or not self.traceEvents:
+            return None
+
+        # Thread names as metadata events so Perfetto labels the GUI thread and the pool threads
+        threadEvents = [{"name": "thread_name", "ph": "M", "pid": self.processId, "tid": threadId, "args": {"name": threadName}} for threadId, threadName in list(self.threadNames.items())]
+
+        try:
+            makedirs(path.dirname(path.abspath(tracePath)), exist_ok=True)
+
+            with open(f"{tracePath}.tmp", "w") as traceFile:
+                json.dump({"traceEvents": threadEvents + list(self.traceEvents), "displayTimeUnit": "ms"}, traceFile, default=str)
+
+            replace(f"{tracePath}.tmp", tracePath)
+            self.onLog(f"Trace written to {tracePath}")
+
+            return tracePath
+        except OSError as ose:
+            self.onLog(f"Could not write trace: {ose}")
+            return None
+
+class StartupTimer:
+    # Milliseconds from launch (main.py imports this module first) to the startup milestones: imports done, window created,
+    # first paint, ready. PEO_STARTUP_REPORT=1 prints them, PEO_STARTUP_REPORT=/path/to/report.json also writes them as JSON
+    def __init__(self):
+        self.launchTime = time.perf_counter_ns()
+        self.startupMarks = {}
+
+    def mark(self, markName):
+        self.startupMarks[markName] = round((time.perf_counter_ns() - self.launchTime) / 1_000_000, 1)
+        tracer.addInstant(markName, sinceLaunchMs=self.startupMarks[markName])
+
+    def report(self):
+        reportSetting = os.environ.get(STARTUP_REPORT_ENVIRONMENT_VARIABLE, "")
+
+        if not reportSetting or reportSetting.lower() in ("0", "false", "no"):
+            return
+
+        print(f"Startup: {', '.join(f'{markName} {markMs} ms' for markName, markMs in self.startupMarks.items())}")
+
+        if reportSetting.lower() not in ("1", "true", "yes"):
+            try:
+                with open(reportSetting, "w") as reportFile:
+                    json.dump(self.startupMarks, reportFile, indent=4)
+            except OSError as ose:
+                print(f"Could not write startup report: {ose}")
+
+tracer = Tracer() # One per process; the GUI, the background jobs and the command line batch mode all record into it
+startupTimer = StartupTimer()
+threadState = threading.local()
+
+def getActiveSpans():
+    # Spans that are open on the calling thread, innermost last
+    if not hasattr(threadState, "activeSpans"):
+        threadState.activeSpans = []
+
+    return threadState.activeSpans
+
+def traceSpan(name, category="phase", **args):
+    return tracer.span(name, category, **args)
+
+def traceCount(**counts):
+    # Adds files, bytes, stat calls, ... to the innermost open span of this thread
+    if tracer.enabled and getActiveSpans():
+        getActiveSpans()[-1].count(**counts)
+
+def traceAnnotate(**details):
+    if tracer.enabled and getActiveSpans():
+        getActiveSpans()[-1].annotate(**details)
+
+def traced(function):
+    # Wraps a Worker slot in a span named after it. Qt passes every signal argument to a plain Python callable,
+    # so the wrapper only forwards as many positional arguments as the slot itself takes
+    argumentCount = function.__code__.co_argcount
+    takesAnyArguments = bool(function.__code__.co_flags & 0x04) # CO_VARARGS
+
+    @wraps(function)
+    def tracedFunction(*args, **kwargs):
+        slotArguments = args if takesAnyArguments else args[:argumentCount]
+
+        if not tracer.enabled:
+            return function(*slotArguments, **kwargs)
+
+        with TraceSpan(tracer, function.__name__, "slot", {}):
+            return function(*slotArguments, **kwargs)
+
+    return tracedFunction
+
+def tracedPhase(function):
+    # Wraps an internal phase (index refresh, scan, decode, ...) in a span named Class.method
+    @wraps(function)
+    def tracedFunction(*args, **kwargs):
+        if not tracer.enabled:
+            return function(*args, **kwargs)
+
+        with TraceSpan(tracer, function.__qualname__, "phase", {}):
+            return function(*args, **kwargs)
+
+    return tracedFunction
+
+def enableTracingFromEnvironment():
+    traceSetting = os.environ.get(TRACE_ENVIRONMENT_VARIABLE, "")
+
+    if traceSetting and traceSetting.lower() not in ("0", "false", "no"):
+        tracer.enable(None if traceSetting.lower() in ("1", "true", "yes") else traceSetting)
+        atexit.register(tracer.exportTrace) # Written when the app exits, the trace panel can save one any time
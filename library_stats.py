@@ -0,0 +1,95 @@
+import json
+import time
+from os import path
+from organizer_core import eventMonths
+from event_catalog import yearDirectoryPattern, eventDirectoryPattern
+from instrumentation import tracedPhase, traceCount
+
+# Media, videos and bytes of a media root destination per year, month, event and media code. Sums the media index's per-directory
+# records (kept up to date by the app's own moves, changed subtrees are revalidated by mtime) instead of walking the library, so a
+# 500k media library is summed in milliseconds. Must never import PyQt6 either
+
+statGroupings = {"year": "Year", "month": "Month", "event": "Event", "code": "Media Code"}
+OTHER_NAME = "Other" # Media outside the Year/Month/yyyy-MM-dd: Event hierarchy (or without a CODE_N name), so every grouping adds up to the totals
+
+class LibraryStats:
+    # statRows are grouping -> [(name, media, videos, bytes)] sorted by name, OTHER_NAME last
+    def __init__(self, mediaRootDirectory, statRows, directoryCount, isRevalidated, sumSeconds):
+        self.mediaRootDirectory = mediaRootDirectory
+        self.statRows = statRows
+        self.directoryCount = directoryCount
+        self.isRevalidated = isRevalidated # False while the numbers are still the persisted ones, changes made outside the app may be missing
+        self.sumSeconds = sumSeconds
+        self.mediaCount = sum(mediaCount for _, mediaCount, _, _ in statRows["year"])
+        self.videoCount = sum(videoCount for _, _, videoCount, _ in statRows["year"])
+        self.mediaBytes = sum(mediaBytes for _, _, _, mediaBytes in statRows["year"])
+        self.eventCount = sum(statName != OTHER_NAME for statName, _, _, _ in statRows["event"])
+
+    def getRows(self, statGrouping):
+        return self.statRows[statGrouping]
+
+    def toResult(self):
+        return {
+            "destination": self.mediaRootDirectory,
+            "media": self.mediaCount,
+            "images": self.mediaCount - self.videoCount,
+            "videos": self.videoCount,
+            "bytes": self.mediaBytes,
+            "events": self.eventCount,
+            "directories": self.directoryCount,
+            "revalidated": self.isRevalidated,
+            **{statGrouping: [{"name": statName, "media": mediaCount, "images": mediaCount - videoCount, "videos": videoCount, "bytes": mediaBytes} for statName, mediaCount, videoCount, mediaBytes in statRows] for statGrouping, statRows in self.statRows.items()}
+        }
+
+@tracedPhase
+def getLibraryStats(mediaIndex, revalidate=True):
+    # revalidate=False only sums what the index already knows, without a single stat call (what the dashboard shows first)
+    if revalidate:
+        mediaIndex.refresh() # Only rescans directories whose mtime changed
+
+    startTime = time.perf_counter()
+    statTotals = {statGrouping: {} for statGrouping in statGroupings} # Grouping -> name -> [media, videos, bytes]
+    directoryRecords = mediaIndex.getDirectoryRecords()
+
+    for relativeDirectory, directoryRecord in directoryRecords:
+        if directoryRecord["count"] == 0:
+            continue
+
+        yearName, monthName, eventName = getHierarchyNames(relativeDirectory)
+
+        for statGrouping, statName in (("year", yearName), ("month", monthName), ("event", eventName)):
+            addToTotals(statTotals[statGrouping], statName, directoryRecord["count"], directoryRecord["videos"], directoryRecord["bytes"])
+
+        for mediaCode, (codeMediaCount, codeMediaBytes, codeVideoCount, _) in directoryRecord["codes"].items():
+            addToTotals(statTotals["code"], mediaCode or OTHER_NAME, codeMediaCount, codeVideoCount, codeMediaBytes)
+
+    statRows = {statGrouping: sorted(((statName, *statTotal) for statName, statTotal in groupTotals.items()), key=lambda statRow: (statRow[0] == OTHER_NAME, statRow[0])) for statGrouping, groupTotals in statTotals.items()}
+    traceCount(directories=len(directoryRecords), events=len(statRows["event"]))
+
+    return LibraryStats(mediaIndex.mediaRootDirectory, statRows, len(directoryRecords), revalidate, time.perf_counter() - startTime)
+
+def getHierarchyNames(relativeDirectory):
+    # (year, month, event) a directory counts towards: "2024", "2024-05", "2024-05-01: Party"; media further down count towards their event
+    directoryNames = relativeDirectory.split(path.sep) if relativeDirectory else []
+    yearName, monthName, eventName = OTHER_NAME, OTHER_NAME, OTHER_NAME
+
+    if directoryNames and yearDirectoryPattern.match(directoryNames[0]):
+        yearName = directoryNames[0]
+
+        if len(directoryNames) > 1 and directoryNames[1] in eventMonths:
+            monthName = f"{yearName}-{eventMonths.index(directoryNames[1]) + 1:02d}"
+
+            if len(directoryNames) > 2 and eventDirectoryPattern.match(directoryNames[2]):
+                eventName = directoryNames[2]
+
+    return yearName, monthName, eventName
+
+def addToTotals(groupTotals, statName, mediaCount, videoCount, mediaBytes):
+    statTotal = groupTotals.setdefault(statName, [0, 0, 0])
+    statTotal[0] += mediaCount
+    statTotal[1] += videoCount
+    statTotal[2] += mediaBytes
+
+def exportLibraryStats(libraryStats, exportPath):
+    with open(exportPath, "w", encoding="utf-8") as exportFile:
+        json.dump(libraryStats.toResult(), exportFile, indent=2)
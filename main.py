@@ -1,12 +1,17 @@
+from instrumentation import startupTimer, enableTracingFromEnvironment # First import, startup times are measured from here
 import sys
+import multiprocessing
 from ui_components import ApplicationWindow
 from PyQt6.QtWidgets import QApplication
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Decoder processes (see decode_service.py) start the frozen app executable again
+    startupTimer.mark("imported")
+    enableTracingFromEnvironment() # PEO_TRACE=1 records a trace from the very first slot
     app = QApplication([])
     appScreen = app.primaryScreen()
     screenGeometry = appScreen.geometry()
 
     applicationWindow = ApplicationWindow(screenGeometry)
     applicationWindow.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    sys.exit(app.exec())
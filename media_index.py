@@ -0,0 +1,215 @@
+import json
+import time
+from os import scandir, stat, makedirs, replace, path
+from re import compile as compileRegex
+from threading import RLock
+from media_snapshot import getMediaKind, MEDIA_KIND_VIDEO
+from instrumentation import tracedPhase, traceCount
+
+INDEX_DIRECTORY_NAME = ".peo" # Hidden directory inside the media root destination that holds the app's persistent indexes
+INDEX_FILE_NAME = "mediaIndex.json"
+INDEX_VERSION = 3 # 2 added bytes, videos and codes, 3 moved the highest CODE_N number into the codes; older indexes are rebuilt once
+RACY_MTIME_WINDOW_NS = 2_000_000_000 # Directories modified this recently may still change within the same mtime tick (NAS/FAT timestamps are coarse), so they are never trusted
+mediaNumberPattern = compileRegex(r"^(.+)_(\d+)\.[^.]+$") # CODE_N.ext; group 1 is CODE, group 2 is N
+
+class MediaIndex:
+    # Persistent per-destination media counter. Keeps one record per directory of the media root destination:
+    # {"mtime": st_mtime_ns, "count": supported media files, "subdirectories": [names], "bytes": size of its media,
+    #  "videos": how many of them are videos, "codes": {CODE: [media, bytes, videos, highest N]}}
+    # A directory's mtime only changes when entries are added, removed or renamed inside it, so unchanged directories are
+    # trusted as-is and only subtrees that changed outside the app get rescanned. The records double as the per-directory
+    # rollups of the library statistics (see library_stats.py), so those never walk the library either
+    def __init__(self, mediaRootDirectory, mediaFormats):
+        self.mediaRootDirectory = path.normpath(mediaRootDirectory)
+        self.indexDirectory = path.join(self.mediaRootDirectory, INDEX_DIRECTORY_NAME)
+        self.indexPath = path.join(self.indexDirectory, INDEX_FILE_NAME)
+        self.mediaFormats = tuple(mediaFormats)
+        self.directories = {} # Relative directory path ("" is the root itself) -> directory record
+        self.mediaNumberReservations = {} # Reservation id -> highest CODE_N number a running job has planned but not moved yet
+        self.lastReservationId = 0
+        self.hasChanges = False # Only a changed index is written back
+        self.lock = RLock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.indexPath, "r") as indexFile:
+                indexData = json.load(indexFile)
+
+            if indexData.get("version") == INDEX_VERSION and indexData.get("formats") == list(self.mediaFormats):
+                self.directories = indexData["directories"]
+        except (OSError, ValueError, KeyError, AttributeError): # Missing or corrupted index simply gets rebuilt on the next refresh
+            self.directories = {}
+
+    def save(self):
+        if not self.hasChanges:
+            return
+
+        try:
+            makedirs(self.indexDirectory, exist_ok=True)
+            temporaryIndexPath = f"{self.indexPath}.tmp"
+
+            with open(temporaryIndexPath, "w") as indexFile:
+                json.dump({"version": INDEX_VERSION, "formats": list(self.mediaFormats), "directories": self.directories}, indexFile)
+
+            replace(temporaryIndexPath, self.indexPath) # Atomic swap so a crash never leaves a half-written index behind
+            self.hasChanges = False
+        except OSError as ose: # Read-only destinations still work, they just rescan changed directories every time
+            print(f"Could not save media index: {ose}")
+
+    @tracedPhase
+    def refresh(self):
+        with self.lock: # Queued jobs of one destination share this index from their own threads
+            refreshedDirectories = {}
+            directoriesToVisit = [""]
+
+            while directoriesToVisit:
+                relativeDirectory = directoriesToVisit.pop()
+                fullDirectory = path.join(self.mediaRootDirectory, relativeDirectory)
+
+                try:
+                    directoryMtime = stat(fullDirectory).st_mtime_ns
+                except OSError: # Directory was removed outside the app
+                    continue
+
+                directoryRecord = self.directories.get(relativeDirectory)
+
+                if directoryRecord is None or directoryRecord["mtime"] != directoryMtime:
+                    directoryRecord = self.scanDirectory(fullDirectory, directoryMtime)
+                    self.hasChanges = True
+
+                    if directoryRecord is None:
+                        continue
+
+                refreshedDirectories[relativeDirectory] = directoryRecord
+                directoriesToVisit.extend(path.join(relativeDirectory, subdirectory) for subdirectory in directoryRecord["subdirectories"])
+
+            self.hasChanges = self.hasChanges or len(refreshedDirectories) != len(self.directories) # Directories removed outside the app
+            self.directories = refreshedDirectories
+            traceCount(directories=len(refreshedDirectories), stats=len(refreshedDirectories))
+            self.save()
+
+    def scanDirectory(self, fullDirectory, directoryMtime):
+        directoryRecord = {"mtime": self.getTrustedMtime(directoryMtime), "count": 0, "subdirectories": [], "bytes": 0, "videos": 0, "codes": {}}
+
+        try:
+            with scandir(fullDirectory) as scannedItems:
+                for scannedItem in scannedItems:
+                    if scannedItem.is_dir(follow_symlinks=False):
+                        if scannedItem.name != INDEX_DIRECTORY_NAME:
+                            directoryRecord["subdirectories"].append(scannedItem.name)
+                    elif scannedItem.name.lower().endswith(self.mediaFormats):
+                        addMediaToRecord(directoryRecord, scannedItem.name, getMediaBytes(scannedItem))
+        except OSError as ose:
+            print(f"Could not index {fullDirectory}: {ose}")
+            return None
+
+        traceCount(rescanned=1, files=directoryRecord["count"])
+
+        return directoryRecord
+
+    def getTrustedMtime(self, directoryMtime):
+        if time.time_ns() - directoryMtime < RACY_MTIME_WINDOW_NS:
+            return -1 # Forces a rescan next time since more changes could land without bumping the mtime
+
+        return directoryMtime
+
+    def recordMovedMedia(self, destinationDirectory, movedMedia):
+        # Called after renameMedia so the next lookup doesn't have to rescan the event directory the app just filled.
+        # movedMedia are (new media name, size in bytes) pairs
+        with self.lock: # Queued jobs of one destination share this index from their own threads
+            relativeDirectory = self.getRelativeDirectory(destinationDirectory)
+
+            if relativeDirectory is None:
+                return
+
+            directoryRecord = self.directories.get(relativeDirectory)
+
+            if directoryRecord is None or directoryRecord["mtime"] == -1: # Unknown or untrusted directory, count it from scratch instead
+                directoryRecord = self.scanDirectory(destinationDirectory, stat(destinationDirectory).st_mtime_ns)
+
+                if directoryRecord is not None:
+                    self.directories[relativeDirectory] = directoryRecord
+            else:
+                for mediaName, mediaBytes in movedMedia:
+                    addMediaToRecord(directoryRecord, mediaName, mediaBytes)
+
+                directoryRecord["mtime"] = self.getTrustedMtime(stat(destinationDirectory).st_mtime_ns)
+
+            self.hasChanges = True
+            self.save()
+
+    def getRelativeDirectory(self, fullDirectory):
+        relativeDirectory = path.relpath(path.normpath(fullDirectory), self.mediaRootDirectory)
+
+        if relativeDirectory == ".":
+            return ""
+        if relativeDirectory == ".." or relativeDirectory.startswith(f"..{path.sep}"): # Directory is outside of the media root destination
+            return None
+
+        return relativeDirectory
+
+    @tracedPhase
+    def reserveMediaNumbers(self, excludedDirectory, mediaCount, mediaCodes, journaledMediaNumber=0):
+        # Hands out the next mediaCount CODE_N numbers. Jobs running side by side (ingest queue) plan their numbers before their media land
+        # in the tree, so numbers still held by other jobs count as taken too, and so do the remaining numbers of resumable jobs up to
+        # journaledMediaNumber (see rename_journal.getJournaledMediaNumber()). Only names with one of mediaCodes count towards the highest
+        # number; camera names like PXL_20231225_183210123.jpg match CODE_N.ext too. Returns (reservation id, first number)
+        with self.lock:
+            self.refresh() # Only rescans directories whose mtime changed since the last refresh instead of walking the whole media root destination
+            firstMediaNumber = max(self.getMediaCount(excludedDirectory), self.getHighestMediaNumber(mediaCodes, excludedDirectory), max(self.mediaNumberReservations.values(), default=0), journaledMediaNumber) + 1 # Never reuse a CODE_N number that is already taken
+
+            return self.holdMediaNumbers(firstMediaNumber + mediaCount - 1), firstMediaNumber
+
+    def holdMediaNumbers(self, highestMediaNumber):
+        # Keeps numbers up to highestMediaNumber taken until releaseMediaNumbers(), e.g. the remaining plan of a resumed job
+        with self.lock:
+            self.lastReservationId += 1
+            self.mediaNumberReservations[self.lastReservationId] = highestMediaNumber
+
+            return self.lastReservationId
+
+    def releaseMediaNumbers(self, reservationId):
+        # Called once the job's media are in the tree (and recorded), or the job gave up; its numbers are then counted from the tree again
+        with self.lock:
+            self.mediaNumberReservations.pop(reservationId, None)
+
+    def getMediaCount(self, excludedDirectory=None):
+        excludedRelativeDirectory = self.getRelativeDirectory(excludedDirectory) if excludedDirectory else None # Media location being renamed in place is not counted
+
+        return sum(directoryRecord["count"] for relativeDirectory, directoryRecord in self.directories.items() if relativeDirectory != excludedRelativeDirectory)
+
+    def getHighestMediaNumber(self, mediaCodes, excludedDirectory=None):
+        excludedRelativeDirectory = self.getRelativeDirectory(excludedDirectory) if excludedDirectory else None
+        mediaCodes = {mediaCode.upper() for mediaCode in mediaCodes}
+
+        return max((codeTotals[3] for relativeDirectory, directoryRecord in self.directories.items() if relativeDirectory != excludedRelativeDirectory for mediaCode, codeTotals in directoryRecord["codes"].items() if mediaCode in mediaCodes), default=0)
+
+    def getDirectoryRecords(self):
+        # Snapshot of (relative directory, directory record) pairs that stays consistent while jobs keep recording moves
+        with self.lock:
+            return [(relativeDirectory, dict(directoryRecord, codes={mediaCode: list(codeTotals) for mediaCode, codeTotals in directoryRecord["codes"].items()})) for relativeDirectory, directoryRecord in self.directories.items()]
+
+def addMediaToRecord(directoryRecord, mediaName, mediaBytes):
+    matchedMediaName = mediaNumberPattern.match(mediaName)
+    mediaCode = matchedMediaName.group(1).upper() if matchedMediaName else "" # Media that don't follow CODE_N.ext count towards no code
+    isVideo = getMediaKind(mediaName) == MEDIA_KIND_VIDEO
+    codeTotals = directoryRecord["codes"].setdefault(mediaCode, [0, 0, 0, 0])
+    directoryRecord["count"] += 1
+    directoryRecord["bytes"] += mediaBytes
+    directoryRecord["videos"] += isVideo
+    codeTotals[0] += 1
+    codeTotals[1] += mediaBytes
+    codeTotals[2] += isVideo
+    codeTotals[3] = max(codeTotals[3], int(matchedMediaName.group(2)) if matchedMediaName else 0)
+
+def getMediaBytes(scannedItem):
+    try:
+        return scannedItem.stat().st_size # Follows links, so a linked duplicate counts like the media it stands for
+    except OSError: # Broken link or the file vanished mid-scan
+        return 0
+
+def getMediaNumber(mediaName):
+    matchedMediaName = mediaNumberPattern.match(mediaName)
+
+    return int(matchedMediaName.group(2)) if matchedMediaName else 0
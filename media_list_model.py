@@ -0,0 +1,204 @@
+from array import array
+from bisect import bisect_right
+from os import scandir, stat
+from organizer_core import getMediaSortTime
+from media_snapshot import getMediaSnapshot, getMediaKind, MediaEntry
+from instrumentation import tracedPhase
+from PyQt6.QtCore import Qt, QObject, QRunnable, QAbstractListModel, QSortFilterProxyModel, QModelIndex, pyqtSignal
+
+FIRST_SCAN_BATCH_SIZE = 500 # Small first batch so the first screen of media shows up right away; every later batch doubles so big folders only need a handful of merges
+
+class MediaCatalog:
+    # Compact column storage of the listed media (one array per field instead of one item object per file), oldest first
+    def __init__(self):
+        self.names = []
+        self.sortTimes = array("d") # Last modified or capture time, whichever the media list is ordered by
+        self.kinds = array("B")
+        self.nameSet = set() # Fast membership checks for incremental rescans
+
+    def __len__(self):
+        return len(self.names)
+
+# Signals live on a separate QObject because QRunnable is not a QObject and cannot emit signals by itself
+class MediaScanSignals(QObject):
+    batchScanned = pyqtSignal(int, list) # Scan generation, [(media name, sort time, media kind)]
+    scanFinished = pyqtSignal(int, object) # Scan generation, set of every media name found (None if the directory is gone)
+
+class MediaScanTask(QRunnable):
+    # Streams a directory listing to the GUI thread in batches so the first screen of a huge folder shows up right away.
+    # The listing is the media location's snapshot (see media_snapshot.py), so renaming it afterwards doesn't scan it again
+    def __init__(self, targetDirectory, scanGeneration, mediaOrdering="mtime", metadataCache=None):
+        super().__init__()
+        self.targetDirectory = targetDirectory
+        self.mediaOrdering = mediaOrdering
+        self.metadataCache = metadataCache
+        self.scanGeneration = scanGeneration
+        self.signals = MediaScanSignals()
+
+    @tracedPhase
+    def run(self):
+        try:
+            mediaSnapshot = getMediaSnapshot(self.targetDirectory, lambda mediaEntries: self.signals.batchScanned.emit(self.scanGeneration, self.getSortedBatch(mediaEntries)), FIRST_SCAN_BATCH_SIZE)
+        except OSError: # Directory was removed or is unreadable
+            self.signals.scanFinished.emit(self.scanGeneration, None)
+            return
+
+        if self.metadataCache is not None and self.mediaOrdering == "capture":
+            self.metadataCache.save()
+
+        self.signals.scanFinished.emit(self.scanGeneration, {mediaEntry.name for mediaEntry in mediaSnapshot.mediaEntries})
+
+    def getSortedBatch(self, mediaEntries):
+        # Swaps the entries for (name, the time the media list is ordered by, kind); capture times are read in parallel from the headers
+        if self.metadataCache is not None and self.mediaOrdering == "capture":
+            captureTimes = self.metadataCache.getCaptureTimes([(f"{self.targetDirectory}/{mediaEntry.name}", mediaEntry) for mediaEntry in mediaEntries])
+
+            return [(mediaEntry.name, getMediaSortTime(captureTimes[f"{self.targetDirectory}/{mediaEntry.name}"], mediaEntry), mediaEntry.kind) for mediaEntry in mediaEntries]
+
+        return [(mediaEntry.name, mediaEntry.st_mtime, mediaEntry.kind) for mediaEntry in mediaEntries]
+
+class MediaChangesTask(MediaScanTask):
+    # Directory watcher updates: a names-only listing is diffed against the listed names and only media that are new get a stat call
+    # (and a capture time lookup), instead of scanning the whole directory again. Same signals as a full scan, so the new media are
+    # placed into the order by bisect and vanished ones removed the same way
+    def __init__(self, targetDirectory, scanGeneration, listedMediaNames, mediaOrdering="mtime", metadataCache=None):
+        super().__init__(targetDirectory, scanGeneration, mediaOrdering, metadataCache)
+        self.listedMediaNames = listedMediaNames # The catalog's nameSet; only read here, membership checks are safe while the GUI thread adds to it
+
+    @tracedPhase
+    def run(self):
+        try:
+            with scandir(self.targetDirectory) as scannedItems: # From os.scandir, no stat calls for the names
+                currentMediaNames = {scannedItem.name for scannedItem in scannedItems if getMediaKind(scannedItem.name) is not None}
+        except OSError: # Directory was removed or is unreadable
+            self.signals.scanFinished.emit(self.scanGeneration, None)
+            return
+
+        newMediaEntries = []
+
+        for mediaName in [mediaName for mediaName in currentMediaNames if mediaName not in self.listedMediaNames]:
+            try:
+                mediaStat = stat(f"{self.targetDirectory}/{mediaName}")
+            except OSError: # Removed again right away (e.g. a sync client's temporary name)
+                currentMediaNames.discard(mediaName)
+                continue
+
+            newMediaEntries.append(MediaEntry(mediaName, mediaStat.st_size, mediaStat.st_mtime_ns, getMediaKind(mediaName)))
+
+        if newMediaEntries:
+            self.signals.batchScanned.emit(self.scanGeneration, self.getSortedBatch(newMediaEntries))
+
+            if self.metadataCache is not None and self.mediaOrdering == "capture":
+                self.metadataCache.save()
+
+        self.signals.scanFinished.emit(self.scanGeneration, currentMediaNames)
+
+class MediaListModel(QAbstractListModel):
+    # Gets executed upon creating an instance of the class
+    def __init__(self):
+        super().__init__()
+        self.catalog = MediaCatalog()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.catalog)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        # Only called for rows that are actually visible, nothing is built for rows scrolled out of view
+        if role == Qt.ItemDataRole.DisplayRole and index.isValid():
+            return self.catalog.names[index.row()]
+
+        return None
+
+    def getMediaName(self, row):
+        return self.catalog.names[row]
+
+    def clearMedia(self):
+        self.beginResetModel()
+        self.catalog = MediaCatalog()
+        self.endResetModel()
+
+    def addMedia(self, mediaBatch):
+        # Merges new media into the sort time order, media that are already listed are skipped
+        catalog = self.catalog
+        mediaBatch = sorted((media for media in mediaBatch if media[0] not in catalog.nameSet), key=lambda media: media[1])
+
+        if not mediaBatch:
+            return
+
+        if not catalog.sortTimes or mediaBatch[0][1] >= catalog.sortTimes[-1]: # Newer than everything listed, the common case for streamed and freshly shot media
+            self.beginInsertRows(QModelIndex(), len(catalog), len(catalog) + len(mediaBatch) - 1)
+            self.appendToCatalog(catalog, mediaBatch)
+            self.endInsertRows()
+        elif len(mediaBatch) <= 32: # A few stragglers, e.g. from the directory watcher
+            for mediaName, mediaSortTime, mediaKind in mediaBatch:
+                mediaRow = bisect_right(catalog.sortTimes, mediaSortTime)
+                self.beginInsertRows(QModelIndex(), mediaRow, mediaRow)
+                catalog.names.insert(mediaRow, mediaName)
+                catalog.sortTimes.insert(mediaRow, mediaSortTime)
+                catalog.kinds.insert(mediaRow, mediaKind)
+                catalog.nameSet.add(mediaName)
+                self.endInsertRows()
+        else: # Both runs are already sorted, so timsort merges them in linear time; one layout change and the selection follows its media to the new row
+            self.layoutAboutToBeChanged.emit()
+            mergedNames = catalog.names + [mediaName for mediaName, _, _ in mediaBatch]
+            mergedSortTimes = catalog.sortTimes + array("d", [mediaSortTime for _, mediaSortTime, _ in mediaBatch])
+            mergedKinds = catalog.kinds + array("B", [mediaKind for _, _, mediaKind in mediaBatch])
+            mergedOrder = sorted(range(len(mergedNames)), key=mergedSortTimes.__getitem__)
+            oldToNewRows = array("l", bytes(len(mergedOrder) * array("l").itemsize))
+
+            for newRow, sourceRow in enumerate(mergedOrder):
+                oldToNewRows[sourceRow] = newRow
+
+            catalog.names = [mergedNames[sourceRow] for sourceRow in mergedOrder]
+            catalog.sortTimes = array("d", [mergedSortTimes[sourceRow] for sourceRow in mergedOrder])
+            catalog.kinds = array("B", [mergedKinds[sourceRow] for sourceRow in mergedOrder])
+            catalog.nameSet.update(mediaName for mediaName, _, _ in mediaBatch)
+            persistentIndexes = self.persistentIndexList()
+            self.changePersistentIndexList(persistentIndexes, [self.index(oldToNewRows[persistentIndex.row()]) for persistentIndex in persistentIndexes])
+            self.layoutChanged.emit()
+
+    def appendToCatalog(self, catalog, mediaBatch):
+        for mediaName, mediaSortTime, mediaKind in mediaBatch:
+            catalog.names.append(mediaName)
+            catalog.sortTimes.append(mediaSortTime)
+            catalog.kinds.append(mediaKind)
+            catalog.nameSet.add(mediaName)
+
+    def removeMediaNotIn(self, currentMediaNames):
+        # Removes media that vanished from the directory, bottom rows first and one call per contiguous run of rows
+        catalog = self.catalog
+        removedRows = [mediaRow for mediaRow, mediaName in enumerate(catalog.names) if mediaName not in currentMediaNames]
+
+        while removedRows:
+            lastRow = removedRows.pop()
+            firstRow = lastRow
+
+            while removedRows and removedRows[-1] == firstRow - 1:
+                firstRow = removedRows.pop()
+
+            self.beginRemoveRows(QModelIndex(), firstRow, lastRow)
+            catalog.nameSet.difference_update(catalog.names[firstRow:lastRow + 1])
+            del catalog.names[firstRow:lastRow + 1]
+            del catalog.sortTimes[firstRow:lastRow + 1]
+            del catalog.kinds[firstRow:lastRow + 1]
+            self.endRemoveRows()
+
+class MediaFilterProxyModel(QSortFilterProxyModel):
+    # Filters the media list by name and media kind without touching the underlying catalog or the view
+    def __init__(self):
+        super().__init__()
+        self.nameFilter = ""
+        self.kindFilter = None # None, MEDIA_KIND_IMAGE or MEDIA_KIND_VIDEO
+
+    def setMediaFilter(self, nameFilter, kindFilter):
+        self.nameFilter = nameFilter.lower()
+        self.kindFilter = kindFilter
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        catalog = self.sourceModel().catalog
+
+        if self.kindFilter is not None and catalog.kinds[sourceRow] != self.kindFilter:
+            return False
+
+        return not self.nameFilter or self.nameFilter in catalog.names[sourceRow].lower()
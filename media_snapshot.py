@@ -0,0 +1,156 @@
+import time
+from collections import OrderedDict
+from os import scandir, stat, path
+from threading import Lock
+from instrumentation import tracedPhase, traceCount, traceAnnotate
+
+# One directory listing per user action: the media list, the rename count, the duplicate check and the rename job all read the
+# same snapshot of a media location instead of scanning (and stat'ing every file of) it again. A snapshot is reused as long as
+# the directory's own mtime is unchanged, which costs a single stat call; on network mounts every stat is a round trip.
+# Must never import PyQt6, the command line batch mode uses it too
+
+supportedVideoFormats = [".mp4", ".avi", ".mkv", ".mov", ".wmv", ".flv", ".webm", ".mpeg", ".mpg", ".3gp", ".m4v", ".rm", ".ogv", ".ts", ".vob", ".divx", ".xvid", ".amv"]
+supportedImageFormats = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".tif", ".webp", ".heif", ".heic", ".svg", ".eps", ".ico", ".raw", ".ai", ".exr"]
+supportedMediaFormats = supportedImageFormats + supportedVideoFormats
+
+MEDIA_KIND_IMAGE = 0
+MEDIA_KIND_VIDEO = 1
+mediaKindsByExtension = {**{imageFormat: MEDIA_KIND_IMAGE for imageFormat in supportedImageFormats}, **{videoFormat: MEDIA_KIND_VIDEO for videoFormat in supportedVideoFormats}}
+
+MAX_CACHED_SNAPSHOTS = 8
+MAX_SNAPSHOT_AGE_SECONDS = 300 # Long enough for confirm dialogs and the duplicate check, short enough that a missed change can't linger
+RACY_MTIME_SECONDS = 2 # A directory changed this close to its scan may change again within the same mtime tick (FAT has 2 second ticks)
+
+cachedSnapshots = OrderedDict() # Normalized media directory -> MediaSnapshot, least recently used first
+cachedSnapshotsLock = Lock()
+
+def getMediaKind(mediaName):
+    # MEDIA_KIND_IMAGE, MEDIA_KIND_VIDEO or None for unsupported files; one dictionary lookup instead of an endswith() per format
+    extensionStart = mediaName.rfind(".")
+    return mediaKindsByExtension.get(mediaName[extensionStart:].lower()) if extensionStart != -1 else None
+
+class MediaEntry:
+    # Named like the os.stat_result fields it keeps, so capture time and duplicate lookups take an entry wherever they took a stat result
+    __slots__ = ("name", "st_size", "st_mtime_ns", "kind")
+
+    # Gets executed upon creating an instance of the class
+    def __init__(self, name, st_size, st_mtime_ns, kind):
+        self.name = name
+        self.st_size = st_size
+        self.st_mtime_ns = st_mtime_ns
+        self.kind = kind
+
+    @property
+    def st_mtime(self):
+        return self.st_mtime_ns / 1_000_000_000
+
+class MediaSnapshot:
+    # Supported media of one directory in directory order, as they were when it was scanned
+    def __init__(self, mediaDirectory, directoryMtime, mediaEntries):
+        self.mediaDirectory = mediaDirectory
+        self.directoryMtime = directoryMtime
+        self.mediaEntries = mediaEntries
+        self.scanTime = time.time()
+
+    def __len__(self):
+        return len(self.mediaEntries)
+
+    def isCurrent(self, directoryMtime):
+        if directoryMtime != self.directoryMtime or time.time() - self.scanTime > MAX_SNAPSHOT_AGE_SECONDS:
+            return False
+
+        return self.scanTime - directoryMtime / 1_000_000_000 > RACY_MTIME_SECONDS
+
+def getCachedMediaSnapshot(mediaDirectory):
+    # Returns the snapshot if the directory hasn't changed since it was scanned, None otherwise
+    with cachedSnapshotsLock:
+        mediaSnapshot = cachedSnapshots.get(path.normpath(mediaDirectory))
+
+    if mediaSnapshot is None:
+        return None
+
+    try:
+        directoryMtime = stat(mediaDirectory).st_mtime_ns
+    except OSError:
+        forgetMediaSnapshot(mediaDirectory)
+        return None
+
+    if not mediaSnapshot.isCurrent(directoryMtime):
+        return None
+
+    with cachedSnapshotsLock:
+        cachedSnapshots.move_to_end(path.normpath(mediaDirectory), last=True)
+
+    return mediaSnapshot
+
+def forgetMediaSnapshot(mediaDirectory):
+    # For changes the directory mtime doesn't show (or not yet), e.g. after moving media out of it or a watcher notification
+    with cachedSnapshotsLock:
+        cachedSnapshots.pop(path.normpath(mediaDirectory), None)
+
+@tracedPhase
+def getMediaSnapshot(mediaDirectory, onBatch=None, firstBatchSize=500):
+    # Raises OSError if the directory is gone or unreadable. onBatch gets the entries in growing batches while scanning (or the cached
+    # ones in the same batches) so a huge folder can show its first media right away; every batch is twice the size of the previous one
+    mediaSnapshot = getCachedMediaSnapshot(mediaDirectory)
+
+    if mediaSnapshot is not None:
+        traceAnnotate(cached=True)
+        traceCount(files=len(mediaSnapshot), stats=1)
+
+        if onBatch is not None:
+            batchStart, batchSize = 0, firstBatchSize
+
+            while batchStart < len(mediaSnapshot.mediaEntries):
+                onBatch(mediaSnapshot.mediaEntries[batchStart:batchStart + batchSize])
+                batchStart, batchSize = batchStart + batchSize, batchSize * 2
+
+        return mediaSnapshot
+
+    directoryMtime = stat(mediaDirectory).st_mtime_ns # Before the scan, so a change during the scan makes the snapshot stale rather than wrong
+    mediaEntries = []
+    batchStart, batchSize = 0, firstBatchSize
+
+    with scandir(mediaDirectory) as scannedItems: # From os.scandir
+        for scannedItem in scannedItems:
+            mediaKind = getMediaKind(scannedItem.name)
+
+            if mediaKind is None: # Only supported image and video files
+                continue
+
+            try:
+                mediaStat = scannedItem.stat() # Comes with the directory listing on Windows, one call per file elsewhere
+            except OSError: # Removed while scanning
+                continue
+
+            mediaEntries.append(MediaEntry(scannedItem.name, mediaStat.st_size, mediaStat.st_mtime_ns, mediaKind))
+
+            if onBatch is not None and len(mediaEntries) - batchStart >= batchSize:
+                onBatch(mediaEntries[batchStart:])
+                batchStart, batchSize = len(mediaEntries), batchSize * 2
+
+    if onBatch is not None and len(mediaEntries) > batchStart:
+        onBatch(mediaEntries[batchStart:])
+
+    mediaSnapshot = MediaSnapshot(mediaDirectory, directoryMtime, mediaEntries)
+    traceAnnotate(cached=False)
+    traceCount(files=len(mediaEntries), stats=len(mediaEntries) + 1)
+
+    with cachedSnapshotsLock:
+        cachedSnapshots[path.normpath(mediaDirectory)] = mediaSnapshot
+        cachedSnapshots.move_to_end(path.normpath(mediaDirectory), last=True)
+
+        while len(cachedSnapshots) > MAX_CACHED_SNAPSHOTS:
+            cachedSnapshots.popitem(last=False)
+
+    return mediaSnapshot
+
+def countMedia(mediaDirectory):
+    # Cheap enough for the GUI thread: the snapshot's count if there is a current one, otherwise names only without any stat calls
+    mediaSnapshot = getCachedMediaSnapshot(mediaDirectory)
+
+    if mediaSnapshot is not None:
+        return len(mediaSnapshot)
+
+    with scandir(mediaDirectory) as scannedItems: # From os.scandir
+        return len([scannedItem for scannedItem in scannedItems if getMediaKind(scannedItem.name) is not None])
@@ -0,0 +1,64 @@
+from os import path
+from PyQt6.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+class MediaDirectoryWatcher(QObject):
+    COALESCE_INTERVAL_MS = 300 # Bursts of changes (tethered shooting, sync clients) update the media list at most ~3 times per second
+
+    directoryChanged = pyqtSignal(str) # Coalesced; emitted at most once per COALESCE_INTERVAL_MS
+
+    # Gets executed upon creating an instance of the class
+    def __init__(self):
+        super().__init__()
+        self.watchedDirectory = None
+        self.isWaiting = False # True while the watched directory doesn't exist yet and its closest existing parent is watched instead
+        self.fileSystemWatcher = QFileSystemWatcher(self) # Uses inotify/FSEvents/ReadDirectoryChangesW under the hood
+        self.fileSystemWatcher.directoryChanged.connect(self.directoryTouched)
+        self.coalesceTimer = QTimer(self)
+        self.coalesceTimer.setSingleShot(True)
+        self.coalesceTimer.setInterval(self.COALESCE_INTERVAL_MS)
+        self.coalesceTimer.timeout.connect(self.emitDirectoryChanged)
+
+    def watchDirectory(self, targetDirectory):
+        # Media locations and event directories alike; an event directory no media were moved to yet is reported once it shows up
+        self.stopWatching()
+        self.watchedDirectory = targetDirectory
+        self.watchNearestDirectory()
+
+    def watchNearestDirectory(self):
+        nearestDirectory = self.watchedDirectory
+
+        while not path.isdir(nearestDirectory) and path.dirname(nearestDirectory) != nearestDirectory: # Event, Month and Year directory may all be missing
+            nearestDirectory = path.dirname(nearestDirectory)
+
+        if self.fileSystemWatcher.directories():
+            self.fileSystemWatcher.removePaths(self.fileSystemWatcher.directories())
+
+        if path.isdir(nearestDirectory):
+            self.fileSystemWatcher.addPath(nearestDirectory)
+
+        self.isWaiting = nearestDirectory != self.watchedDirectory
+
+    def stopWatching(self):
+        if self.fileSystemWatcher.directories():
+            self.fileSystemWatcher.removePaths(self.fileSystemWatcher.directories())
+
+        self.coalesceTimer.stop()
+        self.watchedDirectory = None
+        self.isWaiting = False
+
+    def directoryTouched(self, changedDirectory):
+        # Only the first change of a burst starts the timer, everything until it fires is picked up by the same rescan
+        if not self.coalesceTimer.isActive():
+            self.coalesceTimer.start()
+
+    def emitDirectoryChanged(self):
+        if self.watchedDirectory is None:
+            return
+
+        if self.isWaiting: # Something changed in a parent, follows the tree down if the watched directory (or one above it) was created
+            self.watchNearestDirectory()
+
+            if self.isWaiting:
+                return
+
+        self.directoryChanged.emit(self.watchedDirectory)
@@ -0,0 +1,192 @@
+import sys
+import json
+import atexit
+from itertools import chain
+from argparse import ArgumentParser
+from datetime import date
+from os import path
+from organizer_core import OrganizeJob, getEventDirectory, getMediaIndex, getHashIndex, findDuplicateMedia, mediaOrderings
+from duplicate_finder import duplicateActions
+from destination_settings import loadDestinationSettings
+from capture_time import MetadataCache
+from rename_journal import getResumableJournals, getUndoableJournal, undoRenameJournal
+from utils import getCacheDirectory
+from instrumentation import tracer, enableTracingFromEnvironment
+from ingest_queue import IngestQueue
+from library_stats import getLibraryStats
+
+# Headless batch mode for ingest stations and cron jobs. Never imports PyQt6, so it also runs on machines without a display.
+# Prints one JSON object per media location on stdout; per-file logs go to stderr so stdout stays machine-readable.
+#
+#   python organize_cli.py --destination /mnt/library --code WPPH --date 2025-06-14 --event "Santos Wedding" /media/card1/DCIM /media/card2/DCIM
+#   python organize_cli.py --destination /mnt/library --batch jobs.jsonl
+#   python organize_cli.py --destination /mnt/library --dry-run --batch jobs.jsonl
+#   python organize_cli.py --destination /mnt/library --parallel --batch jobs.jsonl
+#   python organize_cli.py --destination /mnt/library --resume
+#   python organize_cli.py --destination /mnt/library --undo last
+#   python organize_cli.py --destination /mnt/library --trace trace.json --batch jobs.jsonl
+#   python organize_cli.py --destination /mnt/library --stats
+#
+# Every line of a batch file is a JSON object with "source", "code", "date" and "event" keys; missing keys fall back to the command line options
+
+def parseArguments(arguments):
+    argumentParser = ArgumentParser(description="Rename and organize media into Year/Month/yyyy-MM-dd: Event directories without the GUI.")
+    argumentParser.add_argument("sources", nargs="*", help="Media location directories to organize")
+    argumentParser.add_argument("--destination", required=True, help="Media root destination directory")
+    argumentParser.add_argument("--code", help="Media code used for the new CODE_N names")
+    argumentParser.add_argument("--date", help="Event date as yyyy-MM-dd")
+    argumentParser.add_argument("--event", help="Event directory name")
+    argumentParser.add_argument("--batch", help="JSON lines file with one {source, code, date, event} job per line")
+    argumentParser.add_argument("--concurrency", type=int, help="Parallel copy streams for cross-device moves (defaults to the destination's setting)")
+    argumentParser.add_argument("--duplicates", choices=duplicateActions, default="keep", help="What happens to media that are already in the library: skip them, link the library copy, or keep (move) them anyway (default, no duplicate check)")
+    argumentParser.add_argument("--parallel", action="store_true", help="Run jobs whose sources are on different devices at the same time (jobs on the same device still run one after another); results are printed as jobs finish")
+    argumentParser.add_argument("--resume", action="store_true", help="Finish interrupted or cancelled jobs of the destination from their journals before running new ones")
+    argumentParser.add_argument("--undo", metavar="JOB", help="Move the media of a journaled job back to its media location; JOB is a job id or \"last\"")
+    argumentParser.add_argument("--order", choices=mediaOrderings, help="Number media by last modified time or by capture time from EXIF/HEIC/MP4 headers (defaults to the destination's setting)")
+    argumentParser.add_argument("--dry-run", action="store_true", help="Print every planned new name and every collision without moving anything (jobs run one after another)")
+    argumentParser.add_argument("--stats", action="store_true", help="Print media, videos and bytes of the destination per year, month, event and media code instead of organizing")
+    argumentParser.add_argument("--trace", metavar="FILE", help="Record the scan, index, hash and move phases into a Chrome trace / Perfetto JSON file")
+
+    return argumentParser.parse_args(arguments)
+
+def getOrganizeRequests(parsedArguments):
+    organizeRequests = [{"source": source, "code": parsedArguments.code, "date": parsedArguments.date, "event": parsedArguments.event} for source in parsedArguments.sources]
+
+    if parsedArguments.batch:
+        with open(parsedArguments.batch, "r") as batchFile:
+            for batchLine in batchFile:
+                if batchLine.strip():
+                    batchRequest = json.loads(batchLine)
+                    organizeRequests.append({key: batchRequest.get(key, getattr(parsedArguments, key, None)) for key in ("source", "code", "date", "event")})
+
+    return organizeRequests
+
+def getRequestDestination(organizeRequest, mediaRootDirectory):
+    # (event directory, None) for a complete request, (None, error result) otherwise
+    missingInputs = [key for key in ("source", "code", "date", "event") if not organizeRequest.get(key)]
+
+    if missingInputs:
+        return None, {"source": organizeRequest.get("source"), "error": f"Missing {', '.join(missingInputs)}"}
+    if not path.isdir(organizeRequest["source"]):
+        return None, {"source": organizeRequest["source"], "error": "Media location directory does not exist"}
+
+    try:
+        eventDate = date.fromisoformat(organizeRequest["date"])
+    except ValueError:
+        return None, {"source": organizeRequest["source"], "error": f"Invalid date {organizeRequest['date']}, expected yyyy-MM-dd"}
+
+    return getEventDirectory(mediaRootDirectory, eventDate.year, eventDate.month, eventDate.day, organizeRequest["event"]), None
+
+def runOrganizeRequest(organizeRequest, mediaRootDirectory, mediaIndex, copyConcurrency, mediaOrdering="mtime", metadataCache=None, duplicateAction="keep", hashIndex=None, dryRun=False):
+    mediaDestinationDirectory, requestError = getRequestDestination(organizeRequest, mediaRootDirectory)
+
+    if requestError is not None:
+        return requestError
+
+    try:
+        duplicateMedia = findDuplicateMedia(organizeRequest["source"], hashIndex) if duplicateAction != "keep" else {} # Same stages as the GUI, the action applies to every duplicate
+        organizeJob = OrganizeJob(organizeRequest["source"], mediaDestinationDirectory, organizeRequest["code"].upper(), mediaIndex, copyConcurrency, mediaOrdering=mediaOrdering, metadataCache=metadataCache, duplicateActions={mediaName: (duplicateAction, libraryMediaPath) for mediaName, (libraryMediaPath, _) in duplicateMedia.items()})
+        organizeJob.onLog = lambda logMessage: print(logMessage, file=sys.stderr)
+
+        if dryRun:
+            renamePlan = organizeJob.planRename()
+            organizeJob.dropRenamePlan(renamePlan) # The media numbers go back, a real run afterwards gets the same names
+
+            return {**renamePlan.toResult(), "destination": mediaDestinationDirectory}
+
+        return organizeJob.run()
+    except OSError as ose:
+        return {"source": organizeRequest["source"], "destination": mediaDestinationDirectory, "error": str(ose)}
+
+def runOrganizeRequestsInParallel(organizeRequests, mediaRootDirectory, mediaIndex, copyConcurrency, mediaOrdering="mtime", metadataCache=None, duplicateAction="keep", hashIndex=None):
+    # Same results as runOrganizeRequest(), yielded in the order the jobs finish
+    ingestQueue = IngestQueue()
+    ingestQueue.onLog = lambda logMessage: print(logMessage, file=sys.stderr)
+    queuedJobs = []
+
+    for organizeRequest in organizeRequests:
+        mediaDestinationDirectory, requestError = getRequestDestination(organizeRequest, mediaRootDirectory)
+
+        if requestError is not None:
+            yield requestError
+        else:
+            queuedJobs.append(ingestQueue.addJob(organizeRequest["source"], mediaDestinationDirectory, organizeRequest["code"].upper(), mediaIndex, copyConcurrency, mediaOrdering, metadataCache, duplicateAction, hashIndex))
+
+    while queuedJobs:
+        ingestQueue.waitUntilIdle(0.2)
+        finishedJobs = [ingestJob for ingestJob in queuedJobs if ingestJob.state not in ("queued", "running")]
+
+        for ingestJob in finishedJobs:
+            queuedJobs.remove(ingestJob)
+            yield ingestJob.result if ingestJob.result is not None else {"source": ingestJob.mediaLocationDirectory, "destination": ingestJob.mediaDestinationDirectory, "error": ingestJob.error or "Cancelled before it started"}
+
+def resumeOrganizeJobs(mediaRootDirectory, mediaIndex, copyConcurrency):
+    for renameJournal in getResumableJournals(mediaRootDirectory):
+        try:
+            organizeJob = OrganizeJob(renameJournal.jobInfo["source"], renameJournal.jobInfo["destination"], renameJournal.jobInfo["code"], mediaIndex, copyConcurrency)
+            organizeJob.onLog = lambda logMessage: print(logMessage, file=sys.stderr)
+            yield organizeJob.resume(renameJournal)
+        except OSError as ose:
+            yield {"journal": renameJournal.jobId, "error": str(ose)}
+
+def undoOrganizeJob(mediaRootDirectory, jobId):
+    renameJournal = getUndoableJournal(mediaRootDirectory, jobId)
+
+    if renameJournal is None:
+        return {"undo": jobId, "error": "No journaled job with moved media to undo"}
+
+    failedMedia = undoRenameJournal(renameJournal, onLog=lambda logMessage: print(logMessage, file=sys.stderr))
+
+    return {"undo": renameJournal.jobId, "source": renameJournal.jobInfo.get("source"), "destination": renameJournal.jobInfo.get("destination"), "failed": [{"media": mediaName, "error": mediaError} for mediaName, mediaError in failedMedia]}
+
+def main(arguments=None):
+    parsedArguments = parseArguments(sys.argv[1:] if arguments is None else arguments)
+    mediaRootDirectory = parsedArguments.destination
+    tracer.onLog = lambda logMessage: print(logMessage, file=sys.stderr)
+
+    if parsedArguments.trace:
+        tracer.enable(parsedArguments.trace)
+        atexit.register(tracer.exportTrace) # Also written when a job fails halfway
+    else:
+        enableTracingFromEnvironment()
+
+    if not path.isdir(mediaRootDirectory):
+        print(json.dumps({"error": f"Media root destination {mediaRootDirectory} does not exist"}))
+        return 2
+
+    destinationSettings = loadDestinationSettings(mediaRootDirectory)
+    copyConcurrency = parsedArguments.concurrency or destinationSettings["copyConcurrency"]
+    mediaOrdering = parsedArguments.order or destinationSettings["mediaOrdering"]
+    metadataCache = MetadataCache(getCacheDirectory("metadata")) # Same capture time cache as the GUI
+    mediaIndex = getMediaIndex(mediaRootDirectory) # One index for the whole invocation, every job only refreshes what the previous one changed
+    hashIndex = getHashIndex(mediaRootDirectory) if parsedArguments.duplicates != "keep" else None
+    exitCode = 0
+
+    if parsedArguments.stats:
+        print(json.dumps(getLibraryStats(mediaIndex).toResult()), flush=True) # Revalidates only directories that changed since the last run
+
+        return 0
+
+    if parsedArguments.undo:
+        undoResult = undoOrganizeJob(mediaRootDirectory, parsedArguments.undo)
+        print(json.dumps(undoResult), flush=True)
+
+        return 1 if "error" in undoResult or undoResult["failed"] else 0
+
+    resumedOrganizeJobs = resumeOrganizeJobs(mediaRootDirectory, mediaIndex, copyConcurrency) if parsedArguments.resume and not parsedArguments.dry_run else iter(())
+
+    if parsedArguments.parallel and not parsedArguments.dry_run:
+        newOrganizeJobs = runOrganizeRequestsInParallel(getOrganizeRequests(parsedArguments), mediaRootDirectory, mediaIndex, copyConcurrency, mediaOrdering, metadataCache, parsedArguments.duplicates, hashIndex)
+    else:
+        newOrganizeJobs = (runOrganizeRequest(organizeRequestToRun, mediaRootDirectory, mediaIndex, copyConcurrency, mediaOrdering, metadataCache, parsedArguments.duplicates, hashIndex, parsedArguments.dry_run) for organizeRequestToRun in getOrganizeRequests(parsedArguments))
+
+    for organizeResult in chain(resumedOrganizeJobs, newOrganizeJobs): # Results are printed as soon as each job finishes
+        print(json.dumps(organizeResult), flush=True)
+
+        if "error" in organizeResult or organizeResult.get("failed"):
+            exitCode = 1
+
+    return exitCode
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+import errno
+import os
+import time
+from os import rename, path, makedirs, link, symlink, remove
+from threading import Event, Lock
+from utils import sanitizeText, getResourcePath
+from media_index import MediaIndex, getMediaNumber
+from transfer import isCrossDevice, moveAcrossDevices, transferMediaFiles, renameNoReplace
+from duplicate_finder import HashIndex, findDuplicates
+from rename_journal import createRenameJournal, getJournaledMediaNumber
+from rename_plan import buildRenamePlan, collisionReasons
+from media_snapshot import supportedImageFormats, supportedVideoFormats, supportedMediaFormats, getMediaSnapshot, forgetMediaSnapshot
+from instrumentation import tracedPhase, traceCount, traceAnnotate
+
+# GUI-independent organizing logic (scan, numbering, Year/Month/yyyy-MM-dd: Event layout and moving). Must never import PyQt6,
+# the command line batch mode (organize_cli.py) runs on ingest stations without a display
+
+MEDIA_CODE_COLLECTION_PATH = "assets/memory/mediaCodeCollection.peomc" # The app's media codes, one per line
+mediaOrderings = ["mtime", "capture"] # Last modified time or capture time from the media headers
+eventMonths = ["January", "February", "March", "April",
+                "May", "June", "July", "August",
+                "September", "October", "November", "December"]
+
+LOG_BATCH_SIZE = 256 # Per-file log lines handed to onLog at once, one print per batch instead of per file
+PROGRESS_INTERVAL_SECONDS = 0.1 # onProgress at most this often (and for the last media), every call is a signal to the GUI thread
+
+sharedIndexes = {} # (index class name, media root destination) -> MediaIndex or HashIndex, see getSharedIndex()
+sharedIndexesLock = Lock()
+
+def getEventDirectory(mediaRootDirectory, eventYear, eventMonth, eventDay, eventName):
+    # Media Root Destination/Year/Month/yyyy-MM-dd: Event Name
+    return f"{mediaRootDirectory}/{eventYear}/{eventMonths[eventMonth - 1]}/{eventYear:04d}-{eventMonth:02d}-{eventDay:02d}: {sanitizeText(eventName)}"
+
+@tracedPhase
+def scanMedia(mediaDirectory, mediaOrdering="mtime", metadataCache=None):
+    # Returns the supported media as media_snapshot.MediaEntry objects in media order; the directory is only read again if it changed
+    mediaEntries = list(getMediaSnapshot(mediaDirectory).mediaEntries)
+
+    if mediaOrdering == "capture" and metadataCache is not None:
+        # Copies and syncs rewrite mtimes, the capture time in the headers is what matches the shooting order
+        captureTimes = metadataCache.getCaptureTimes([(f"{mediaDirectory}/{mediaEntry.name}", mediaEntry) for mediaEntry in mediaEntries])
+        metadataCache.save()
+        mediaEntries.sort(key=lambda mediaEntry: getMediaSortTime(captureTimes[f"{mediaDirectory}/{mediaEntry.name}"], mediaEntry))
+    else:
+        mediaEntries.sort(key=lambda mediaEntry: mediaEntry.st_mtime_ns) # Sort media based on last modified time, oldest on top and newest on bottom.
+
+    traceCount(files=len(mediaEntries))
+    traceAnnotate(ordering=mediaOrdering)
+
+    return mediaEntries
+
+def getMediaCodes(mediaCode):
+    # The job's own code and every code of the media code collection; only their CODE_N names are numbers the app handed out
+    mediaCodes = {mediaCode.upper()}
+
+    try:
+        with open(getResourcePath(MEDIA_CODE_COLLECTION_PATH), "r") as mediaCodeFile:
+            mediaCodes.update("".join(mediaCodeLine.split()).upper() for mediaCodeLine in mediaCodeFile if mediaCodeLine.strip())
+    except OSError: # No media code collection yet (first run, or an ingest station that only uses --code)
+        pass
+
+    return mediaCodes
+
+def getMediaSortTime(captureTime, mediaStat):
+    return captureTime if captureTime is not None else mediaStat.st_mtime # Media without a readable capture time fall back to the modification time
+
+class OrganizeJob:
+    # Renames and moves every supported media of one media location into one event directory, or into several with mediaDestinations
+    # (see event_segmentation.py). Callbacks are plain functions so the same job runs inside the GUI's RenameJob and in the command line batch mode
+    def __init__(self, mediaLocationDirectory, mediaDestinationDirectory, mediaCode, mediaIndex, copyConcurrency=1, cancelEvent=None, mediaOrdering="mtime", metadataCache=None, duplicateActions=None, mediaDestinations=None):
+        self.mediaLocationDirectory = mediaLocationDirectory
+        self.mediaDestinationDirectory = mediaDestinationDirectory
+        self.mediaCode = mediaCode
+        self.mediaIndex = mediaIndex
+        self.copyConcurrency = copyConcurrency # Parallel copy streams when source and destination are on different devices
+        self.cancelEvent = cancelEvent if cancelEvent is not None else Event()
+        self.mediaOrdering = mediaOrdering # CODE_N numbers follow this order, see scanMedia()
+        self.metadataCache = metadataCache
+        self.duplicateActions = duplicateActions or {} # Media name -> ("skip" | "keep" | "link", full path of the identical library media), see findDuplicateMedia()
+        self.mediaDestinations = mediaDestinations # Media name -> event directory; only these media are moved, mediaDestinationDirectory is then the media root destination
+        self.onStarted = lambda totalMediaCount, totalMediaBytes: None
+        self.onProgress = lambda renamedMediaCount, renamedMediaBytes, filesPerSecond, megabytesPerSecond, secondsLeft: None
+        self.onMediaRenamed = lambda mediaName, newMediaBaseName: None
+        self.onLog = print
+
+    @tracedPhase
+    def run(self):
+        return self.applyRenamePlan(self.planRename())
+
+    @tracedPhase
+    def planRename(self):
+        # Scans and plans every move without touching a file (the dry run). The plan's CODE_N numbers stay reserved until
+        # applyRenamePlan() or dropRenamePlan(), so a job started in between can't plan the same numbers
+        mediaToBeRenamed = scanMedia(self.mediaLocationDirectory, self.mediaOrdering, self.metadataCache)
+
+        if self.mediaDestinations is not None: # Media that showed up after the events were proposed (or belong to none) stay where they are
+            mediaToBeRenamed = [mediaEntry for mediaEntry in mediaToBeRenamed if mediaEntry.name in self.mediaDestinations]
+
+        skippedMedia = [mediaEntry for mediaEntry in mediaToBeRenamed if self.getDuplicateAction(mediaEntry.name) == "skip"] # Already in the library, stays in the media location and gets no number
+        mediaToBeRenamed = [mediaEntry for mediaEntry in mediaToBeRenamed if self.getDuplicateAction(mediaEntry.name) != "skip"]
+        mediaNumberReservation, mediaNumberStartingCount = self.mediaIndex.reserveMediaNumbers(self.mediaLocationDirectory, len(mediaToBeRenamed), getMediaCodes(self.mediaCode), getJournaledMediaNumber(self.mediaIndex.mediaRootDirectory)) # Held until this job's media are recorded in the index
+
+        try:
+            # Numbers are assigned up front so parallel copies can finish in any order and still follow the media order
+            return buildRenamePlan(self.mediaLocationDirectory, mediaToBeRenamed, self.mediaCode, mediaNumberStartingCount, self.getMediaDestination, skippedMedia, mediaNumberReservation)
+        except Exception:
+            self.mediaIndex.releaseMediaNumbers(mediaNumberReservation)
+            raise
+
+    def dropRenamePlan(self, renamePlan):
+        # The dry run was only looked at (or exported), its numbers are free again
+        self.mediaIndex.releaseMediaNumbers(renamePlan.mediaNumberReservation)
+
+    def applyRenamePlan(self, renamePlan):
+        # Moves exactly what the plan says; works on a plan of another OrganizeJob with the same inputs too (the GUI plans and applies in separate jobs)
+        self.mediaDestinations = renamePlan.mediaDestinations
+        self.skippedMedia = renamePlan.skippedMedia
+        self.savedMediaBytes = sum(mediaEntry.st_size for mediaEntry in self.skippedMedia)
+        self.collidingMedia = renamePlan.collidingMedia
+        self.mediaMtimes = renamePlan.mediaMtimes
+
+        try:
+            return self.planMedia(renamePlan.plannedMedia)
+        finally:
+            self.mediaIndex.releaseMediaNumbers(renamePlan.mediaNumberReservation)
+            forgetMediaSnapshot(self.mediaLocationDirectory) # Its media are gone now, even if the directory mtime ticked within the scan's second
+
+    def planMedia(self, plannedMedia):
+        for eventDirectory in {self.getMediaDestination(mediaName) for mediaName, _, _, _ in plannedMedia} | {self.mediaDestinationDirectory}:
+            if not path.isdir(eventDirectory): # Make directory if it does not exists yet
+                makedirs(eventDirectory) # From os.makedirs; makedirs instead of mkdir for nested directories
+
+        # The whole plan is on disk before the first file moves, so a crash at any point can be resumed or undone
+        self.renameJournal = createRenameJournal(self.mediaIndex.mediaRootDirectory, {
+            "source": self.mediaLocationDirectory,
+            "destination": self.mediaDestinationDirectory,
+            "code": self.mediaCode,
+            "created": time.time()
+        }, [["link" if self.getDuplicateAction(mediaName) == "link" else "move", f"{self.mediaLocationDirectory}/{mediaName}", f"{self.getMediaDestination(mediaName)}/{newMediaBaseName}", mediaSize, self.duplicateActions.get(mediaName, (None, None))[1], self.mediaMtimes[mediaName]] for mediaName, mediaSize, newMediaBaseName, _ in plannedMedia])
+
+        return self.runPlannedMedia(plannedMedia)
+
+    @tracedPhase
+    def resume(self, renameJournal):
+        # Continues an interrupted or cancelled job from its journal: no rescan and no renumbering, only the rows that never completed are moved.
+        # Rows whose target name another job (or anything else) took in the meantime are reported as collisions and their media stay put
+        self.renameJournal = renameJournal
+        self.mediaLocationDirectory = renameJournal.jobInfo["source"]
+        self.mediaDestinationDirectory = renameJournal.jobInfo["destination"]
+        pendingRows, collidingRows = renameJournal.getPendingRows()
+        self.skippedMedia, self.savedMediaBytes = [], 0
+        self.collidingMedia = [(path.basename(renameJournal.plannedMedia[plannedRow][1]), path.basename(renameJournal.plannedMedia[plannedRow][2]), "exists") for plannedRow in collidingRows]
+        self.mediaDestinations = {} # Every row has its own target, so segmented jobs resume into the right events too
+        plannedMedia = []
+
+        for plannedRow in pendingRows:
+            plannedAction, sourcePath, targetPath, mediaSize, libraryMediaPath, *_ = renameJournal.plannedMedia[plannedRow]
+            plannedMedia.append((path.basename(sourcePath), mediaSize, path.basename(targetPath), plannedRow))
+            self.mediaDestinations[path.basename(sourcePath)] = path.dirname(targetPath)
+
+            if plannedAction == "link":
+                self.duplicateActions[path.basename(sourcePath)] = (plannedAction, libraryMediaPath)
+
+        # The journal's remaining numbers stay taken while it resumes, so a queued job can't plan them as well
+        self.mediaNumberReservation = self.mediaIndex.holdMediaNumbers(max([getMediaNumber(newMediaBaseName) for _, _, newMediaBaseName, _ in plannedMedia], default=0))
+
+        try:
+            for eventDirectory in set(self.mediaDestinations.values()) | {self.mediaDestinationDirectory}:
+                makedirs(eventDirectory, exist_ok=True)
+
+            return self.runPlannedMedia(plannedMedia)
+        finally:
+            self.mediaIndex.releaseMediaNumbers(self.mediaNumberReservation)
+            forgetMediaSnapshot(self.mediaLocationDirectory)
+
+    @tracedPhase
+    def runPlannedMedia(self, plannedMedia):
+        # plannedMedia are (media name, size in bytes, new media name, journal row) tuples
+        plannedMediaBytes = {mediaName: mediaSize for mediaName, mediaSize, _, _ in plannedMedia}
+        self.totalMediaCount = len(plannedMedia)
+        self.onStarted(self.totalMediaCount, sum(mediaSize for mediaName, mediaSize, _, _ in plannedMedia if self.getDuplicateAction(mediaName) != "link")) # Linked duplicates move no bytes
+        self.renamedMedia = [] # (old media name, new media name) pairs, also keeps the media index up to date without rescanning the event directory afterwards
+        self.linkedMedia = [] # (old media name, new media name, library media) of duplicates that were linked instead of moved
+        self.failedMedia = [(mediaName, collisionReasons[collisionReason]) for mediaName, _, collisionReason in self.collidingMedia] # (media name, error message) pairs; collisions never got planned
+        self.renamedMediaCount, self.renamedMediaBytes = 0, 0
+        self.movedMediaBytes = 0
+        self.pendingLogLines = []
+        self.startTime = time.monotonic()
+        self.lastProgressTime = 0
+
+        try:
+            self.linkDuplicateMedia([plannedItem for plannedItem in plannedMedia if self.getDuplicateAction(plannedItem[0]) == "link"])
+            plannedMedia = [plannedItem for plannedItem in plannedMedia if self.getDuplicateAction(plannedItem[0]) != "link"]
+
+            if isCrossDevice(self.mediaLocationDirectory, self.mediaDestinationDirectory):
+                self.transferMedia(plannedMedia)
+            else:
+                self.renameMediaInPlace(plannedMedia)
+
+            self.renameJournal.setState("cancelled" if self.cancelEvent.is_set() else "finished")
+        finally:
+            self.renameJournal.close() # Anything else leaves the journal "interrupted" for the next resume
+            self.flushLog()
+
+        movedMediaByDestination = {}
+
+        for mediaName, newMediaBaseName in self.renamedMedia + [linkedItem[:2] for linkedItem in self.linkedMedia]: # Links are media of the event directory too
+            movedMediaByDestination.setdefault(self.getMediaDestination(mediaName), []).append((newMediaBaseName, plannedMediaBytes[mediaName]))
+
+        for eventDirectory, movedMedia in movedMediaByDestination.items():
+            self.mediaIndex.recordMovedMedia(eventDirectory, movedMedia)
+
+        traceCount(renamed=len(self.renamedMedia), bytes=self.movedMediaBytes, failed=len(self.failedMedia), linked=len(self.linkedMedia))
+
+        return {
+            "source": self.mediaLocationDirectory,
+            "destination": self.mediaDestinationDirectory,
+            "destinations": sorted(set(self.getMediaDestination(mediaName) for mediaName, _ in self.renamedMedia + [linkedItem[:2] for linkedItem in self.linkedMedia])),
+            "renamed": [{"from": mediaName, "to": newMediaBaseName} for mediaName, newMediaBaseName in self.renamedMedia],
+            "failed": [{"media": mediaName, "error": mediaError} for mediaName, mediaError in self.failedMedia],
+            "skipped": [mediaEntry.name for mediaEntry in self.skippedMedia],
+            "linked": [{"from": mediaName, "to": newMediaBaseName, "library": libraryMediaPath} for mediaName, newMediaBaseName, libraryMediaPath in self.linkedMedia],
+            "bytes": self.movedMediaBytes,
+            "bytesSaved": self.savedMediaBytes,
+            "seconds": round(time.monotonic() - self.startTime, 3),
+            "cancelled": self.cancelEvent.is_set(),
+            "journal": self.renameJournal.jobId
+        }
+
+    def getMediaDestination(self, mediaName):
+        return (self.mediaDestinations or {}).get(mediaName, self.mediaDestinationDirectory)
+
+    def getDuplicateAction(self, mediaName):
+        return self.duplicateActions[mediaName][0] if mediaName in self.duplicateActions else "keep"
+
+    @tracedPhase
+    def linkDuplicateMedia(self, plannedMedia):
+        # The library already has these bytes, so the event directory gets a link to them and the media location copy goes away like a moved file
+        for mediaName, mediaSize, newMediaBaseName, plannedRow in plannedMedia:
+            if self.cancelEvent.is_set():
+                break
+
+            libraryMediaPath = self.duplicateActions[mediaName][1]
+            newMediaName = f"{self.getMediaDestination(mediaName)}/{newMediaBaseName}"
+
+            try:
+                try:
+                    link(libraryMediaPath, newMediaName) # From os.link; a hard link costs no space and survives the library media being renamed
+                except OSError: # File systems without hard links (exFAT, some NAS shares)
+                    symlink(libraryMediaPath, newMediaName)
+
+                remove(f"{self.mediaLocationDirectory}/{mediaName}")
+                self.linkedMedia.append((mediaName, newMediaBaseName, libraryMediaPath))
+                self.savedMediaBytes += mediaSize
+                self.mediaProcessed(plannedRow, mediaName, newMediaBaseName, 0, None)
+            except Exception as e: # General error catching
+                self.mediaProcessed(plannedRow, mediaName, newMediaBaseName, 0, e)
+
+    @tracedPhase
+    def renameMediaInPlace(self, plannedMedia):
+        # Renames relative to open directory descriptors where the OS has them (not on Windows): no path lookup of the media
+        # location and event directory per file, and a directory renamed or remounted halfway can't redirect the rest of the batch
+        directoryDescriptors = {} # Directory -> descriptor, opened on first use
+
+        def getDirectoryDescriptor(mediaDirectory):
+            if mediaDirectory not in directoryDescriptors:
+                directoryDescriptors[mediaDirectory] = os.open(mediaDirectory, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+
+            return directoryDescriptors[mediaDirectory]
+
+        try:
+            for mediaName, mediaSize, newMediaBaseName, plannedRow in plannedMedia:
+                if self.cancelEvent.is_set(): # Checked between files so no file is ever left half moved
+                    break
+
+                oldMediaName = f"{self.mediaLocationDirectory}/{mediaName}"
+                newMediaName = f"{self.getMediaDestination(mediaName)}/{newMediaBaseName}"
+
+                # Handles moving and renaming files with care; a target that showed up after planning fails with FileExistsError instead of being replaced
+                try:
+                    try:
+                        if rename in os.supports_dir_fd:
+                            renameNoReplace(mediaName, newMediaBaseName, getDirectoryDescriptor(self.mediaLocationDirectory), getDirectoryDescriptor(self.getMediaDestination(mediaName)))
+                        else:
+                            renameNoReplace(oldMediaName, newMediaName)
+                    except OSError as ose: # OS related errors
+                        if ose.errno != errno.EXDEV: # Anything other than invalid cross-device link
+                            raise
+
+                        moveAcrossDevices(oldMediaName, newMediaName) # Fallback if rename() didn't work, e.g. bind mounts that share a device number
+
+                    self.mediaProcessed(plannedRow, mediaName, newMediaBaseName, mediaSize, None)
+                except Exception as e: # General error catching
+                    self.mediaProcessed(plannedRow, mediaName, newMediaBaseName, mediaSize, e)
+        finally:
+            for directoryDescriptor in directoryDescriptors.values():
+                os.close(directoryDescriptor)
+
+    @tracedPhase
+    def transferMedia(self, plannedMedia):
+        # Source and destination are on different devices, so every file is a copy; copies run concurrently on a bounded pool
+        plannedMediaByPath = {f"{self.mediaLocationDirectory}/{plannedItem[0]}": plannedItem for plannedItem in plannedMedia}
+        plannedTransfers = [(oldMediaName, f"{self.getMediaDestination(mediaName)}/{newMediaBaseName}") for oldMediaName, (mediaName, _, newMediaBaseName, _) in plannedMediaByPath.items()]
+
+        def mediaTransferred(oldMediaName, newMediaName, transferError):
+            mediaName, mediaSize, newMediaBaseName, plannedRow = plannedMediaByPath[oldMediaName]
+            self.mediaProcessed(plannedRow, mediaName, newMediaBaseName, mediaSize, transferError)
+
+        transferMediaFiles(plannedTransfers, self.copyConcurrency, self.cancelEvent, mediaTransferred)
+
+    def mediaProcessed(self, plannedRow, mediaName, newMediaBaseName, mediaSize, mediaError):
+        if mediaError is None:
+            self.renameJournal.markDone(plannedRow)
+            self.pendingLogLines.append(f"{mediaName} successfully renamed to {newMediaBaseName}")
+            self.renamedMedia.append((mediaName, newMediaBaseName))
+            self.movedMediaBytes += mediaSize
+            self.onMediaRenamed(mediaName, newMediaBaseName)
+        else:
+            self.pendingLogLines.append(f"The error code is: {mediaError.errno}" if isinstance(mediaError, OSError) else f"You got an error: {mediaError}")
+            self.failedMedia.append((mediaName, collisionReasons["exists"] if isinstance(mediaError, FileExistsError) else str(mediaError))) # Taken after planning, reported like a planned collision
+
+        if len(self.pendingLogLines) >= LOG_BATCH_SIZE:
+            self.flushLog()
+
+        # Failed media still count as processed so the progress bar and ETA keep moving
+        self.renamedMediaCount += 1
+        self.renamedMediaBytes += mediaSize
+        elapsedTime = max(time.monotonic() - self.startTime, 1e-6)
+        filesPerSecond = self.renamedMediaCount / elapsedTime
+        megabytesPerSecond = self.renamedMediaBytes / elapsedTime / (1024 * 1024)
+        secondsLeft = (self.totalMediaCount - self.renamedMediaCount) / filesPerSecond
+
+        if self.renamedMediaCount == self.totalMediaCount or time.monotonic() - self.lastProgressTime >= PROGRESS_INTERVAL_SECONDS:
+            self.lastProgressTime = time.monotonic()
+            self.onProgress(self.renamedMediaCount, self.renamedMediaBytes, filesPerSecond, megabytesPerSecond, secondsLeft)
+
+    def flushLog(self):
+        if self.pendingLogLines:
+            self.onLog("\n".join(self.pendingLogLines))
+            self.pendingLogLines = []
+
+def findDuplicateMedia(mediaLocationDirectory, hashIndex, maxWorkers=4, onStage=lambda stageName, candidateCount: None):
+    # Returns {media name: (full path of the identical library media, size in bytes)} for media of the media location that are already in the library
+    mediaEntries = scanMedia(mediaLocationDirectory) # Same snapshot the rename job reads right after
+    mediaSizes = {f"{mediaLocationDirectory}/{mediaEntry.name}": mediaEntry.st_size for mediaEntry in mediaEntries}
+
+    with hashIndex.checkLock: # One check per library at a time; queued jobs of the same destination share its hash index
+        duplicateMedia = findDuplicates([(f"{mediaLocationDirectory}/{mediaEntry.name}", mediaEntry) for mediaEntry in mediaEntries], hashIndex, maxWorkers, onStage)
+
+    return {path.basename(mediaPath): (libraryMediaPath, mediaSizes[mediaPath]) for mediaPath, libraryMediaPath in duplicateMedia.items()}
+
+def getSharedIndex(indexClass, mediaRootDirectory):
+    # One index per media root destination and process: jobs of the ingest queue and the GUI's own rename job must see the same
+    # media number reservations and hash index, otherwise two jobs could plan the same CODE_N numbers
+    with sharedIndexesLock:
+        indexKey = (indexClass.__name__, path.normpath(mediaRootDirectory))
+
+        if indexKey not in sharedIndexes:
+            sharedIndexes[indexKey] = indexClass(mediaRootDirectory, supportedMediaFormats)
+
+        return sharedIndexes[indexKey]
+
+def getHashIndex(mediaRootDirectory, loadedHashIndex=None):
+    if loadedHashIndex is None or loadedHashIndex.mediaRootDirectory != path.normpath(mediaRootDirectory):
+        return getSharedIndex(HashIndex, mediaRootDirectory)
+
+    return loadedHashIndex
+
+def getMediaIndex(mediaRootDirectory, loadedMediaIndex=None):
+    # Reuses the loaded index as long as the media root destination stays the same
+    if loadedMediaIndex is None or loadedMediaIndex.mediaRootDirectory != path.normpath(mediaRootDirectory):
+        return getSharedIndex(MediaIndex, mediaRootDirectory)
+
+    return loadedMediaIndex
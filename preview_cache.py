@@ -0,0 +1,105 @@
+import hashlib
+import os
+from os import path, scandir, makedirs
+from collections import OrderedDict
+from threading import Lock, get_ident
+
+PREVIEW_MAX_DIMENSION = 2048 # Longest side of a cached preview; enough for the preview panel on HiDPI screens
+DEFAULT_CACHE_MEGABYTES = 512
+CACHE_SIZE_ENVIRONMENT_VARIABLE = "PEO_PREVIEW_CACHE_MB"
+
+def getDefaultCacheBytes():
+    cacheSizeSetting = os.environ.get(CACHE_SIZE_ENVIRONMENT_VARIABLE, "")
+
+    try:
+        return max(0, int(cacheSizeSetting)) * 1024 * 1024
+    except ValueError: # Unset or a typo, the default cap instead of a crash at startup
+        return DEFAULT_CACHE_MEGABYTES * 1024 * 1024
+
+class PreviewCache:
+    # Persistent display-sized preview cache keyed by path + size + mtime, so edited or replaced media never hit a stale entry.
+    # LRU order is kept in memory and mirrored onto the cache files' mtimes, which is what restores it after a restart
+    def __init__(self, cacheDirectory, maxCacheBytes=DEFAULT_CACHE_MEGABYTES * 1024 * 1024):
+        self.cacheDirectory = cacheDirectory
+        self.maxCacheBytes = maxCacheBytes
+        self.cachedPreviews = None # Cache file name -> size in bytes, oldest first; loaded lazily on first use
+        self.cachedBytes = 0
+        self.lock = Lock() # Previews get looked up and added from background decoders too
+
+    def loadCachedPreviews(self):
+        cachedPreviews = []
+
+        try:
+            with scandir(self.cacheDirectory) as scannedItems:
+                for scannedItem in scannedItems:
+                    if scannedItem.is_file() and not scannedItem.name.endswith(".tmp"):
+                        cachedPreviewStat = scannedItem.stat()
+                        cachedPreviews.append((cachedPreviewStat.st_mtime_ns, scannedItem.name, cachedPreviewStat.st_size))
+        except FileNotFoundError: # Nothing has been cached yet
+            pass
+
+        cachedPreviews.sort()
+        self.cachedPreviews = OrderedDict((cachedPreviewName, cachedPreviewSize) for _, cachedPreviewName, cachedPreviewSize in cachedPreviews)
+        self.cachedBytes = sum(self.cachedPreviews.values())
+
+    def getCacheKey(self, mediaPath):
+        mediaStat = os.stat(mediaPath)
+
+        return hashlib.sha1(f"{path.abspath(mediaPath)}|{mediaStat.st_size}|{mediaStat.st_mtime_ns}|{PREVIEW_MAX_DIMENSION}".encode()).hexdigest()
+
+    def getCachedPreviewPath(self, mediaPath):
+        try:
+            cacheKey = self.getCacheKey(mediaPath)
+        except OSError: # Media is gone, nothing to preview
+            return None
+
+        with self.lock:
+            if self.cachedPreviews is None:
+                self.loadCachedPreviews()
+
+            for cachedPreviewName in (f"{cacheKey}.jpg", f"{cacheKey}.png"):
+                if cachedPreviewName in self.cachedPreviews:
+                    cachedPreviewPath = path.join(self.cacheDirectory, cachedPreviewName)
+
+                    try:
+                        os.utime(cachedPreviewPath) # Marks the preview as most recently used, also across restarts
+                    except OSError: # Deleted behind our back
+                        self.cachedBytes -= self.cachedPreviews.pop(cachedPreviewName)
+                        return None
+
+                    self.cachedPreviews.move_to_end(cachedPreviewName)
+                    return cachedPreviewPath
+
+        return None
+
+    def getNewPreviewPath(self, mediaPath, hasTransparency):
+        # Returns a temporary path to write the preview to; addCachedPreview() then moves it into the cache
+        makedirs(self.cacheDirectory, exist_ok=True)
+        cacheKey = self.getCacheKey(mediaPath)
+
+        return path.join(self.cacheDirectory, f"{cacheKey}.{'png' if hasTransparency else 'jpg'}.{os.getpid()}-{get_ident()}.tmp") # Unique per process and thread so concurrent decoders never share a temporary file
+
+    def addCachedPreview(self, newPreviewPath):
+        cachedPreviewName = ".".join(path.basename(newPreviewPath).split(".")[:2]) # Drops the ".pid-thread.tmp" suffix, cache keys never contain dots
+        cachedPreviewPath = path.join(self.cacheDirectory, cachedPreviewName)
+        os.replace(newPreviewPath, cachedPreviewPath)
+
+        with self.lock:
+            if self.cachedPreviews is None:
+                self.loadCachedPreviews()
+
+            self.cachedBytes -= self.cachedPreviews.pop(cachedPreviewName, 0)
+            self.cachedPreviews[cachedPreviewName] = os.stat(cachedPreviewPath).st_size
+            self.cachedBytes += self.cachedPreviews[cachedPreviewName]
+
+            # Evicts least recently used previews until the cache fits its size cap again
+            while self.cachedBytes > self.maxCacheBytes and len(self.cachedPreviews) > 1:
+                evictedPreviewName, evictedPreviewSize = self.cachedPreviews.popitem(last=False)
+                self.cachedBytes -= evictedPreviewSize
+
+                try:
+                    os.remove(path.join(self.cacheDirectory, evictedPreviewName))
+                except OSError:
+                    pass
+
+        return cachedPreviewPath
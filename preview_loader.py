@@ -0,0 +1,217 @@
+import os
+from collections import OrderedDict, deque
+from PyQt6.QtGui import QImage, QImageReader
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from utils import getResourcePath
+from preview_cache import PREVIEW_MAX_DIMENSION
+from media_snapshot import supportedVideoFormats
+from video_poster import getVideoPosterPath, getVideoInfo, drawVideoCard
+from instrumentation import tracedPhase, traceAnnotate
+
+PREFETCH_DISTANCE = 3 # Items before and after the selected one that get decoded ahead of time
+MEMORY_CACHE_BYTES = 256 * 1024 * 1024 # Decoded previews kept in memory for instant back-and-forth skimming
+
+heifImageFormats = {
+    ("RGB", False): QImage.Format.Format_RGB888,
+    ("RGBA", False): QImage.Format.Format_RGBA8888,
+    ("RGBA", True): QImage.Format.Format_RGBA8888_Premultiplied
+}
+
+def decodeHeifImage(mediaPath):
+    # pillow_heif (and libheif behind it) loads on the first HEIC/HEIF preview instead of before the window shows up.
+    # Only open_heif is used, so Pillow's HEIF opener doesn't need registering
+    import pillow_heif
+
+    heifFile = pillow_heif.open_heif(mediaPath, convert_hdr_to_8bit=True)
+    heifPixels = heifFile.data # Decoded RGB/RGBA pixels owned by libheif
+    fullImage = QImage(heifPixels, heifFile.size[0], heifFile.size[1], heifFile.stride, heifImageFormats[(heifFile.mode, bool(heifFile.premultiplied_alpha))]) # Wraps the buffer as is, no PNG encode/decode round trip
+
+    # Downscales before anything else touches the pixels; scaled()/copy() also detaches the result from libheif's buffer
+    if max(fullImage.width(), fullImage.height()) > PREVIEW_MAX_DIMENSION:
+        mediaImage = fullImage.scaled(PREVIEW_MAX_DIMENSION, PREVIEW_MAX_DIMENSION, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+    else:
+        mediaImage = fullImage.copy()
+
+    # No EXIF rotation on top: libheif already applied the irot/imir boxes, which is where HEIF keeps the orientation.
+    # iPhones write the same orientation into EXIF too, so applying it again would rotate twice (Pillow's HEIF plugin ignores it for the same reason)
+    return mediaImage
+
+def decodeScaledImage(mediaPath):
+    # Asks the image plugin for a preview-sized image instead of decoding the original and scaling it afterwards.
+    # JPEG gets this almost for free (libjpeg decodes straight to 1/2, 1/4 or 1/8 size), other formats still skip holding the full size result
+    imageReader = QImageReader(mediaPath)
+    imageReader.setAutoTransform(True) # Applies EXIF orientation of phone JPEGs
+    originalSize = imageReader.size()
+    isLargerThanPreview = originalSize.isValid() and max(originalSize.width(), originalSize.height()) > PREVIEW_MAX_DIMENSION
+
+    if isLargerThanPreview:
+        imageReader.setScaledSize(originalSize.scaled(PREVIEW_MAX_DIMENSION, PREVIEW_MAX_DIMENSION, Qt.AspectRatioMode.KeepAspectRatio))
+
+    return imageReader.read(), isLargerThanPreview
+
+def decodeMediaImage(mediaPath):
+    # The part that touches the original, runs in a decode_service worker process; returns (preview sized QImage, is worth caching)
+    if os.path.splitext(mediaPath)[1].lower() in [".heic", ".heif"]:
+        return decodeHeifImage(mediaPath), True
+
+    return decodeScaledImage(mediaPath)
+
+# QImage instead of QPixmap because decoding happens on worker threads, and QPixmap may only be touched on the GUI thread
+@tracedPhase
+def decodePreviewImage(mediaPath, previewCache, supportedImageFormats, decodeService=None):
+    # Without a decode service (benchmarks) the original is decoded on the calling thread
+    ext = os.path.splitext(mediaPath)[1].lower()
+    traceAnnotate(media=os.path.basename(mediaPath), format=ext)
+
+    if ext in supportedVideoFormats: # Poster frame from ffmpeg (see video_poster.py), it never goes through the decoder processes
+        cachedPosterPath = getVideoPosterPath(mediaPath, previewCache)
+        posterImage = QImage(cachedPosterPath) if cachedPosterPath is not None else QImage()
+
+        return posterImage if not posterImage.isNull() else drawVideoCard(getVideoInfo(mediaPath))
+
+    if ext not in supportedImageFormats:
+        return QImage(getResourcePath("assets/images/no_preview.png"))
+
+    # Display-sized preview from a previous visit, skips decoding the full resolution original
+    cachedPreviewPath = previewCache.getCachedPreviewPath(mediaPath)
+
+    if cachedPreviewPath is not None:
+        mediaImage = QImage(cachedPreviewPath)
+
+        if not mediaImage.isNull():
+            traceAnnotate(source="cache")
+            return mediaImage
+
+    # ✅ HEIC/HEIF images via pillow_heif straight from libheif's pixel buffer, everything else through Qt's image plugins
+    try:
+        decodedImages = decodeService.decode("preview", (mediaPath,)) if decodeService is not None else [decodeMediaImage(mediaPath)]
+    except Exception as e: # General error catching, same fallback as a crashed or hung decoder process
+        print(f"Error loading image: {e}")
+        decodedImages = None
+
+    if not decodedImages or decodedImages[0][0] is None or decodedImages[0][0].isNull():
+        return QImage(getResourcePath("assets/images/no_preview.png"))
+
+    mediaImage, isWorthCaching = decodedImages[0]
+    traceAnnotate(source="decode", cached=isWorthCaching)
+
+    # Only previews that were expensive to get are worth caching (HEIC decodes and anything bigger than the preview itself)
+    if isWorthCaching:
+        try:
+            newPreviewPath = previewCache.getNewPreviewPath(mediaPath, mediaImage.hasAlphaChannel())
+
+            if mediaImage.save(newPreviewPath, "PNG" if mediaImage.hasAlphaChannel() else "JPG", 90):
+                previewCache.addCachedPreview(newPreviewPath)
+        except OSError as ose: # A full or read-only cache directory only costs the next visit a full decode
+            print(f"Could not cache preview: {ose}")
+
+    return mediaImage
+
+# Signals live on a separate QObject because QRunnable is not a QObject and cannot emit signals by itself
+class PreviewDecodeSignals(QObject):
+    decoded = pyqtSignal(str, QImage, int) # Media path, decoded preview, cache generation the decode was started in
+
+class PreviewDecodeTask(QRunnable):
+    # Gets executed upon creating an instance of the class
+    def __init__(self, mediaPath, previewCache, supportedImageFormats, cacheGeneration, decodeService):
+        super().__init__()
+        self.mediaPath = mediaPath
+        self.cacheGeneration = cacheGeneration
+        self.previewCache = previewCache
+        self.supportedImageFormats = supportedImageFormats
+        self.decodeService = decodeService
+        self.signals = PreviewDecodeSignals()
+
+    def run(self):
+        try:
+            mediaImage = decodePreviewImage(self.mediaPath, self.previewCache, self.supportedImageFormats, self.decodeService)
+        except Exception as e: # General error catching, the decoded signal must still come or the path stays pending forever
+            print(f"Error loading preview: {e}")
+            mediaImage = QImage(getResourcePath("assets/images/no_preview.png"))
+
+        self.signals.decoded.emit(self.mediaPath, mediaImage, self.cacheGeneration)
+
+class PreviewLoader(QObject):
+    previewReady = pyqtSignal(str, QImage) # Only emitted for the most recently requested media path
+
+    # Gets executed upon creating an instance of the class
+    def __init__(self, previewCache, supportedImageFormats, decodeService=None):
+        super().__init__()
+        self.previewCache = previewCache
+        self.supportedImageFormats = supportedImageFormats
+        self.decodeService = decodeService # Decoder processes the originals are decoded in, see decode_service.py
+        self.decoderPool = QThreadPool() # Own pool so clearing queued decodes never touches rename jobs on the global pool; its threads mostly wait on the decoder processes
+        self.decoderPool.setMaxThreadCount(max(2, min(4, os.cpu_count() or 2)))
+        self.decodedPreviews = OrderedDict() # Media path -> QImage, least recently used first
+        self.decodedPreviewsBytes = 0
+        self.pendingMediaPaths = {} # Media path -> task that is queued or running
+        self.staleDecodeTasks = [] # Running tasks started before clearDecodedPreviews(), kept alive until they finish
+        self.finishedDecodeTasks = deque(maxlen=32) # Finished tasks are released a little later, their thread may still be returning from run()
+        self.cacheGeneration = 0
+        self.requestedMediaPath = None
+
+    def requestPreview(self, mediaPath, neighborMediaPaths=()):
+        self.requestedMediaPath = mediaPath
+
+        self.dropQueuedDecodes() # Queued decodes for the previous selection are out of date now
+
+        if mediaPath in self.decodedPreviews:
+            self.decodedPreviews.move_to_end(mediaPath)
+            self.previewReady.emit(mediaPath, self.decodedPreviews[mediaPath])
+        else:
+            self.startDecoding(mediaPath, priority=1)
+
+        for neighborMediaPath in neighborMediaPaths: # Nearest neighbors first
+            if neighborMediaPath not in self.decodedPreviews:
+                self.startDecoding(neighborMediaPath, priority=0)
+
+    def cancelRequest(self):
+        # Nothing is selected anymore, so late decodes must not pop up in the media viewer
+        self.requestedMediaPath = None
+        self.dropQueuedDecodes()
+
+    def dropQueuedDecodes(self):
+        # Already running decodes can't be taken back; they finish and still land in the memory cache
+        for pendingMediaPath, pendingTask in list(self.pendingMediaPaths.items()):
+            if self.decoderPool.tryTake(pendingTask):
+                del self.pendingMediaPaths[pendingMediaPath]
+
+    def startDecoding(self, mediaPath, priority):
+        if mediaPath in self.pendingMediaPaths:
+            return
+
+        decodeTask = PreviewDecodeTask(mediaPath, self.previewCache, self.supportedImageFormats, self.cacheGeneration, self.decodeService)
+        decodeTask.setAutoDelete(False) # Python keeps the reference in pendingMediaPaths until the task is finished or taken back out of the pool
+        decodeTask.signals.decoded.connect(self.previewDecoded)
+        self.pendingMediaPaths[mediaPath] = decodeTask
+        self.decoderPool.start(decodeTask, priority)
+
+    def previewDecoded(self, mediaPath, mediaImage, cacheGeneration):
+        if cacheGeneration != self.cacheGeneration: # Decoded before the media was moved, the result is thrown away
+            self.finishedDecodeTasks.extend(staleTask for staleTask in self.staleDecodeTasks if staleTask.mediaPath == mediaPath and staleTask.cacheGeneration == cacheGeneration)
+            self.staleDecodeTasks = [staleTask for staleTask in self.staleDecodeTasks if staleTask.mediaPath != mediaPath or staleTask.cacheGeneration != cacheGeneration]
+            return
+
+        self.finishedDecodeTasks.append(self.pendingMediaPaths.pop(mediaPath, None))
+        self.cacheDecodedPreview(mediaPath, mediaImage)
+
+        if mediaPath == self.requestedMediaPath:
+            self.previewReady.emit(mediaPath, mediaImage)
+
+    def cacheDecodedPreview(self, mediaPath, mediaImage):
+        self.decodedPreviewsBytes -= self.decodedPreviews.pop(mediaPath, QImage()).sizeInBytes()
+        self.decodedPreviews[mediaPath] = mediaImage
+        self.decodedPreviewsBytes += mediaImage.sizeInBytes()
+
+        while self.decodedPreviewsBytes > MEMORY_CACHE_BYTES and len(self.decodedPreviews) > 1:
+            _, evictedImage = self.decodedPreviews.popitem(last=False)
+            self.decodedPreviewsBytes -= evictedImage.sizeInBytes()
+
+    def clearDecodedPreviews(self):
+        # Paths get reused after renaming/moving, so anything decoded before is no longer trustworthy
+        self.dropQueuedDecodes()
+        self.staleDecodeTasks.extend(self.pendingMediaPaths.values())
+        self.pendingMediaPaths = {}
+        self.cacheGeneration += 1
+        self.decodedPreviews.clear()
+        self.decodedPreviewsBytes = 0
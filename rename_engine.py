@@ -0,0 +1,124 @@
+from threading import Event
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+from organizer_core import OrganizeJob, findDuplicateMedia
+from rename_journal import undoRenameJournal
+from event_segmentation import loadCaptureTimeline
+
+# Signals live on a separate QObject because QRunnable is not a QObject and cannot emit signals by itself
+class RenameJobSignals(QObject):
+    started = pyqtSignal(int, "qint64") # Total media count, total bytes (qint64 since card dumps easily exceed a 32 bit int)
+    progress = pyqtSignal(int, "qint64", float, float, float) # Renamed media count, renamed bytes, files per second, megabytes per second, estimated seconds left
+    mediaRenamed = pyqtSignal(str, str) # Old media name, new media name
+    finished = pyqtSignal(bool, object) # True if the job was cancelled before renaming every media, OrganizeJob result
+    failed = pyqtSignal(str)
+
+class RenameJob(QRunnable):
+    # Runs organizer_core.OrganizeJob on a worker thread and forwards its callbacks as Qt signals
+    def __init__(self, mediaLocationDirectory, mediaDestinationDirectory, mediaCode, mediaIndex, copyConcurrency=1, mediaOrdering="mtime", metadataCache=None, duplicateActions=None, resumeJournal=None, mediaDestinations=None, renamePlan=None):
+        super().__init__()
+        self.signals = RenameJobSignals()
+        self.resumeJournal = resumeJournal # Interrupted or cancelled job to continue instead of starting a new one
+        self.renamePlan = renamePlan # Plan the user previewed (see RenamePlanJob), applied as is instead of planning again
+        self.cancelRequested = Event()
+        self.organizeJob = OrganizeJob(mediaLocationDirectory, mediaDestinationDirectory, mediaCode, mediaIndex, copyConcurrency, self.cancelRequested, mediaOrdering, metadataCache, duplicateActions, mediaDestinations)
+        self.organizeJob.onStarted = self.signals.started.emit
+        self.organizeJob.onProgress = self.signals.progress.emit
+        self.organizeJob.onMediaRenamed = self.signals.mediaRenamed.emit
+
+    def cancel(self):
+        self.cancelRequested.set() # Checked between files so no file is ever left half moved
+
+    def run(self):
+        try:
+            if self.resumeJournal is not None:
+                organizeResult = self.organizeJob.resume(self.resumeJournal)
+            elif self.renamePlan is not None:
+                organizeResult = self.organizeJob.applyRenamePlan(self.renamePlan)
+            else:
+                organizeResult = self.organizeJob.run()
+
+            self.signals.finished.emit(organizeResult["cancelled"], organizeResult)
+        except Exception as e: # General error catching, reported back to the GUI thread
+            self.signals.failed.emit(str(e))
+
+class RenamePlanSignals(QObject):
+    finished = pyqtSignal(object) # rename_plan.RenamePlan
+    failed = pyqtSignal(str)
+
+class RenamePlanJob(QRunnable):
+    # Scans and plans a rename job on a worker thread without moving anything, the GUI shows the plan as a dry run first
+    def __init__(self, mediaLocationDirectory, mediaDestinationDirectory, mediaCode, mediaIndex, mediaOrdering="mtime", metadataCache=None, duplicateActions=None, mediaDestinations=None):
+        super().__init__()
+        self.signals = RenamePlanSignals()
+        self.organizeJob = OrganizeJob(mediaLocationDirectory, mediaDestinationDirectory, mediaCode, mediaIndex, mediaOrdering=mediaOrdering, metadataCache=metadataCache, duplicateActions=duplicateActions, mediaDestinations=mediaDestinations)
+
+    def run(self):
+        try:
+            self.signals.finished.emit(self.organizeJob.planRename())
+        except Exception as e: # General error catching, reported back to the GUI thread
+            self.signals.failed.emit(str(e))
+
+class DuplicateCheckSignals(QObject):
+    stage = pyqtSignal(str, int) # "partial" or "full", media that are still candidates
+    finished = pyqtSignal(object) # {media name: (library media path, size in bytes)}
+    failed = pyqtSignal(str)
+
+class DuplicateCheckJob(QRunnable):
+    # Compares the media location against the library's hash index on a worker thread before anything gets moved
+    def __init__(self, mediaLocationDirectory, hashIndex):
+        super().__init__()
+        self.signals = DuplicateCheckSignals()
+        self.mediaLocationDirectory = mediaLocationDirectory
+        self.hashIndex = hashIndex
+
+    def run(self):
+        try:
+            self.signals.finished.emit(findDuplicateMedia(self.mediaLocationDirectory, self.hashIndex, onStage=self.signals.stage.emit))
+        except Exception as e: # General error catching, reported back to the GUI thread
+            self.signals.failed.emit(str(e))
+
+class SegmentationJobSignals(QObject):
+    finished = pyqtSignal(object) # event_segmentation.CaptureTimeline
+    failed = pyqtSignal(str)
+
+class SegmentationJob(QRunnable):
+    # Reads the capture times of every media of the media location on a worker thread; the splitting itself is fast enough for the GUI thread
+    def __init__(self, mediaLocationDirectory, metadataCache):
+        super().__init__()
+        self.signals = SegmentationJobSignals()
+        self.mediaLocationDirectory = mediaLocationDirectory
+        self.metadataCache = metadataCache
+
+    def run(self):
+        try:
+            self.signals.finished.emit(loadCaptureTimeline(self.mediaLocationDirectory, self.metadataCache))
+        except Exception as e: # General error catching, reported back to the GUI thread
+            self.signals.failed.emit(str(e))
+
+class UndoJobSignals(QObject):
+    progress = pyqtSignal(int, int) # Restored media count, media to restore
+    finished = pyqtSignal(bool, object) # True if cancelled, [(media name, error message)] of media that could not be restored
+    failed = pyqtSignal(str)
+
+class UndoJob(QRunnable):
+    # Replays a rename journal in reverse on a worker thread
+    def __init__(self, renameJournal):
+        super().__init__()
+        self.signals = UndoJobSignals()
+        self.cancelRequested = Event()
+        self.renameJournal = renameJournal
+
+    def cancel(self):
+        self.cancelRequested.set()
+
+    def run(self):
+        try:
+            failedMedia = undoRenameJournal(self.renameJournal, self.cancelRequested, self.signals.progress.emit)
+            self.signals.finished.emit(self.cancelRequested.is_set(), failedMedia)
+        except Exception as e: # General error catching, reported back to the GUI thread
+            self.signals.failed.emit(str(e))
+
+class IngestQueueSignals(QObject):
+    # ingest_queue.IngestQueue calls back from its device threads; emitting these hands the updates to the GUI thread
+    jobChanged = pyqtSignal(object) # IngestJob that was queued, started, progressed or finished
+    queueFinished = pyqtSignal()
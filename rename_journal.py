@@ -0,0 +1,369 @@
+import errno
+import json
+import os
+import shutil
+import time
+from os import path, makedirs, scandir, remove, rmdir
+from threading import Lock
+from media_index import INDEX_DIRECTORY_NAME, getMediaNumber
+from transfer import moveAcrossDevices, renameNoReplace, isCopyVerified, PARTIAL_FILE_SUFFIX
+from instrumentation import tracedPhase, traceCount
+
+# Append-only write-ahead journal of one bulk rename job, stored as JSON lines in <media root destination>/.peo/journals/<job id>.jsonl:
+#   {"job": {...}}                                     who/what/where, written once
+#   {"plan": [[action, source, target, size, library, mtime]]} every planned move, fsynced before the first file moves
+#   {"done": [plan rows]} / {"undone": [plan rows]}    completion markers, fsynced in groups
+#   {"state": "finished" | "cancelled" | "abandoned" | "undone"}
+# Losing the last group of markers in a crash is harmless: resuming and undoing check the file system for rows that aren't marked yet.
+# An unmarked row's target only counts as moved by the job if it matches the row's size and mtime (and content, while the source is still
+# there), see isTargetWritten(); another job may have been numbered into a cancelled job's remaining names in the meantime.
+# Must never import PyQt6, the command line batch mode uses it too
+
+JOURNAL_DIRECTORY_NAME = "journals"
+JOURNAL_SYNC_GROUP_SIZE = 512 # Markers written per fsync; unsynced markers are recovered from the file system anyway
+JOURNAL_SYNC_INTERVAL_SECONDS = 1.0 # ...or at least this often while a job runs
+JOURNAL_MTIME_TOLERANCE_NS = 2_000_000_000 # FAT and exFAT targets keep modification times in 2 second steps
+JOURNAL_TAIL_BYTES = 4096 # Read from the end of a journal to find its last state record without parsing the plan
+MAX_CLOSED_JOURNALS = 100 # Newest finished, abandoned and undone journals kept for undoing by job id; older ones are removed when a job starts
+resumableJournalStates = ["interrupted", "cancelled"]
+closedJournalStates = ["finished", "abandoned", "undone"]
+openJournalPaths = set() # Journals of jobs running in this process; they look "interrupted" on disk but must not be resumed or undone
+journalCreationLock = Lock() # Queued jobs create their journals from several threads
+journaledMediaNumbers = {} # Journal path -> ((size, mtime), highest CODE_N target if resumable else 0), so planning a job doesn't reparse every journal
+journaledMediaNumbersLock = Lock()
+
+class RenameJournal:
+    # Gets executed upon creating an instance of the class
+    def __init__(self, journalPath):
+        self.journalPath = journalPath
+        self.jobId = path.splitext(path.basename(journalPath))[0]
+        self.jobInfo = {}
+        self.plannedMedia = [] # [action, source path, target path, size in bytes, library media path or None, source st_mtime_ns] (journals written before the mtime have 5 fields)
+        self.doneRows = set()
+        self.undoneRows = set()
+        self.state = "interrupted" # Until a state record says otherwise
+        self.pendingRecords = []
+        self.pendingMarkers = {"done": [], "undone": []} # Coalesced into one line per group
+        self.lastSyncTime = time.monotonic()
+        self.journalFile = None
+        self.lock = Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.journalPath, "rb") as journalFile:
+                intactLength = 0
+
+                for journalLine in journalFile:
+                    try:
+                        journalRecord = json.loads(journalLine)
+                    except ValueError: # Torn last line from a crash; everything before it is intact
+                        break
+
+                    if not journalLine.endswith(b"\n"): # Parses, but the next append would glue onto it
+                        break
+
+                    intactLength += len(journalLine)
+                    self.jobInfo = journalRecord.get("job", self.jobInfo)
+                    self.plannedMedia.extend(journalRecord.get("plan", []))
+                    self.doneRows.update(journalRecord.get("done", []))
+                    self.undoneRows.update(journalRecord.get("undone", []))
+                    self.state = journalRecord.get("state", self.state)
+
+            if intactLength < path.getsize(self.journalPath):
+                os.truncate(self.journalPath, intactLength) # Appending after the torn tail would make the next record unreadable too
+        except FileNotFoundError: # Journal that is about to be created
+            pass
+
+    def appendRecords(self, journalRecords, forceSync=False):
+        with self.lock:
+            self.pendingRecords.extend(journalRecords)
+
+            if forceSync or time.monotonic() - self.lastSyncTime >= JOURNAL_SYNC_INTERVAL_SECONDS:
+                self.syncRecords()
+
+    def appendMarker(self, markerKind, plannedRow):
+        with self.lock:
+            self.pendingMarkers[markerKind].append(plannedRow)
+
+            if len(self.pendingMarkers[markerKind]) >= JOURNAL_SYNC_GROUP_SIZE or time.monotonic() - self.lastSyncTime >= JOURNAL_SYNC_INTERVAL_SECONDS:
+                self.syncRecords()
+
+    def syncRecords(self):
+        if self.journalFile is None:
+            self.journalFile = open(self.journalPath, "a")
+            openJournalPaths.add(path.normpath(self.journalPath))
+
+        # Markers go before state records so a "finished" line never precedes the markers of its last group
+        self.pendingRecords[:0] = [{markerKind: plannedRows} for markerKind, plannedRows in self.pendingMarkers.items() if plannedRows]
+        self.pendingMarkers = {"done": [], "undone": []}
+
+        if self.pendingRecords:
+            traceCount(journalRecords=len(self.pendingRecords))
+            self.journalFile.write("".join(f"{json.dumps(journalRecord)}\n" for journalRecord in self.pendingRecords))
+            self.journalFile.flush()
+            os.fsync(self.journalFile.fileno()) # One fsync per group instead of per file keeps journaling out of the way of the moves
+            self.pendingRecords = []
+
+        self.lastSyncTime = time.monotonic()
+
+    def markDone(self, plannedRow):
+        self.doneRows.add(plannedRow)
+        self.appendMarker("done", plannedRow)
+
+    def markUndone(self, plannedRow):
+        self.undoneRows.add(plannedRow)
+        self.appendMarker("undone", plannedRow)
+
+    def setState(self, journalState):
+        self.state = journalState
+        self.appendRecords([{"state": journalState}], forceSync=True)
+
+    def close(self):
+        with self.lock:
+            self.syncRecords()
+            self.journalFile.close()
+            self.journalFile = None
+            openJournalPaths.discard(path.normpath(self.journalPath))
+
+    def isTargetWritten(self, plannedRow):
+        # True only if the row's target is provably what this job moved (or linked) there, not other media that got the same name later
+        plannedAction, sourcePath, targetPath, mediaSize, libraryMediaPath, *sourceMtime = self.plannedMedia[plannedRow]
+
+        try:
+            if plannedAction == "link":
+                return path.samefile(targetPath, libraryMediaPath) # Hard links and symlinks both resolve to the library media
+
+            targetStat = os.stat(targetPath)
+
+            if targetStat.st_size != mediaSize or (sourceMtime and abs(targetStat.st_mtime_ns - sourceMtime[0]) >= JOURNAL_MTIME_TOLERANCE_NS): # Renames and verified copies both keep the mtime
+                return False
+            if path.lexists(sourcePath): # Complete copy whose source wasn't removed yet, or a same sized stranger: the bytes decide
+                return isCopyVerified(sourcePath, targetPath, mediaSize)
+
+            return True
+        except OSError: # Gone, or a link whose library media is gone
+            return False
+
+    @tracedPhase
+    def getPendingRows(self):
+        # Returns (rows that still have to be moved, rows whose target is taken by other media). Unmarked rows whose move did happen
+        # before a crash get marked now instead of being moved twice; nothing is removed or replaced that this job didn't write
+        pendingRows, collidingRows = [], []
+
+        for plannedRow, (plannedAction, sourcePath, targetPath, *_) in enumerate(self.plannedMedia):
+            if plannedRow in self.doneRows:
+                continue
+
+            sourceExists, targetExists = path.lexists(sourcePath), path.lexists(targetPath)
+
+            if targetExists and self.isTargetWritten(plannedRow):
+                if sourceExists:
+                    remove(sourcePath) # Copy (or link) was complete, only removing the source was left
+
+                self.markDone(plannedRow)
+            elif targetExists and sourceExists:
+                collidingRows.append(plannedRow)
+            elif sourceExists:
+                pendingRows.append(plannedRow)
+
+        return pendingRows, collidingRows
+
+    def getDoneCount(self):
+        return len(self.doneRows - self.undoneRows)
+
+def createRenameJournal(mediaRootDirectory, jobInfo, plannedMedia):
+    journalDirectory = path.join(mediaRootDirectory, INDEX_DIRECTORY_NAME, JOURNAL_DIRECTORY_NAME)
+    makedirs(journalDirectory, exist_ok=True)
+
+    with journalCreationLock:
+        jobId = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        jobNumber = 1
+
+        while path.exists(path.join(journalDirectory, f"{jobId}.jsonl")): # Two jobs of one process within the same second
+            jobNumber += 1
+            jobId = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{jobNumber}"
+
+        renameJournal = RenameJournal(path.join(journalDirectory, f"{jobId}.jsonl"))
+        renameJournal.jobInfo = jobInfo
+        renameJournal.plannedMedia = plannedMedia
+        renameJournal.appendRecords([{"job": jobInfo}, {"plan": plannedMedia}], forceSync=True) # Written ahead of the first move
+
+    try:
+        journalDirectoryDescriptor = os.open(journalDirectory, os.O_RDONLY)
+
+        try:
+            os.fsync(journalDirectoryDescriptor) # Makes the new journal's directory entry durable too
+        finally:
+            os.close(journalDirectoryDescriptor)
+    except OSError: # Directories can't be opened or fsynced on Windows, NTFS journals the entry anyway
+        pass
+
+    pruneRenameJournals(mediaRootDirectory) # Only once the new job id is taken, so it can never be the id of a journal removed a moment ago
+
+    return renameJournal
+
+def getJournalPaths(mediaRootDirectory):
+    # Oldest job first, job ids start with their creation time (and "-2", "-3", ... of one process within the same second sort by length).
+    # Journals of jobs that are still running here are left out, loading one could even truncate its half written last line
+    try:
+        with scandir(path.join(mediaRootDirectory, INDEX_DIRECTORY_NAME, JOURNAL_DIRECTORY_NAME)) as scannedItems:
+            journalNames = [scannedItem.name for scannedItem in scannedItems if scannedItem.name.endswith(".jsonl") and path.normpath(scannedItem.path) not in openJournalPaths]
+    except OSError: # No job has been journaled yet
+        return []
+
+    return [path.join(mediaRootDirectory, INDEX_DIRECTORY_NAME, JOURNAL_DIRECTORY_NAME, journalName) for journalName in sorted(journalNames, key=lambda journalName: (journalName[:15], len(journalName), journalName))]
+
+def readLastJournalState(journalPath):
+    # The state of the journal's last record if that is a state record; None if markers follow the last one (a crash, a resume or a
+    # partial undo), there is none yet, or the tail is torn. A closed state at the very end is final, the plan needn't be parsed for it
+    try:
+        with open(journalPath, "rb") as journalFile:
+            tailStart = max(0, os.fstat(journalFile.fileno()).st_size - JOURNAL_TAIL_BYTES)
+            journalFile.seek(tailStart)
+            journalTail = journalFile.read()
+    except OSError:
+        return None
+
+    if not journalTail.endswith(b"\n"):
+        return None
+
+    _, lineBreak, lastLine = journalTail[:-1].rpartition(b"\n")
+
+    if not lineBreak and tailStart > 0: # The last line started before the tail, so it's a long marker or plan line
+        return None
+
+    try:
+        journalRecord = json.loads(lastLine)
+    except ValueError:
+        return None
+
+    return journalRecord["state"] if isinstance(journalRecord, dict) and list(journalRecord) == ["state"] else None
+
+def getRenameJournals(mediaRootDirectory, skippedStates=()):
+    # Oldest job first; journals whose last record is a state in skippedStates aren't parsed at all
+    return [RenameJournal(journalPath) for journalPath in getJournalPaths(mediaRootDirectory) if readLastJournalState(journalPath) not in skippedStates]
+
+def pruneRenameJournals(mediaRootDirectory):
+    # Removes all but the newest MAX_CLOSED_JOURNALS journals of jobs that are over, so RENAME and UNDO never go through years of them.
+    # Interrupted and cancelled jobs are kept until they are resumed or abandoned
+    closedJournalPaths = [journalPath for journalPath in getJournalPaths(mediaRootDirectory) if readLastJournalState(journalPath) in closedJournalStates]
+
+    for journalPath in closedJournalPaths[:max(0, len(closedJournalPaths) - MAX_CLOSED_JOURNALS)]:
+        try:
+            remove(journalPath)
+        except OSError as ose: # Read-only or busy, tried again when the next job starts
+            print(f"Could not remove rename journal: {ose}")
+
+        with journaledMediaNumbersLock:
+            journaledMediaNumbers.pop(journalPath, None)
+
+@tracedPhase
+def undoRenameJournal(renameJournal, cancelEvent=None, onProgress=lambda undoneMediaCount, totalMediaCount: None, onLog=print):
+    # Replays the job in reverse, newest move first, and puts every media back under its original name in the media location
+    # Unmarked rows whose target the job provably wrote were moved (or fully copied) right before a crash and get undone too
+    rowsToUndo = [plannedRow for plannedRow in range(len(renameJournal.plannedMedia) - 1, -1, -1) if plannedRow not in renameJournal.undoneRows and (plannedRow in renameJournal.doneRows or renameJournal.isTargetWritten(plannedRow))]
+    failedMedia = []
+
+    for undoneMediaCount, plannedRow in enumerate(rowsToUndo, start=1):
+        if cancelEvent is not None and cancelEvent.is_set():
+            break
+
+        plannedAction, sourcePath, targetPath, *_ = renameJournal.plannedMedia[plannedRow]
+
+        try:
+            if not path.lexists(targetPath) and path.lexists(sourcePath): # Undone before a crash, only the marker was lost
+                pass
+            elif path.lexists(sourcePath):
+                if plannedRow in renameJournal.doneRows: # The source was removed after the move, so this is other media that took the original name since
+                    raise FileExistsError(errno.EEXIST, "Original media name is taken", sourcePath)
+
+                remove(targetPath) # Copy that never got its source removed, the original is still in place
+            elif plannedAction == "link":
+                # The bytes live in the library, so the media location gets a real copy back and the link goes away
+                shutil.copy2(targetPath, f"{sourcePath}{PARTIAL_FILE_SUFFIX}")
+                renameNoReplace(f"{sourcePath}{PARTIAL_FILE_SUFFIX}", sourcePath)
+                remove(targetPath)
+            else:
+                makedirs(path.dirname(sourcePath), exist_ok=True)
+
+                try:
+                    renameNoReplace(targetPath, sourcePath) # Never over media that took the original name since
+                except OSError as ose:
+                    if ose.errno != errno.EXDEV:
+                        raise
+
+                    moveAcrossDevices(targetPath, sourcePath)
+
+            renameJournal.markUndone(plannedRow)
+            onLog(f"{path.basename(targetPath)} restored to {path.basename(sourcePath)}")
+        except Exception as e: # General error catching, the rest of the job still gets undone
+            onLog(f"Could not restore {path.basename(targetPath)}: {e}")
+            failedMedia.append((path.basename(targetPath), str(e)))
+
+        onProgress(undoneMediaCount, len(rowsToUndo))
+
+    if not failedMedia and renameJournal.getDoneCount() == 0:
+        renameJournal.setState("undone")
+
+        # Event directories (and Month/Year above them) go away too if the job left them empty; rmdir fails on the first non-empty one.
+        # Segmented jobs (see event_segmentation.py) have one per event
+        mediaRootDirectory = path.dirname(path.dirname(path.dirname(renameJournal.journalPath)))
+
+        for emptyDirectory in {path.normpath(renameJournal.jobInfo.get("destination", mediaRootDirectory))} | {path.dirname(path.normpath(targetPath)) for _, _, targetPath, *_ in renameJournal.plannedMedia}:
+            try:
+                while emptyDirectory.startswith(f"{mediaRootDirectory}{os.sep}"):
+                    rmdir(emptyDirectory)
+                    emptyDirectory = path.dirname(emptyDirectory)
+            except OSError:
+                pass
+
+    renameJournal.close()
+    traceCount(files=len(rowsToUndo), failed=len(failedMedia))
+
+    return failedMedia
+
+def getResumableJournals(mediaRootDirectory):
+    return [renameJournal for renameJournal in getRenameJournals(mediaRootDirectory, closedJournalStates) if renameJournal.state in resumableJournalStates and renameJournal.plannedMedia]
+
+def getJournaledMediaNumber(mediaRootDirectory):
+    # Highest CODE_N target of every resumable journal. A cancelled or interrupted job gets its remaining names back when it's resumed,
+    # so no other job may be numbered into them in the meantime (see MediaIndex.reserveMediaNumbers()). Unchanged journals aren't reread
+    try:
+        with scandir(path.join(mediaRootDirectory, INDEX_DIRECTORY_NAME, JOURNAL_DIRECTORY_NAME)) as scannedItems:
+            journalItems = [scannedItem for scannedItem in scannedItems if scannedItem.name.endswith(".jsonl") and path.normpath(scannedItem.path) not in openJournalPaths]
+    except OSError: # No job has been journaled yet
+        return 0
+
+    highestMediaNumber = 0
+
+    with journaledMediaNumbersLock:
+        for journalItem in journalItems:
+            try:
+                journalStat = journalItem.stat()
+            except OSError: # Removed meanwhile
+                continue
+
+            journalKey = (journalStat.st_size, journalStat.st_mtime_ns)
+
+            if journaledMediaNumbers.get(journalItem.path, (None, 0))[0] != journalKey:
+                renameJournal = RenameJournal(journalItem.path) if readLastJournalState(journalItem.path) not in closedJournalStates else None
+                journaledMediaNumbers[journalItem.path] = (journalKey, max((getMediaNumber(path.basename(targetPath)) for _, _, targetPath, *_ in renameJournal.plannedMedia), default=0) if renameJournal is not None and renameJournal.state in resumableJournalStates else 0)
+
+            highestMediaNumber = max(highestMediaNumber, journaledMediaNumbers[journalItem.path][1])
+
+    return highestMediaNumber
+
+def getUndoableJournal(mediaRootDirectory, jobId="last"):
+    # "last" is the newest job that still has moved media; anything else must be an exact job id. Newest first, so usually only one
+    # journal gets parsed
+    for journalPath in reversed(getJournalPaths(mediaRootDirectory)):
+        if (jobId != "last" and path.splitext(path.basename(journalPath))[0] != jobId) or readLastJournalState(journalPath) == "undone":
+            continue
+
+        renameJournal = RenameJournal(journalPath)
+
+        if renameJournal.state != "undone" and renameJournal.getDoneCount() > 0:
+            return renameJournal
+
+    return None
@@ -0,0 +1,89 @@
+import csv
+import json
+import time
+from os import scandir
+from instrumentation import tracedPhase, traceCount
+
+# The full source -> target mapping of one rename job, computed before anything moves: numbering, extensions and target
+# directories in one pass, checked against a single listing of every target directory. The GUI shows it as a dry run
+# (and can export it), the command line batch mode prints it with --dry-run. Must never import PyQt6 either
+
+collisionReasons = {"exists": "Target already exists"}
+
+class RenamePlan:
+    # plannedMedia are the (media name, size in bytes, new media name, plan row) tuples OrganizeJob moves, collisions are left out of them
+    def __init__(self, mediaLocationDirectory, plannedMedia, mediaDestinations, mediaMtimes, collidingMedia, skippedMedia, mediaNumberReservation, planSeconds):
+        self.mediaLocationDirectory = mediaLocationDirectory
+        self.plannedMedia = plannedMedia
+        self.mediaDestinations = mediaDestinations # Media name -> target directory of every planned and colliding media
+        self.mediaMtimes = mediaMtimes # Media name -> st_mtime_ns at planning time, journaled so a resume can tell its own targets from other media
+        self.collidingMedia = collidingMedia # (media name, new media name, collision reason) of media that stay in the media location
+        self.skippedMedia = skippedMedia # MediaEntry objects of duplicates that are skipped
+        self.mediaNumberReservation = mediaNumberReservation # Held until the plan is applied or dropped, see OrganizeJob.dropRenamePlan()
+        self.planSeconds = planSeconds
+
+    def getRows(self):
+        # (media name, new media name, target directory, collision reason or None) in plan order
+        plannedRows = [(mediaName, newMediaBaseName, self.mediaDestinations[mediaName], None) for mediaName, _, newMediaBaseName, _ in self.plannedMedia]
+        return plannedRows + [(mediaName, newMediaBaseName, self.mediaDestinations[mediaName], collisionReason) for mediaName, newMediaBaseName, collisionReason in self.collidingMedia]
+
+    def toResult(self):
+        # Same keys as an OrganizeJob result where they overlap, so --dry-run output reads like a real run's
+        return {
+            "source": self.mediaLocationDirectory,
+            "dryRun": True,
+            "planned": [{"from": mediaName, "to": f"{targetDirectory}/{newMediaBaseName}"} for mediaName, newMediaBaseName, targetDirectory, collisionReason in self.getRows() if collisionReason is None],
+            "collisions": [{"media": mediaName, "to": f"{targetDirectory}/{newMediaBaseName}", "error": collisionReasons[collisionReason]} for mediaName, newMediaBaseName, targetDirectory, collisionReason in self.getRows() if collisionReason is not None],
+            "skipped": [mediaEntry.name for mediaEntry in self.skippedMedia],
+            "seconds": round(self.planSeconds, 4)
+        }
+
+@tracedPhase
+def buildRenamePlan(mediaLocationDirectory, mediaEntries, mediaCode, firstMediaNumber, getMediaDestination, skippedMedia=(), mediaNumberReservation=None):
+    # Numbers follow the order of mediaEntries. Every target directory is listed once; a new name that is already taken there
+    # (e.g. CODE_N files the media index doesn't know about yet) would be overwritten by os.rename, so that media stays put instead.
+    # Names taken after planning are caught again when the plan is applied, see transfer.renameNoReplace()
+    startTime = time.perf_counter()
+    mediaDestinations = {mediaEntry.name: getMediaDestination(mediaEntry.name) for mediaEntry in mediaEntries}
+    takenNames = {targetDirectory: getTakenNames(targetDirectory) for targetDirectory in set(mediaDestinations.values())}
+    plannedMedia, collidingMedia = [], []
+
+    for mediaNumber, mediaEntry in enumerate(mediaEntries, start=firstMediaNumber):
+        extensionStart = mediaEntry.name.rfind(".")
+        newMediaBaseName = f"{mediaCode}_{mediaNumber}{mediaEntry.name[extensionStart:] if extensionStart > 0 else ''}"
+        directoryNames = takenNames[mediaDestinations[mediaEntry.name]]
+        foldedName = newMediaBaseName.casefold() # Case-insensitive file systems (macOS, Windows, exFAT) treat CODE_1.JPG and CODE_1.jpg as one file
+
+        if foldedName in directoryNames:
+            collidingMedia.append((mediaEntry.name, newMediaBaseName, "exists"))
+        else:
+            directoryNames.add(foldedName)
+            plannedMedia.append((mediaEntry.name, mediaEntry.st_size, newMediaBaseName, len(plannedMedia)))
+
+    traceCount(files=len(mediaEntries), directories=len(takenNames), collisions=len(collidingMedia))
+
+    return RenamePlan(mediaLocationDirectory, plannedMedia, mediaDestinations, {mediaEntry.name: mediaEntry.st_mtime_ns for mediaEntry in mediaEntries}, collidingMedia, list(skippedMedia), mediaNumberReservation, time.perf_counter() - startTime)
+
+def getTakenNames(targetDirectory):
+    # Case folded names of everything in the directory; a directory that doesn't exist yet has nothing to collide with
+    try:
+        with scandir(targetDirectory) as scannedItems: # From os.scandir
+            return {scannedItem.name.casefold() for scannedItem in scannedItems}
+    except FileNotFoundError:
+        return set()
+
+def exportRenamePlan(renamePlan, exportPath):
+    # CSV for spreadsheets, JSON (the --dry-run format) for anything else
+    if exportPath.lower().endswith(".csv"):
+        with open(exportPath, "w", newline="", encoding="utf-8") as exportFile:
+            planWriter = csv.writer(exportFile)
+            planWriter.writerow(["Media", "New Name", "Event Directory", "Status"])
+
+            for mediaName, newMediaBaseName, targetDirectory, collisionReason in renamePlan.getRows():
+                planWriter.writerow([mediaName, newMediaBaseName, targetDirectory, collisionReasons[collisionReason] if collisionReason is not None else "Rename"])
+
+            for mediaEntry in renamePlan.skippedMedia:
+                planWriter.writerow([mediaEntry.name, "", "", "Skipped duplicate"])
+    else:
+        with open(exportPath, "w", encoding="utf-8") as exportFile:
+            json.dump(renamePlan.toResult(), exportFile, indent=2)
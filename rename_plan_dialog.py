@@ -0,0 +1,85 @@
+from os import path
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableView, QDialogButtonBox, QHeaderView, QFileDialog, QMessageBox
+from PyQt6.QtGui import QColor
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from rename_plan import collisionReasons, exportRenamePlan
+
+class RenamePlanModel(QAbstractTableModel):
+    # Table model over the plan's rows instead of one widget item per cell, so a 10k media plan opens instantly
+    columnTitles = ["Media", "New Name", "Event Directory", "Status"]
+
+    # Gets executed upon creating an instance of the class
+    def __init__(self, renamePlan, mediaRootDirectory):
+        super().__init__()
+        self.planRows = renamePlan.getRows()
+        self.mediaRootDirectory = mediaRootDirectory
+
+    def rowCount(self, parentIndex=QModelIndex()):
+        return 0 if parentIndex.isValid() else len(self.planRows)
+
+    def columnCount(self, parentIndex=QModelIndex()):
+        return 0 if parentIndex.isValid() else len(self.columnTitles)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.columnTitles[section]
+
+        return None
+
+    def data(self, modelIndex, role=Qt.ItemDataRole.DisplayRole):
+        mediaName, newMediaBaseName, targetDirectory, collisionReason = self.planRows[modelIndex.row()]
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return [mediaName, newMediaBaseName, path.relpath(targetDirectory, self.mediaRootDirectory), collisionReasons[collisionReason] if collisionReason is not None else "Rename"][modelIndex.column()]
+        if role == Qt.ItemDataRole.ForegroundRole and collisionReason is not None:
+            return QColor("#FF5555")
+
+        return None
+
+class RenamePlanDialog(QDialog):
+    # Dry run of a rename job: every media with its new name and event directory, nothing has moved yet. Accepting applies exactly this plan
+    def __init__(self, renamePlan, mediaRootDirectory, parentWidget=None):
+        super().__init__(parentWidget)
+        self.renamePlan = renamePlan
+        self.setWindowTitle("Rename Plan")
+        self.resize(900, 500)
+        self.dialogLayout = QVBoxLayout(self)
+        planSummary = f"{len(renamePlan.plannedMedia)} media will be renamed into {len({renamePlan.mediaDestinations[mediaName] for mediaName, _, _, _ in renamePlan.plannedMedia})} event directories (planned in {renamePlan.planSeconds * 1000:.1f} ms)."
+
+        if renamePlan.collidingMedia:
+            planSummary += f"\n{len(renamePlan.collidingMedia)} new names are already taken in their event directory; those media stay in the media location."
+        if renamePlan.skippedMedia:
+            planSummary += f"\n{len(renamePlan.skippedMedia)} duplicates are skipped."
+
+        self.dialogLayout.addWidget(QLabel(planSummary))
+
+        self.planTable = QTableView()
+        self.planModel = RenamePlanModel(renamePlan, mediaRootDirectory)
+        self.planTable.setModel(self.planModel)
+        self.planTable.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
+        self.planTable.verticalHeader().hide()
+        self.dialogLayout.addWidget(self.planTable)
+
+        self.planFooterLayout = QHBoxLayout()
+        self.exportButton = QPushButton("Export...")
+        self.exportButton.clicked.connect(self.exportPlan)
+        self.planFooterLayout.addWidget(self.exportButton)
+        self.planFooterLayout.addStretch()
+        self.dialogButtons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        self.dialogButtons.button(QDialogButtonBox.StandardButton.Ok).setText("Rename Media")
+        self.dialogButtons.button(QDialogButtonBox.StandardButton.Ok).setEnabled(bool(renamePlan.plannedMedia))
+        self.dialogButtons.accepted.connect(self.accept)
+        self.dialogButtons.rejected.connect(self.reject)
+        self.planFooterLayout.addWidget(self.dialogButtons)
+        self.dialogLayout.addLayout(self.planFooterLayout)
+
+    def exportPlan(self):
+        exportPath, _ = QFileDialog.getSaveFileName(self, "Export Rename Plan", path.join(path.expanduser("~"), "rename_plan.csv"), "CSV (*.csv);;JSON (*.json)")
+
+        if not exportPath:
+            return
+
+        try:
+            exportRenamePlan(self.renamePlan, exportPath)
+        except OSError as ose:
+            QMessageBox.warning(self, "Operation Failed!", f"Could not export the rename plan: {ose}")
@@ -0,0 +1,121 @@
+import time
+from datetime import datetime
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QSlider, QCheckBox, QSpinBox, QTableWidget, QTableWidgetItem, QDialogButtonBox, QHeaderView
+from PyQt6.QtCore import Qt
+from event_segmentation import DEFAULT_GAP_MINUTES, DEFAULT_DAY_START_HOUR, proposeEvents
+
+gapMinuteSteps = [5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 360, 480, 720] # Slider positions; fine steps where events are usually told apart
+
+class SegmentationDialog(QDialog):
+    # Proposes one event per run of media without a long pause in between, re-proposed live while the slider moves.
+    # Event names are prefilled from the library's events on the same date and can be edited; typed names survive re-segmenting
+    def __init__(self, captureTimeline, eventCatalog=None, parentWidget=None):
+        super().__init__(parentWidget)
+        self.captureTimeline = captureTimeline
+        self.eventCatalog = eventCatalog
+        self.eventProposals = []
+        self.typedEventNames = {} # (event date, n-th event on that date) -> name the user typed
+        self.setWindowTitle("Split Into Events")
+        self.resize(900, 500)
+        self.dialogLayout = QVBoxLayout(self)
+        self.dialogLayout.addWidget(QLabel(f"{len(captureTimeline)} media are split wherever nothing was shot for longer than the pause below. Events without a name stay in the media location."))
+
+        self.settingsLayout = QHBoxLayout()
+        self.settingsLayout.addWidget(QLabel("Pause:"))
+        self.gapSlider = QSlider(Qt.Orientation.Horizontal)
+        self.gapSlider.setRange(0, len(gapMinuteSteps) - 1)
+        self.gapSlider.setValue(gapMinuteSteps.index(DEFAULT_GAP_MINUTES))
+        self.gapSlider.valueChanged.connect(self.segmentMedia)
+        self.settingsLayout.addWidget(self.gapSlider, 1)
+        self.gapLabel = QLabel()
+        self.gapLabel.setMinimumWidth(60)
+        self.settingsLayout.addWidget(self.gapLabel)
+        self.dayCheckBox = QCheckBox("New event every day, starting at")
+        self.dayCheckBox.setChecked(True)
+        self.dayCheckBox.toggled.connect(self.segmentMedia)
+        self.settingsLayout.addWidget(self.dayCheckBox)
+        self.dayStartSpinBox = QSpinBox()
+        self.dayStartSpinBox.setRange(0, 12)
+        self.dayStartSpinBox.setSuffix(":00")
+        self.dayStartSpinBox.setValue(DEFAULT_DAY_START_HOUR)
+        self.dayStartSpinBox.valueChanged.connect(self.segmentMedia)
+        self.settingsLayout.addWidget(self.dayStartSpinBox)
+        self.dialogLayout.addLayout(self.settingsLayout)
+
+        self.eventTable = QTableWidget(0, 5)
+        self.eventTable.setHorizontalHeaderLabels(["Date", "Event Name", "Media", "Shot Between", "First Media"])
+        self.eventTable.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.eventTable.verticalHeader().hide()
+        self.eventTable.itemChanged.connect(self.eventNameChanged)
+        self.dialogLayout.addWidget(self.eventTable)
+
+        self.summaryLabel = QLabel()
+        self.dialogLayout.addWidget(self.summaryLabel)
+        self.dialogButtons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        self.dialogButtons.button(QDialogButtonBox.StandardButton.Ok).setText("Rename Media")
+        self.dialogButtons.accepted.connect(self.accept)
+        self.dialogButtons.rejected.connect(self.reject)
+        self.dialogLayout.addWidget(self.dialogButtons)
+        self.segmentMedia()
+
+    def getGapMinutes(self):
+        return gapMinuteSteps[self.gapSlider.value()]
+
+    def getDayStartHour(self):
+        return self.dayStartSpinBox.value()
+
+    def segmentMedia(self):
+        startTime = time.perf_counter()
+        gapMinutes = self.getGapMinutes()
+        self.gapLabel.setText(f"{gapMinutes} min" if gapMinutes < 60 else f"{gapMinutes / 60:g} h")
+        self.dayStartSpinBox.setEnabled(self.dayCheckBox.isChecked())
+        eventSegments = self.captureTimeline.segment(gapMinutes, self.dayCheckBox.isChecked(), self.getDayStartHour())
+        self.eventProposals = proposeEvents(self.captureTimeline, eventSegments, self.eventCatalog, self.getDayStartHour())
+        proposalsByDate = {}
+
+        # Typed names stick to the n-th event of their date, so nudging the slider doesn't wipe them
+        for eventProposal in self.eventProposals:
+            dateProposalNumber = proposalsByDate.get(eventProposal.eventDate, 0)
+            eventProposal.eventName = self.typedEventNames.get((eventProposal.eventDate, dateProposalNumber), eventProposal.eventName)
+            proposalsByDate[eventProposal.eventDate] = dateProposalNumber + 1
+
+        self.showEventProposals()
+        self.summaryLabel.setText(f"{len(self.eventProposals)} events  •  segmented in {(time.perf_counter() - startTime) * 1000:.1f} ms")
+
+    def showEventProposals(self):
+        self.eventTable.blockSignals(True) # Filling in the names is not the user typing them
+        self.eventTable.setRowCount(len(self.eventProposals))
+
+        for proposalRow, eventProposal in enumerate(self.eventProposals):
+            eventYear, eventMonth, eventDay = eventProposal.eventDate
+            firstCaptureTime = datetime.fromtimestamp(self.captureTimeline.captureTimes[eventProposal.firstRow])
+            lastCaptureTime = datetime.fromtimestamp(self.captureTimeline.captureTimes[eventProposal.endRow - 1])
+            rowItems = [
+                QTableWidgetItem(f"{eventYear:04d}-{eventMonth:02d}-{eventDay:02d}"),
+                QTableWidgetItem(eventProposal.eventName),
+                QTableWidgetItem(str(eventProposal.getMediaCount())),
+                QTableWidgetItem(f"{firstCaptureTime:%a %H:%M} - {lastCaptureTime:%a %H:%M}"),
+                QTableWidgetItem(self.captureTimeline.mediaNames[eventProposal.firstRow])
+            ]
+
+            for columnNumber, rowItem in enumerate(rowItems):
+                if columnNumber != 1: # Only the event name is editable
+                    rowItem.setFlags(rowItem.flags() & ~Qt.ItemFlag.ItemIsEditable)
+
+                self.eventTable.setItem(proposalRow, columnNumber, rowItem)
+
+        self.eventTable.blockSignals(False)
+        self.eventTable.resizeColumnToContents(0)
+        self.eventTable.resizeColumnToContents(3)
+
+    def eventNameChanged(self, tableItem):
+        if tableItem.column() != 1:
+            return
+
+        eventProposal = self.eventProposals[tableItem.row()]
+        eventProposal.eventName = tableItem.text()
+        dateProposalNumber = [otherProposal.eventDate for otherProposal in self.eventProposals[:tableItem.row()]].count(eventProposal.eventDate)
+        self.typedEventNames[(eventProposal.eventDate, dateProposalNumber)] = tableItem.text()
+
+    def getEventProposals(self):
+        return self.eventProposals
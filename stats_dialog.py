@@ -0,0 +1,163 @@
+from os import path
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QCheckBox, QPushButton, QTableView, QHeaderView, QFileDialog, QMessageBox
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QAbstractTableModel, QModelIndex, pyqtSignal
+from library_stats import statGroupings, getLibraryStats, exportLibraryStats
+from duplicate_dialog import getReadableSize
+
+class LibraryStatsSignals(QObject):
+    loaded = pyqtSignal(object) # library_stats.LibraryStats, emitted once from the persisted index and once revalidated
+    failed = pyqtSignal(str)
+
+class LibraryStatsTask(QRunnable):
+    # Sums what the index already knows first (instant), then revalidates changed subtrees and sums again
+    def __init__(self, mediaIndex):
+        super().__init__()
+        self.signals = LibraryStatsSignals()
+        self.mediaIndex = mediaIndex
+
+    def run(self):
+        try:
+            self.signals.loaded.emit(getLibraryStats(self.mediaIndex, revalidate=False))
+            self.signals.loaded.emit(getLibraryStats(self.mediaIndex))
+        except Exception as e: # General error catching, reported back to the GUI thread
+            self.signals.failed.emit(str(e))
+
+class LibraryStatsModel(QAbstractTableModel):
+    columnTitles = ["Name", "Media", "Images", "Videos", "Size"]
+
+    # Gets executed upon creating an instance of the class
+    def __init__(self):
+        super().__init__()
+        self.statRows = [] # (name, media, videos, bytes)
+
+    def setStatRows(self, statRows):
+        self.beginResetModel()
+        self.statRows = list(statRows)
+        self.endResetModel()
+
+    def rowCount(self, parentIndex=QModelIndex()):
+        return 0 if parentIndex.isValid() else len(self.statRows)
+
+    def columnCount(self, parentIndex=QModelIndex()):
+        return 0 if parentIndex.isValid() else len(self.columnTitles)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.columnTitles[section]
+
+        return None
+
+    def data(self, modelIndex, role=Qt.ItemDataRole.DisplayRole):
+        statName, mediaCount, videoCount, mediaBytes = self.statRows[modelIndex.row()]
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return [statName, f"{mediaCount:,}", f"{mediaCount - videoCount:,}", f"{videoCount:,}", getReadableSize(mediaBytes)][modelIndex.column()]
+        if role == Qt.ItemDataRole.TextAlignmentRole and modelIndex.column() > 0:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        # Sorts by the numbers behind the column, not by their formatted text
+        self.beginResetModel()
+        self.statRows.sort(key=lambda statRow: [statRow[0], statRow[1], statRow[1] - statRow[2], statRow[2], statRow[3]][column], reverse=order == Qt.SortOrder.DescendingOrder)
+        self.endResetModel()
+
+class LibraryStatsDialog(QDialog):
+    # Files, videos and bytes of the whole library per year, month, event and media code. Shows the persisted numbers right
+    # away, then the revalidated ones once directories that changed outside the app were rescanned
+    def __init__(self, mediaIndex, parentWidget=None):
+        super().__init__(parentWidget)
+        self.mediaIndex = mediaIndex
+        self.libraryStats = None
+        self.statsTask = None
+        self.setWindowTitle(f"Library Statistics - {mediaIndex.mediaRootDirectory}")
+        self.resize(700, 550)
+        self.dialogLayout = QVBoxLayout(self)
+        self.summaryLabel = QLabel()
+        self.dialogLayout.addWidget(self.summaryLabel)
+
+        self.settingsLayout = QHBoxLayout()
+        self.settingsLayout.addWidget(QLabel("Group by:"))
+        self.groupingComboBox = QComboBox()
+
+        for statGrouping, groupingTitle in statGroupings.items():
+            self.groupingComboBox.addItem(groupingTitle, statGrouping)
+
+        self.groupingComboBox.setCurrentIndex(2) # Events, the question asked most
+        self.groupingComboBox.currentIndexChanged.connect(self.showStatRows)
+        self.settingsLayout.addWidget(self.groupingComboBox)
+        self.videosCheckBox = QCheckBox("Only with videos")
+        self.videosCheckBox.toggled.connect(self.showStatRows)
+        self.settingsLayout.addWidget(self.videosCheckBox)
+        self.settingsLayout.addStretch()
+        self.dialogLayout.addLayout(self.settingsLayout)
+
+        self.statsTable = QTableView()
+        self.statsModel = LibraryStatsModel()
+        self.statsTable.setModel(self.statsModel)
+        self.statsTable.setSortingEnabled(True)
+        self.statsTable.sortByColumn(0, Qt.SortOrder.AscendingOrder)
+        self.statsTable.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.statsTable.verticalHeader().hide()
+        self.dialogLayout.addWidget(self.statsTable)
+
+        self.footerLayout = QHBoxLayout()
+        self.statusLabel = QLabel()
+        self.footerLayout.addWidget(self.statusLabel, 1)
+        self.exportButton = QPushButton("Export...")
+        self.exportButton.setEnabled(False)
+        self.exportButton.clicked.connect(self.exportStats)
+        self.footerLayout.addWidget(self.exportButton)
+        self.closeButton = QPushButton("Close")
+        self.closeButton.clicked.connect(self.close)
+        self.footerLayout.addWidget(self.closeButton)
+        self.dialogLayout.addLayout(self.footerLayout)
+
+    def loadStats(self):
+        if self.statsTask is not None: # Still revalidating, that run picks up the latest changes too
+            return
+
+        self.statsTask = LibraryStatsTask(self.mediaIndex)
+        self.statsTask.signals.loaded.connect(self.statsLoaded)
+        self.statsTask.signals.failed.connect(self.statsFailed)
+        self.statusLabel.setText("Checking for changes made outside the app...")
+        QThreadPool.globalInstance().start(self.statsTask)
+
+    def statsLoaded(self, libraryStats):
+        self.libraryStats = libraryStats
+        self.exportButton.setEnabled(True)
+        self.summaryLabel.setText(f"{libraryStats.mediaCount:,} media ({libraryStats.mediaCount - libraryStats.videoCount:,} images, {libraryStats.videoCount:,} videos)  •  {getReadableSize(libraryStats.mediaBytes)}  •  {libraryStats.eventCount:,} events")
+
+        if libraryStats.isRevalidated:
+            self.statsTask = None
+            self.statusLabel.setText(f"Up to date  •  {libraryStats.directoryCount:,} directories summed in {libraryStats.sumSeconds * 1000:.1f} ms")
+
+        self.showStatRows()
+
+    def statsFailed(self, errorMessage):
+        self.statsTask = None
+        self.statusLabel.setText(f"Could not read the library: {errorMessage}")
+
+    def showStatRows(self):
+        if self.libraryStats is None:
+            return
+
+        statRows = self.libraryStats.getRows(self.groupingComboBox.currentData())
+
+        if self.videosCheckBox.isChecked():
+            statRows = [statRow for statRow in statRows if statRow[2] > 0]
+
+        self.statsModel.setStatRows(statRows)
+        self.statsModel.sort(self.statsTable.horizontalHeader().sortIndicatorSection(), self.statsTable.horizontalHeader().sortIndicatorOrder()) # Keeps the order the user clicked
+
+    def exportStats(self):
+        exportPath, _ = QFileDialog.getSaveFileName(self, "Export Library Statistics", path.join(path.expanduser("~"), "library_stats.json"), "JSON (*.json)")
+
+        if not exportPath:
+            return
+
+        try:
+            exportLibraryStats(self.libraryStats, exportPath)
+        except OSError as ose:
+            QMessageBox.warning(self, "Operation Failed!", f"Could not export the library statistics: {ose}")
@@ -0,0 +1,59 @@
+import os
+import struct
+import sys
+import tempfile
+import unittest
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__)))) # Repository root, the tests import the app's own modules
+from capture_time import MetadataCache, readCaptureTime, readVideoInfo
+
+# Truncated and corrupted MP4/MOV and HEIC headers read as "no capture time", so the media falls back to its modification time
+#
+#   python -m unittest discover tests
+
+def createBox(boxType, boxPayload=b""):
+    return struct.pack(">I4s", 8 + len(boxPayload), boxType) + boxPayload
+
+class CaptureTimeTest(unittest.TestCase):
+    def setUp(self):
+        self.temporaryDirectory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temporaryDirectory.cleanup()
+
+    def writeMedia(self, mediaName, mediaContent):
+        mediaPath = path.join(self.temporaryDirectory.name, mediaName)
+
+        with open(mediaPath, "wb") as mediaFile:
+            mediaFile.write(mediaContent)
+
+        return mediaPath
+
+    def testTruncatedMoovBox(self):
+        mediaPath = self.writeMedia("CLIP_1.mp4", createBox(b"ftyp", b"isom\x00\x00\x00\x00") + createBox(b"moov", createBox(b"mvhd"))) # mvhd ends right after its header
+
+        self.assertIsNone(readCaptureTime(mediaPath))
+        self.assertIsNone(readVideoInfo(mediaPath))
+
+    def testTruncatedTrackHeader(self):
+        mediaPath = self.writeMedia("CLIP_2.mov", createBox(b"ftyp", b"qt  \x00\x00\x00\x00") + createBox(b"moov", createBox(b"trak", createBox(b"tkhd"))))
+
+        self.assertIsNone(readVideoInfo(mediaPath))
+
+    def testTruncatedMetaBox(self):
+        mediaPath = self.writeMedia("IMG_1.heic", createBox(b"ftyp", b"heic\x00\x00\x00\x00") + createBox(b"meta", b"\x00\x00\x00\x00" + createBox(b"iinf"))) # iinf without version/flags
+
+        self.assertIsNone(readCaptureTime(mediaPath))
+
+    def testCacheReadsCorruptedMediaAsNoCaptureTime(self):
+        mediaPaths = [
+            self.writeMedia("CLIP_1.mp4", createBox(b"ftyp", b"isom\x00\x00\x00\x00") + createBox(b"moov", createBox(b"mvhd"))),
+            self.writeMedia("IMG_1.heic", createBox(b"ftyp", b"heic\x00\x00\x00\x00") + createBox(b"meta", b"\x00\x00\x00\x00" + createBox(b"iinf")))
+        ]
+        metadataCache = MetadataCache(path.join(self.temporaryDirectory.name, "cache"))
+
+        self.assertEqual(metadataCache.getCaptureTimes([(mediaPath, os.stat(mediaPath)) for mediaPath in mediaPaths]), dict.fromkeys(mediaPaths))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from os import path
+from unittest import mock
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__)))) # Repository root, the tests import the app's own modules
+from organizer_core import OrganizeJob, getMediaIndex
+from rename_journal import getJournalPaths, getResumableJournals, getUndoableJournal, undoRenameJournal
+
+# Crash, cancel, resume and undo of journaled rename jobs against real files in a temporary media location and media root destination
+#
+#   python -m unittest discover tests
+
+MEDIA_CODE = "TEST"
+
+class InterruptedJob(BaseException):
+    # Stands in for a crash: not an Exception, so the job's per-media error handling can't swallow it
+    pass
+
+class RenameJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.temporaryDirectory = tempfile.TemporaryDirectory()
+        self.mediaLocationDirectory = path.join(self.temporaryDirectory.name, "card")
+        self.mediaRootDirectory = path.join(self.temporaryDirectory.name, "library")
+        self.eventDirectory = f"{self.mediaRootDirectory}/2024/May/2024-05-01: Party"
+        os.makedirs(self.mediaLocationDirectory)
+        os.makedirs(self.mediaRootDirectory)
+
+        for mediaNumber in range(1, 5): # IMG_1 is the oldest, so it becomes TEST_1
+            mediaPath = path.join(self.mediaLocationDirectory, f"IMG_{mediaNumber}.jpg")
+
+            with open(mediaPath, "w") as mediaFile:
+                mediaFile.write(f"card media {mediaNumber}")
+
+            os.utime(mediaPath, ns=(1714550400_000_000_000 + mediaNumber * 60_000_000_000,) * 2)
+
+    def tearDown(self):
+        self.temporaryDirectory.cleanup()
+
+    def createJob(self):
+        return OrganizeJob(self.mediaLocationDirectory, self.eventDirectory, MEDIA_CODE, getMediaIndex(self.mediaRootDirectory))
+
+    def runJob(self, stopAfter=None, stopWith="cancel"):
+        # Runs a whole job, or stops it after stopAfter media by cancelling it or by "crashing" it
+        organizeJob = self.createJob()
+        organizeJob.onLog = lambda logLines: None
+
+        def mediaRenamed(mediaName, newMediaBaseName):
+            if stopAfter is not None and len(organizeJob.renamedMedia) >= stopAfter:
+                if stopWith == "crash":
+                    raise InterruptedJob()
+
+                organizeJob.cancelEvent.set()
+
+        organizeJob.onMediaRenamed = mediaRenamed
+
+        try:
+            return organizeJob.run()
+        except InterruptedJob:
+            return None
+
+    def resumeJob(self):
+        resumableJournals = getResumableJournals(self.mediaRootDirectory)
+        self.assertEqual(len(resumableJournals), 1)
+        organizeJob = OrganizeJob(self.mediaLocationDirectory, self.eventDirectory, MEDIA_CODE, getMediaIndex(self.mediaRootDirectory))
+        organizeJob.onLog = lambda logLines: None
+
+        return organizeJob.resume(resumableJournals[0])
+
+    def readMedia(self, mediaDirectory):
+        mediaContents = {}
+
+        for mediaName in os.listdir(mediaDirectory):
+            with open(path.join(mediaDirectory, mediaName)) as mediaFile:
+                mediaContents[mediaName] = mediaFile.read()
+
+        return mediaContents
+
+    def writeOtherMedia(self, mediaName, mediaContent, mtimeOf=None):
+        with open(path.join(self.eventDirectory, mediaName), "w") as mediaFile:
+            mediaFile.write(mediaContent)
+
+        if mtimeOf is not None: # Worst case, size and mtime both match the card media's
+            os.utime(path.join(self.eventDirectory, mediaName), ns=(os.stat(mtimeOf).st_mtime_ns,) * 2)
+
+    def testCrashedJobResumes(self):
+        self.runJob(stopAfter=2, stopWith="crash")
+        self.assertEqual(getResumableJournals(self.mediaRootDirectory)[0].state, "interrupted")
+        organizeResult = self.resumeJob()
+
+        self.assertEqual(organizeResult["failed"], [])
+        self.assertEqual(os.listdir(self.mediaLocationDirectory), [])
+        self.assertEqual(self.readMedia(self.eventDirectory), {f"{MEDIA_CODE}_{mediaNumber}.jpg": f"card media {mediaNumber}" for mediaNumber in range(1, 5)})
+        self.assertEqual(getResumableJournals(self.mediaRootDirectory), [])
+
+    def testLostMarkersAreRecoveredFromTheFileSystem(self):
+        self.runJob(stopAfter=2, stopWith="crash")
+        journalPath = getResumableJournals(self.mediaRootDirectory)[0].journalPath
+
+        with open(journalPath) as journalFile:
+            journalLines = [journalLine for journalLine in journalFile if "done" not in json.loads(journalLine)]
+
+        with open(journalPath, "w") as journalFile: # The crash hit before the last group of markers was synced
+            journalFile.writelines(journalLines)
+
+        organizeResult = self.resumeJob()
+
+        self.assertEqual(len(organizeResult["renamed"]), 2) # The two moved media are marked, not moved again
+        self.assertEqual(self.readMedia(self.eventDirectory), {f"{MEDIA_CODE}_{mediaNumber}.jpg": f"card media {mediaNumber}" for mediaNumber in range(1, 5)})
+
+    def testCompleteCopyOnlyLosesItsSource(self):
+        self.runJob(stopAfter=2, stopWith="crash")
+        shutil.copy2(path.join(self.mediaLocationDirectory, "IMG_3.jpg"), f"{self.eventDirectory}/{MEDIA_CODE}_3.jpg") # Cross-device copy was swapped in, removing the source was left
+        organizeResult = self.resumeJob()
+
+        self.assertEqual([renamedItem["from"] for renamedItem in organizeResult["renamed"]], ["IMG_4.jpg"])
+        self.assertEqual(os.listdir(self.mediaLocationDirectory), [])
+        self.assertEqual(self.readMedia(self.eventDirectory)[f"{MEDIA_CODE}_3.jpg"], "card media 3")
+
+    def testCancelledJobResumesAroundOtherJobsMedia(self):
+        self.runJob(stopAfter=2)
+        self.assertEqual(getResumableJournals(self.mediaRootDirectory)[0].state, "cancelled")
+
+        # Another job got the cancelled job's remaining names: one of the same size as the original, one of another size
+        self.writeOtherMedia(f"{MEDIA_CODE}_3.jpg", "next media 3", path.join(self.mediaLocationDirectory, "IMG_3.jpg"))
+        self.writeOtherMedia(f"{MEDIA_CODE}_4.jpg", "other job's longer media 4")
+        organizeResult = self.resumeJob()
+
+        self.assertEqual(sorted(failedItem["media"] for failedItem in organizeResult["failed"]), ["IMG_3.jpg", "IMG_4.jpg"])
+        self.assertEqual(self.readMedia(self.mediaLocationDirectory), {"IMG_3.jpg": "card media 3", "IMG_4.jpg": "card media 4"})
+        self.assertEqual(self.readMedia(self.eventDirectory), {
+            f"{MEDIA_CODE}_1.jpg": "card media 1",
+            f"{MEDIA_CODE}_2.jpg": "card media 2",
+            f"{MEDIA_CODE}_3.jpg": "next media 3",
+            f"{MEDIA_CODE}_4.jpg": "other job's longer media 4"
+        })
+
+    def testOtherJobsAreNumberedPastCancelledJobs(self):
+        self.runJob(stopAfter=2)
+        otherMediaLocationDirectory = path.join(self.temporaryDirectory.name, "other card")
+        os.makedirs(otherMediaLocationDirectory)
+
+        with open(path.join(otherMediaLocationDirectory, "DSC_1.jpg"), "w") as mediaFile:
+            mediaFile.write("other card media 1")
+
+        otherJob = OrganizeJob(otherMediaLocationDirectory, self.eventDirectory, MEDIA_CODE, getMediaIndex(self.mediaRootDirectory))
+        otherJob.onLog = lambda logLines: None
+        self.assertEqual([renamedItem["to"] for renamedItem in otherJob.run()["renamed"]], [f"{MEDIA_CODE}_5.jpg"]) # 3 and 4 still belong to the cancelled job
+        organizeResult = self.resumeJob()
+
+        self.assertEqual(organizeResult["failed"], [])
+        self.assertEqual(sorted(self.readMedia(self.eventDirectory)), [f"{MEDIA_CODE}_{mediaNumber}.jpg" for mediaNumber in range(1, 6)])
+
+    def testResumeNeverReplacesTargetsTakenWhileResuming(self):
+        self.runJob(stopAfter=2)
+        resumableJournal = getResumableJournals(self.mediaRootDirectory)[0]
+        organizeJob = self.createJob()
+        organizeJob.onLog = lambda logLines: None
+        getPendingRows = resumableJournal.getPendingRows
+
+        def takeTargetAfterChecking():
+            pendingRows = getPendingRows()
+            self.writeOtherMedia(f"{MEDIA_CODE}_3.jpg", "taken after the check")
+            return pendingRows
+
+        resumableJournal.getPendingRows = takeTargetAfterChecking
+        organizeResult = organizeJob.resume(resumableJournal)
+
+        self.assertEqual([failedItem["media"] for failedItem in organizeResult["failed"]], ["IMG_3.jpg"])
+        self.assertEqual(self.readMedia(self.eventDirectory)[f"{MEDIA_CODE}_3.jpg"], "taken after the check")
+        self.assertEqual(self.readMedia(self.mediaLocationDirectory), {"IMG_3.jpg": "card media 3"})
+
+    def testUndoRestoresOriginalNames(self):
+        self.runJob()
+        self.assertEqual(os.listdir(self.mediaLocationDirectory), [])
+        failedMedia = undoRenameJournal(getUndoableJournal(self.mediaRootDirectory), onLog=lambda logLine: None)
+
+        self.assertEqual(failedMedia, [])
+        self.assertEqual(self.readMedia(self.mediaLocationDirectory), {f"IMG_{mediaNumber}.jpg": f"card media {mediaNumber}" for mediaNumber in range(1, 5)})
+        self.assertFalse(path.exists(f"{self.mediaRootDirectory}/2024")) # Event, Month and Year directories the job created are gone again
+        self.assertIsNone(getUndoableJournal(self.mediaRootDirectory))
+
+    def testUndoOfCancelledJobLeavesOtherJobsMedia(self):
+        self.runJob(stopAfter=2)
+        self.writeOtherMedia(f"{MEDIA_CODE}_3.jpg", "next media 3", path.join(self.mediaLocationDirectory, "IMG_3.jpg"))
+        failedMedia = undoRenameJournal(getUndoableJournal(self.mediaRootDirectory), onLog=lambda logLine: None)
+
+        self.assertEqual(failedMedia, [])
+        self.assertEqual(self.readMedia(self.mediaLocationDirectory), {f"IMG_{mediaNumber}.jpg": f"card media {mediaNumber}" for mediaNumber in range(1, 5)})
+        self.assertEqual(self.readMedia(self.eventDirectory), {f"{MEDIA_CODE}_3.jpg": "next media 3"})
+
+    def testUndoNeverReplacesMediaThatTookTheOriginalName(self):
+        self.runJob()
+
+        with open(path.join(self.mediaLocationDirectory, "IMG_1.jpg"), "w") as mediaFile: # The card was used again
+            mediaFile.write("new card media 1")
+
+        failedMedia = undoRenameJournal(getUndoableJournal(self.mediaRootDirectory), onLog=lambda logLine: None)
+
+        self.assertEqual([failedItem[0] for failedItem in failedMedia], [f"{MEDIA_CODE}_1.jpg"])
+        self.assertEqual(self.readMedia(self.mediaLocationDirectory)["IMG_1.jpg"], "new card media 1")
+        self.assertEqual(self.readMedia(self.eventDirectory), {f"{MEDIA_CODE}_1.jpg": "card media 1"})
+
+    def testOnlyTheNewestClosedJournalsAreKept(self):
+        self.runJob(stopAfter=2) # Cancelled, kept until it's resumed or abandoned
+        cancelledJournalPath = getResumableJournals(self.mediaRootDirectory)[0].journalPath
+        otherMediaLocationDirectory = path.join(self.temporaryDirectory.name, "other card")
+        os.makedirs(otherMediaLocationDirectory)
+
+        with mock.patch("rename_journal.MAX_CLOSED_JOURNALS", 1):
+            for mediaNumber in range(1, 4):
+                with open(path.join(otherMediaLocationDirectory, f"DSC_{mediaNumber}.jpg"), "w") as mediaFile:
+                    mediaFile.write(f"other card media {mediaNumber}")
+
+                otherJob = OrganizeJob(otherMediaLocationDirectory, self.eventDirectory, MEDIA_CODE, getMediaIndex(self.mediaRootDirectory))
+                otherJob.onLog = lambda logLines: None
+                otherJob.run()
+
+        journalPaths = getJournalPaths(self.mediaRootDirectory)
+        self.assertEqual(len(journalPaths), 3) # The first finished job's journal went once the third one was written
+        self.assertIn(cancelledJournalPath, journalPaths)
+        self.assertEqual(getUndoableJournal(self.mediaRootDirectory).plannedMedia[0][1], f"{otherMediaLocationDirectory}/DSC_3.jpg")
+        self.assertEqual(getResumableJournals(self.mediaRootDirectory)[0].journalPath, cancelledJournalPath)
+
+if __name__ == "__main__":
+    unittest.main()
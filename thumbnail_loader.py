@@ -0,0 +1,255 @@
+import os
+from collections import OrderedDict, deque
+from PyQt6.QtGui import QImage, QImageReader, QTransform
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from utils import getResourcePath
+from capture_time import readExifThumbnail
+from preview_loader import heifImageFormats, decodeHeifImage
+from video_poster import getVideoPosterPath, getVideoInfo, drawVideoCard
+from media_snapshot import getMediaKind, MEDIA_KIND_VIDEO
+from decode_service import THUMBNAIL_TIMEOUT_SECONDS, BATCH_TIMEOUT_SECONDS
+from instrumentation import tracedPhase, traceCount
+
+THUMBNAIL_DIMENSION = 160 # Longest side of a contact sheet cell's image, the size cameras embed in the Exif segment too
+THUMBNAIL_BATCH_SIZE = 12 # Thumbnails per background task and per repaint of the contact sheet
+MEMORY_CACHE_BYTES = 96 * 1024 * 1024 # Roughly 1,000 thumbnails; scrolling far away evicts the least recently painted ones
+
+exifOrientationTransforms = {
+    # EXIF orientation -> (mirror horizontally first, then rotate clockwise by)
+    2: (True, 0),
+    3: (False, 180),
+    4: (True, 180),
+    5: (True, 270),
+    6: (False, 90),
+    7: (True, 90),
+    8: (False, 270)
+}
+
+def applyExifOrientation(mediaImage, exifOrientation):
+    mirrorFirst, rotationDegrees = exifOrientationTransforms.get(exifOrientation, (False, 0))
+
+    if mirrorFirst:
+        mediaImage = mediaImage.transformed(QTransform().scale(-1, 1))
+
+    if rotationDegrees:
+        mediaImage = mediaImage.transformed(QTransform().rotate(rotationDegrees))
+
+    return mediaImage
+
+def decodeHeifThumbnail(mediaPath):
+    # HEIC/HEIF files from phones carry a small thumbnail item next to the main image; only that one gets decoded if it's there.
+    # pillow-heif only decodes thumbnail items since HeifImage.get_thumbnail() exists (not in 0.17), older ones return None like a file without one
+    import pillow_heif
+
+    heifFile = pillow_heif.open_heif(mediaPath, convert_hdr_to_8bit=True)
+    heifImage = heifFile[getattr(heifFile, "primary_index", 0)]
+
+    if not heifImage.info.get("thumbnails") or not hasattr(heifImage, "get_thumbnail"):
+        return None
+
+    heifThumbnail = heifImage.get_thumbnail(0)
+    heifPixels = heifThumbnail.data
+
+    return QImage(heifPixels, heifThumbnail.size[0], heifThumbnail.size[1], heifThumbnail.stride, heifImageFormats[(heifThumbnail.mode, False)]).copy() # Detaches from libheif's buffer
+
+def decodeScaledThumbnail(mediaPath):
+    # JPEG decodes straight to 1/8 size inside libjpeg, so even originals without an embedded thumbnail are cheap
+    imageReader = QImageReader(mediaPath)
+    imageReader.setAutoTransform(True)
+    originalSize = imageReader.size()
+
+    if originalSize.isValid() and max(originalSize.width(), originalSize.height()) > THUMBNAIL_DIMENSION:
+        imageReader.setScaledSize(originalSize.scaled(THUMBNAIL_DIMENSION, THUMBNAIL_DIMENSION, Qt.AspectRatioMode.KeepAspectRatio))
+
+    return imageReader.read()
+
+# QImage instead of QPixmap because decoding happens in decoder processes and on worker threads, and QPixmap may only be touched on the GUI thread
+def decodeThumbnail(mediaPath, cachedPreviewPath, supportedImageFormats):
+    # Cheapest source first: the Exif thumbnail (a few KB read), the HEIC thumbnail item, a cached preview, and only then the original.
+    # The preview cache is looked up by the app beforehand, decoder processes don't share its bookkeeping
+    ext = os.path.splitext(mediaPath)[1].lower()
+    mediaImage = None
+
+    if ext not in supportedImageFormats:
+        return None
+
+    try:
+        if ext in (".jpg", ".jpeg"):
+            exifThumbnail = readExifThumbnail(mediaPath)
+
+            if exifThumbnail is not None:
+                mediaImage = applyExifOrientation(QImage.fromData(exifThumbnail[0], "JPG"), exifThumbnail[1])
+        elif ext in (".heic", ".heif"):
+            mediaImage = decodeHeifThumbnail(mediaPath)
+
+        if mediaImage is None or mediaImage.isNull():
+            mediaImage = decodeScaledThumbnail(cachedPreviewPath) if cachedPreviewPath is not None else None
+
+        if (mediaImage is None or mediaImage.isNull()) and ext not in (".heic", ".heif"):
+            mediaImage = decodeScaledThumbnail(mediaPath)
+        elif mediaImage is None or mediaImage.isNull(): # HEIC without a thumbnail item or cached preview, the full decode can't be avoided
+            mediaImage = decodeHeifImage(mediaPath)
+    except Exception as e: # General error catching, one broken file only leaves its cell empty
+        print(f"Could not create thumbnail of {mediaPath}: {e}")
+        return None
+
+    if mediaImage.isNull():
+        return None
+
+    if max(mediaImage.width(), mediaImage.height()) > THUMBNAIL_DIMENSION:
+        mediaImage = mediaImage.scaled(THUMBNAIL_DIMENSION, THUMBNAIL_DIMENSION, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+    return mediaImage
+
+def getVideoThumbnail(mediaPath, previewCache):
+    # The cached poster frame scaled down, extracted first if this video was never previewed; the header-only card without one
+    try:
+        cachedPosterPath = getVideoPosterPath(mediaPath, previewCache)
+        mediaImage = decodeScaledThumbnail(cachedPosterPath) if cachedPosterPath is not None else QImage()
+
+        if mediaImage.isNull():
+            mediaImage = drawVideoCard(getVideoInfo(mediaPath)).scaled(THUMBNAIL_DIMENSION, THUMBNAIL_DIMENSION, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+    except Exception as e: # General error catching, runs inside a whole batch's task: one broken video only leaves its cell empty
+        print(f"Could not create thumbnail of {mediaPath}: {e}")
+        return None
+
+    return mediaImage
+
+# Signals live on a separate QObject because QRunnable is not a QObject and cannot emit signals by itself
+class ThumbnailBatchSignals(QObject):
+    decoded = pyqtSignal(object, list, int) # Task, [(media path, QImage or None)], cache generation the batch was started in
+
+class ThumbnailBatchTask(QRunnable):
+    # Several thumbnails per task: one decoder process round trip, one signal and one repaint per batch instead of per cell
+    def __init__(self, mediaPaths, previewCache, supportedImageFormats, cacheGeneration, decodeService):
+        super().__init__()
+        self.mediaPaths = mediaPaths
+        self.previewCache = previewCache
+        self.supportedImageFormats = supportedImageFormats
+        self.cacheGeneration = cacheGeneration
+        self.decodeService = decodeService
+        self.signals = ThumbnailBatchSignals()
+
+    @tracedPhase
+    def run(self):
+        # Images go to a decoder process first; videos are done on this thread afterwards, ffmpeg already runs in a process of its own
+        imagePaths = [mediaPath for mediaPath in self.mediaPaths if getMediaKind(mediaPath) != MEDIA_KIND_VIDEO]
+        mediaFiles = [(mediaPath, self.previewCache.getCachedPreviewPath(mediaPath)) for mediaPath in imagePaths]
+        decodedThumbnails = self.decodeThumbnails(mediaFiles) if mediaFiles else []
+
+        if decodedThumbnails is None and len(mediaFiles) > 1: # One media of the batch hung or crashed its decoder, one by one only that one ends up without a thumbnail
+            decodedThumbnails = [(self.decodeThumbnails([mediaFile]) or [(None, None)])[0] for mediaFile in mediaFiles]
+
+        mediaThumbnails = {mediaPath: mediaImage for mediaPath, (mediaImage, _) in zip(imagePaths, decodedThumbnails or [(None, None)] * len(imagePaths))}
+
+        for mediaPath in self.mediaPaths:
+            if mediaPath not in mediaThumbnails:
+                mediaThumbnails[mediaPath] = getVideoThumbnail(mediaPath, self.previewCache)
+
+        traceCount(files=len(self.mediaPaths), videos=len(self.mediaPaths) - len(imagePaths))
+        self.signals.decoded.emit(self, [(mediaPath, mediaThumbnails[mediaPath]) for mediaPath in self.mediaPaths], self.cacheGeneration)
+
+    def decodeThumbnails(self, mediaFiles):
+        return self.decodeService.decode("thumbnails", (self.supportedImageFormats, mediaFiles), BATCH_TIMEOUT_SECONDS + THUMBNAIL_TIMEOUT_SECONDS * len(mediaFiles))
+
+class ThumbnailLoader(QObject):
+    thumbnailsReady = pyqtSignal() # A batch landed in the memory cache, the contact sheet repaints once
+
+    # Gets executed upon creating an instance of the class
+    def __init__(self, previewCache, supportedImageFormats, decodeService):
+        super().__init__()
+        self.previewCache = previewCache
+        self.supportedImageFormats = supportedImageFormats
+        self.decodeService = decodeService
+        self.thumbnailPool = QThreadPool() # Own pool, so thumbnails never wait behind (or hold up) rename jobs and preview decodes
+        self.thumbnailPool.setMaxThreadCount(max(2, decodeService.getThreadCount())) # One batch per decoder process at a time, so every core gets one
+        self.thumbnails = OrderedDict() # Media path -> QImage (None for media without a thumbnail), least recently painted first
+        self.thumbnailsBytes = 0
+        self.queuedTasks = [] # Tasks that haven't started yet, taken back when the visible cells change
+        self.pendingMediaPaths = set() # Media paths in queued or running tasks
+        self.runningTasks = [] # Started tasks, kept alive until they report back
+        self.finishedTasks = deque(maxlen=32) # Finished tasks are released a little later, their thread may still be returning from run()
+        self.cacheGeneration = 0
+        self.placeholderImage = None
+
+    def getThumbnail(self, mediaPath):
+        # Returns (is known, QImage or None); painting a cell marks its thumbnail as recently used
+        if mediaPath not in self.thumbnails:
+            return False, None
+
+        self.thumbnails.move_to_end(mediaPath)
+
+        return True, self.thumbnails[mediaPath]
+
+    def getPlaceholderImage(self):
+        if self.placeholderImage is None:
+            self.placeholderImage = QImage(getResourcePath("assets/images/no_preview.png")).scaled(THUMBNAIL_DIMENSION, THUMBNAIL_DIMENSION, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+        return self.placeholderImage
+
+    def getCapacity(self):
+        # Thumbnails that fit the memory cache, requests beyond that would evict what they just decoded
+        return MEMORY_CACHE_BYTES // (THUMBNAIL_DIMENSION * THUMBNAIL_DIMENSION * 4)
+
+    def requestThumbnails(self, mediaPaths):
+        # mediaPaths come in the order they should be decoded in (visible cells nearest first, then the ones just off screen);
+        # anything queued for an earlier scroll position that isn't requested anymore is dropped
+        self.dropQueuedTasks()
+        missingMediaPaths = [mediaPath for mediaPath in mediaPaths if mediaPath not in self.thumbnails and mediaPath not in self.pendingMediaPaths]
+        mediaBatches = [missingMediaPaths[batchStart:batchStart + THUMBNAIL_BATCH_SIZE] for batchStart in range(0, len(missingMediaPaths), THUMBNAIL_BATCH_SIZE)]
+
+        for batchNumber, mediaBatch in enumerate(mediaBatches):
+            batchTask = ThumbnailBatchTask(mediaBatch, self.previewCache, self.supportedImageFormats, self.cacheGeneration, self.decodeService)
+            batchTask.setAutoDelete(False) # Python keeps the reference in queuedTasks/runningTasks until the batch reports back
+            batchTask.signals.decoded.connect(self.batchDecoded)
+            self.queuedTasks.append(batchTask)
+            self.pendingMediaPaths.update(mediaBatch)
+            self.thumbnailPool.start(batchTask, len(mediaBatches) - batchNumber) # Earlier batches get a higher priority
+
+    def dropQueuedTasks(self):
+        # Tasks that already started can't be taken back; they finish and still land in the memory cache
+        for queuedTask in self.queuedTasks:
+            if self.thumbnailPool.tryTake(queuedTask):
+                self.pendingMediaPaths.difference_update(queuedTask.mediaPaths)
+            else:
+                self.runningTasks.append(queuedTask)
+
+        self.queuedTasks = []
+
+    def batchDecoded(self, batchTask, decodedThumbnails, cacheGeneration):
+        for taskList in (self.queuedTasks, self.runningTasks):
+            if batchTask in taskList:
+                taskList.remove(batchTask)
+
+        self.finishedTasks.append(batchTask)
+
+        if cacheGeneration != self.cacheGeneration: # Decoded before the media were moved, the result is thrown away
+            return
+
+        self.pendingMediaPaths.difference_update(batchTask.mediaPaths)
+
+        for mediaPath, mediaImage in decodedThumbnails:
+            self.thumbnailsBytes -= self.getImageBytes(self.thumbnails.pop(mediaPath, None))
+            self.thumbnails[mediaPath] = mediaImage
+            self.thumbnailsBytes += self.getImageBytes(mediaImage)
+
+        while self.thumbnailsBytes > MEMORY_CACHE_BYTES and len(self.thumbnails) > 1:
+            _, evictedImage = self.thumbnails.popitem(last=False)
+            self.thumbnailsBytes -= self.getImageBytes(evictedImage)
+
+        self.thumbnailsReady.emit()
+
+    def getImageBytes(self, mediaImage):
+        return mediaImage.sizeInBytes() if mediaImage is not None else 0
+
+    def cancelRequests(self):
+        # Nothing is listed anymore, queued batches would only decode media nobody looks at
+        self.dropQueuedTasks()
+
+    def clearThumbnails(self):
+        # Paths get reused after renaming/moving, so anything decoded before is no longer trustworthy
+        self.dropQueuedTasks()
+        self.pendingMediaPaths = set()
+        self.cacheGeneration += 1
+        self.thumbnails.clear()
+        self.thumbnailsBytes = 0
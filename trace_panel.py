@@ -0,0 +1,95 @@
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog
+from PyQt6.QtGui import QColor
+from PyQt6.QtCore import QTimer
+from instrumentation import tracer
+
+TRACE_PANEL_REFRESH_MS = 1000
+TRACE_PANEL_ROWS = 50
+
+class TracePanel(QDialog):
+    # Slowest recent Worker slots and phases while tracing is on, opened with Ctrl+Shift+T. Non-modal so it can stay open next to the app
+    def __init__(self, parentWidget=None):
+        super().__init__(parentWidget)
+        self.setWindowTitle("Slowest Operations")
+        self.resize(900, 450)
+        self.dialogLayout = QVBoxLayout(self)
+        self.traceStatusLabel = QLabel()
+        self.dialogLayout.addWidget(self.traceStatusLabel)
+
+        self.operationTable = QTableWidget(0, 4)
+        self.operationTable.setHorizontalHeaderLabels(["Operation", "Duration (ms)", "Thread", "Details"])
+        self.operationTable.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
+        self.operationTable.verticalHeader().hide()
+        self.dialogLayout.addWidget(self.operationTable)
+
+        self.panelButtons = QHBoxLayout()
+        self.recordButton = QPushButton()
+        self.recordButton.clicked.connect(self.toggleRecording)
+        self.refreshButton = QPushButton("Refresh")
+        self.refreshButton.clicked.connect(self.refreshOperations)
+        self.saveButton = QPushButton("Save Trace...")
+        self.saveButton.clicked.connect(self.saveTrace)
+        self.clearButton = QPushButton("Clear")
+        self.clearButton.clicked.connect(self.clearOperations)
+
+        for panelButton in [self.recordButton, self.refreshButton, self.saveButton, self.clearButton]:
+            self.panelButtons.addWidget(panelButton)
+
+        self.panelButtons.addStretch()
+        self.dialogLayout.addLayout(self.panelButtons)
+
+        # Only refreshes while visible, a hidden panel costs nothing
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(TRACE_PANEL_REFRESH_MS)
+        self.refreshTimer.timeout.connect(self.refreshOperations)
+        self.refreshOperations()
+
+    def showEvent(self, showEvent):
+        self.refreshTimer.start()
+        self.refreshOperations()
+        super().showEvent(showEvent)
+
+    def hideEvent(self, hideEvent):
+        self.refreshTimer.stop()
+        super().hideEvent(hideEvent)
+
+    def toggleRecording(self):
+        if tracer.enabled:
+            tracer.disable()
+        else:
+            tracer.enable(tracer.tracePath)
+
+        self.refreshOperations()
+
+    def refreshOperations(self):
+        self.recordButton.setText("Stop Recording" if tracer.enabled else "Start Recording")
+        self.traceStatusLabel.setText(f"Recording, {len(tracer.traceEvents)} events so far." if tracer.enabled else f"Not recording, {len(tracer.traceEvents)} events recorded. Start recording or launch the app with PEO_TRACE=1.")
+        slowestOperations = tracer.getSlowestOperations(TRACE_PANEL_ROWS)
+        self.operationTable.setRowCount(len(slowestOperations))
+
+        for operationRow, (durationMs, operationName, threadName, operationDetails) in enumerate(slowestOperations):
+            operationItems = [
+                QTableWidgetItem(operationName),
+                QTableWidgetItem(f"{durationMs:.1f}"),
+                QTableWidgetItem(threadName),
+                QTableWidgetItem(", ".join(f"{detailName}={detailValue}" for detailName, detailValue in operationDetails.items()))
+            ]
+
+            for operationColumn, operationItem in enumerate(operationItems):
+                if tracer.isSlow(operationName, durationMs): # Over its threshold, e.g. a GUI slot that blocked for more than a couple of frames
+                    operationItem.setForeground(QColor("#FF5555"))
+
+                self.operationTable.setItem(operationRow, operationColumn, operationItem)
+
+        self.operationTable.resizeColumnsToContents()
+
+    def saveTrace(self):
+        tracePath, _ = QFileDialog.getSaveFileName(self, "Save Trace", tracer.tracePath or "peo-trace.json", "Chrome Trace (*.json)")
+
+        if tracePath:
+            savedTracePath = tracer.exportTrace(tracePath)
+            self.traceStatusLabel.setText(f"Trace saved to {savedTracePath}, open it in ui.perfetto.dev or chrome://tracing." if savedTracePath else "Nothing to save yet or the trace could not be written.")
+
+    def clearOperations(self):
+        tracer.clear()
+        self.refreshOperations()
@@ -0,0 +1,154 @@
+import errno
+import os
+import sys
+from os import path, rename
+from shutil import copystat
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from instrumentation import tracedPhase, traceCount
+
+COPY_BUFFER_SIZE = 8 * 1024 * 1024 # 8 MiB; shutil's default 64 KiB buffer is far too small for card readers and RAID arrays
+VERIFY_BLOCK_SIZE = 64 * 1024
+PARTIAL_FILE_SUFFIX = ".peopart" # Not a supported media extension, so half-copied files never show up in media lists or counts
+kernelCopyFallbackErrors = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+hardLinkFallbackErrors = {errno.EPERM, errno.EACCES, errno.ENOSYS, errno.EINVAL, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTSUP} # File systems without hard links (FAT, exFAT, some NAS shares)
+
+def isCrossDevice(sourceDirectory, targetDirectory):
+    return os.stat(sourceDirectory).st_dev != os.stat(targetDirectory).st_dev
+
+def copyFileContents(sourceFile, targetFile, fileSize):
+    copiedBytes = 0
+
+    # Kernel-side copies first (no round trip through Python buffers), then a large-buffer read/write loop
+    for kernelCopy in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+        if kernelCopy is None or copiedBytes:
+            continue
+
+        try:
+            while copiedBytes < fileSize:
+                if kernelCopy is os.sendfile:
+                    copiedChunk = os.sendfile(targetFile.fileno(), sourceFile.fileno(), copiedBytes, min(fileSize - copiedBytes, 1 << 30))
+                else:
+                    copiedChunk = os.copy_file_range(sourceFile.fileno(), targetFile.fileno(), min(fileSize - copiedBytes, 1 << 30), copiedBytes, copiedBytes)
+
+                if copiedChunk == 0:
+                    break
+
+                copiedBytes += copiedChunk
+
+            if copiedBytes or fileSize == 0: # Some file systems report 0 on the very first call instead of failing, the next method copies those
+                return copiedBytes
+        except OSError as ose:
+            if ose.errno not in kernelCopyFallbackErrors or copiedBytes:
+                raise
+
+    copyBuffer = bytearray(COPY_BUFFER_SIZE)
+    copyBufferView = memoryview(copyBuffer)
+    sourceFile.seek(copiedBytes)
+    targetFile.seek(copiedBytes)
+
+    while True:
+        readBytes = sourceFile.readinto(copyBuffer)
+
+        if not readBytes:
+            break
+
+        targetFile.write(copyBufferView[:readBytes])
+        copiedBytes += readBytes
+
+    return copiedBytes
+
+def isCopyVerified(sourcePath, targetPath, fileSize):
+    if path.getsize(targetPath) != fileSize:
+        return False
+
+    # Compares the first and last blocks instead of rereading whole files; catches truncated and misaligned copies cheaply
+    with open(sourcePath, "rb") as sourceFile, open(targetPath, "rb") as targetFile:
+        for blockOffset in {0, max(fileSize - VERIFY_BLOCK_SIZE, 0)}:
+            sourceFile.seek(blockOffset)
+            targetFile.seek(blockOffset)
+
+            if sourceFile.read(VERIFY_BLOCK_SIZE) != targetFile.read(VERIFY_BLOCK_SIZE):
+                return False
+
+    return True
+
+def renameNoReplace(sourcePath, targetPath, sourceDirectoryDescriptor=None, targetDirectoryDescriptor=None):
+    # os.rename silently replaces a target that showed up after it was checked (POSIX), so the new name is hard linked first, which fails
+    # with FileExistsError if anything took it, and the old name is unlinked after. Without hard links the target is checked right before
+    # renaming instead. EXDEV is raised like os.rename raises it. Directory descriptors are optional, as with os.rename's dir_fd arguments
+    if sys.platform == "win32": # os.rename never replaces on Windows
+        rename(sourcePath, targetPath)
+        return
+
+    directoryArguments = {"src_dir_fd": sourceDirectoryDescriptor, "dst_dir_fd": targetDirectoryDescriptor} if sourceDirectoryDescriptor is not None else {}
+
+    try:
+        os.link(sourcePath, targetPath, follow_symlinks=False, **directoryArguments) # The link itself, not what a linked duplicate points to
+    except OSError as ose:
+        if ose.errno not in hardLinkFallbackErrors:
+            raise
+
+        try:
+            os.stat(targetPath, dir_fd=targetDirectoryDescriptor, follow_symlinks=False)
+            raise FileExistsError(errno.EEXIST, "Target media already exists", targetPath)
+        except FileNotFoundError:
+            rename(sourcePath, targetPath, **directoryArguments)
+            return
+
+    os.unlink(sourcePath, dir_fd=sourceDirectoryDescriptor)
+
+@tracedPhase
+def moveAcrossDevices(sourcePath, targetPath):
+    # Copies into a partial file, verifies it, then swaps it into place. The source is only deleted after all of that succeeds
+    if path.lexists(targetPath):
+        raise FileExistsError(errno.EEXIST, "Target media already exists", targetPath)
+
+    partialPath = f"{targetPath}{PARTIAL_FILE_SUFFIX}"
+    fileSize = os.stat(sourcePath).st_size
+
+    try:
+        with open(sourcePath, "rb") as sourceFile, open(partialPath, "wb") as targetFile:
+            copiedBytes = copyFileContents(sourceFile, targetFile, fileSize)
+            targetFile.flush()
+            os.fsync(targetFile.fileno()) # Copy has to be on disk before the source goes away
+
+        if copiedBytes != fileSize or not isCopyVerified(sourcePath, partialPath, fileSize):
+            raise OSError(errno.EIO, "Copied media does not match the original", sourcePath)
+
+        copystat(sourcePath, partialPath) # Preserves timestamps (and permission bits) of the original media
+        renameNoReplace(partialPath, targetPath) # Fails instead of replacing media that took the name while the copy ran
+    except BaseException:
+        if path.exists(partialPath):
+            os.remove(partialPath)
+        raise
+
+    os.remove(sourcePath)
+    traceCount(bytes=fileSize)
+
+    return fileSize
+
+@tracedPhase
+def transferMediaFiles(plannedTransfers, concurrency, cancelEvent, onTransferred):
+    # plannedTransfers: list of (sourcePath, targetPath); onTransferred(sourcePath, targetPath, error) is called on the calling thread as each file finishes
+    # Only concurrency * 2 files are ever queued, so cancelling stops quickly and a huge card dump doesn't create thousands of futures
+    pendingTransfers = iter(plannedTransfers)
+    runningTransfers = {}
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="MediaTransfer") as transferPool:
+        while True:
+            while not cancelEvent.is_set() and len(runningTransfers) < max(concurrency, 1) * 2:
+                nextTransfer = next(pendingTransfers, None)
+
+                if nextTransfer is None:
+                    break
+
+                runningTransfers[transferPool.submit(moveAcrossDevices, *nextTransfer)] = nextTransfer
+
+            if not runningTransfers:
+                break
+
+            finishedTransfers, _ = wait(runningTransfers, return_when=FIRST_COMPLETED)
+
+            for finishedTransfer in finishedTransfers:
+                sourcePath, targetPath = runningTransfers.pop(finishedTransfer)
+                onTransferred(sourcePath, targetPath, finishedTransfer.exception())
@@ -1,9 +1,12 @@
 from os import path
-from PyQt6.QtWidgets import QWidget, QGridLayout, QLabel, QLineEdit, QPushButton, QComboBox, QDateEdit, QListWidget, QFrame, QVBoxLayout
-from PyQt6.QtGui import QIcon
-from PyQt6.QtCore import Qt, QDate
+from PyQt6.QtWidgets import QWidget, QGridLayout, QLabel, QLineEdit, QPushButton, QComboBox, QDateEdit, QListView, QFrame, QHBoxLayout, QVBoxLayout, QProgressBar, QSpinBox, QCompleter, QStackedWidget
+from PyQt6.QtGui import QIcon, QShortcut, QKeySequence
+from PyQt6.QtCore import Qt, QDate, QStringListModel, QTimer
 from worker import Worker
+from media_list_model import MediaListModel, MediaFilterProxyModel
+from contact_sheet import ContactSheetView
 from utils import getResourcePath
+from instrumentation import startupTimer
 
 class ApplicationWindow(QWidget):
     # Gets executed upon creating an instance of the class
@@ -18,7 +21,9 @@ class ApplicationWindow(QWidget):
         self.icon = getResourcePath("assets/images/app_icon.png")
         self.memory = getResourcePath("assets/memory/mediaCodeCollection.peomc") # PEOMC stands for Photo Event Organizer Media Code
         self.doesMemoryExists = path.exists(self.memory) # From os.path
+        self.isFirstPaintDone = False
         self.createAppWindow()
+        startupTimer.mark("windowCreated")
     
     def createAppWindow(self):
         # App window layout
@@ -47,21 +52,47 @@ class ApplicationWindow(QWidget):
         self.inputLayout.browseMediaLocation.clicked.connect(self.worker.browseMediaLocationClicked)
         self.inputLayout.browseMediaDestination.clicked.connect(self.worker.browseMediaDestinationClicked)
         self.inputLayout.mediaDestinationTextBox.textChanged.connect(self.worker.showEventDirectories)
+        self.inputLayout.mediaDestinationTextBox.textChanged.connect(self.worker.applyDestinationSettings)
+        self.inputLayout.copyConcurrencySpinBox.valueChanged.connect(self.worker.saveCopyConcurrency)
+        self.inputLayout.mediaOrderingComboBox.currentIndexChanged.connect(self.worker.saveMediaOrdering)
         self.inputLayout.addMediaCode.clicked.connect(self.worker.addNewMediaCode)
         self.inputLayout.eventCalendar.dateChanged.connect(self.worker.showEventDirectories)
         self.inputLayout.eventDirectoryNameComboBox.activated.connect(self.worker.adjustEventDate) # Only gets triggered when eventDirectoryName text was changed with dropdown
+        self.inputLayout.eventSearchTextBox.textEdited.connect(self.worker.searchEvents)
+        self.inputLayout.eventSearchCompleter.activated.connect(self.worker.jumpToEvent)
 
         # Configuring MediaLViewer class events
-        self.mediaLayout.mediaList.currentItemChanged.connect(self.worker.imageSelected)
+        self.mediaLayout.mediaList.selectionModel().currentChanged.connect(self.worker.imageSelected)
+        self.mediaLayout.mediaFilterTextBox.textChanged.connect(self.worker.filterMediaList)
+        self.mediaLayout.mediaKindComboBox.currentIndexChanged.connect(self.worker.filterMediaList)
+        self.mediaLayout.mediaViewComboBox.currentIndexChanged.connect(self.worker.switchMediaView)
 
         # Configuring ActionButtons class events
         self.buttonsLayout.renameButton.clicked.connect(self.worker.renameMedia)
+        self.buttonsLayout.cancelButton.clicked.connect(self.worker.cancelRenameMedia)
+        self.buttonsLayout.undoButton.clicked.connect(self.worker.undoLastRename)
+        self.buttonsLayout.queueButton.clicked.connect(self.worker.queueMedia)
+        self.buttonsLayout.splitButton.clicked.connect(self.worker.splitIntoEvents)
+        self.buttonsLayout.statsButton.clicked.connect(self.worker.showLibraryStats)
         self.buttonsLayout.showButton.clicked.connect(self.worker.showDirectoryContents)
 
+        # Diagnostics, slowest recent operations and trace export
+        self.tracePanelShortcut = QShortcut(QKeySequence("Ctrl+Shift+T"), self)
+        self.tracePanelShortcut.activated.connect(self.worker.showTracePanel)
+
         # Adding media and input layouts to the main layout 
         self.mainLayout.addWidget(self.inputLayout, 0, 0)
         self.mainLayout.addWidget(self.mediaLayout, 1, 0)
         self.mainLayout.addWidget(self.buttonsLayout, 2, 0)
+
+    def paintEvent(self, paintEvent):
+        super().paintEvent(paintEvent)
+
+        # Whatever isn't needed for the first frame (media code collection, ...) is loaded once the window is on screen
+        if not self.isFirstPaintDone:
+            self.isFirstPaintDone = True
+            startupTimer.mark("firstPaint")
+            QTimer.singleShot(0, self.worker.finishStartup)
     
 class InputLayout(QWidget):
     # Gets executed upon creating an instance of the class
@@ -81,11 +112,17 @@ class InputLayout(QWidget):
         self.mediaCodeLabel = QLabel("Media Code:")
         self.eventDateLabel = QLabel("Event Date:")
         self.eventDirectoryNameLabel = QLabel("Directory Name:")
+        self.copyConcurrencyLabel = QLabel("Copy Streams:")
+        self.mediaOrderingLabel = QLabel("Media Order:")
+        self.eventSearchLabel = QLabel("Jump to Event:")
         self.inputLayout.addWidget(self.mediaLocationLabel, 0, 0)
         self.inputLayout.addWidget(self.mediaDestinationLabel, 1, 0)
         self.inputLayout.addWidget(self.mediaCodeLabel, 2, 0)
         self.inputLayout.addWidget(self.eventDateLabel, 3, 0)
         self.inputLayout.addWidget(self.eventDirectoryNameLabel, 4, 0)
+        self.inputLayout.addWidget(self.copyConcurrencyLabel, 5, 0)
+        self.inputLayout.addWidget(self.mediaOrderingLabel, 6, 0)
+        self.inputLayout.addWidget(self.eventSearchLabel, 7, 0)
 
         # Input text box
         self.mediaLocationTextBox = QLineEdit(self)
@@ -130,6 +167,32 @@ class InputLayout(QWidget):
         popUpCalendar.setGridVisible(True)
         self.inputLayout.addWidget(self.eventCalendar, 3, 1)
 
+        # Parallel copy streams used when the media location and media root destination are on different devices (saved per destination)
+        self.copyConcurrencySpinBox = QSpinBox(self)
+        self.copyConcurrencySpinBox.setRange(1, 16)
+        self.copyConcurrencySpinBox.setValue(2) # Same as the destination settings default until a destination is chosen
+        self.copyConcurrencySpinBox.setMaximumWidth(100)
+        self.copyConcurrencySpinBox.setToolTip("Files copied at the same time when moving to another drive. Use 1-2 for spinning disks, more for SSD/RAID.")
+        self.inputLayout.addWidget(self.copyConcurrencySpinBox, 5, 1)
+
+        # Order of the media list and of the new CODE_N numbers (saved per destination)
+        self.mediaOrderingComboBox = QComboBox(self)
+        self.mediaOrderingComboBox.addItem("Last Modified", "mtime")
+        self.mediaOrderingComboBox.addItem("Capture Time", "capture")
+        self.mediaOrderingComboBox.setMaximumWidth(200)
+        self.mediaOrderingComboBox.setToolTip("Capture time reads EXIF/HEIC/video headers, so copied or synced media still get numbered in shooting order.")
+        self.inputLayout.addWidget(self.mediaOrderingComboBox, 6, 1)
+
+        # Search box over every event of the media root destination, by name or by date ("2024", "2024-06", "2024-06-14")
+        self.eventSearchTextBox = QLineEdit(self)
+        self.eventSearchTextBox.setPlaceholderText("Event name or yyyy[-MM[-dd]]")
+        self.eventSearchModel = QStringListModel(self)
+        self.eventSearchCompleter = QCompleter(self.eventSearchModel, self)
+        self.eventSearchCompleter.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.eventSearchCompleter.setFilterMode(Qt.MatchFlag.MatchContains)
+        self.eventSearchTextBox.setCompleter(self.eventSearchCompleter)
+        self.inputLayout.addWidget(self.eventSearchTextBox, 7, 1)
+
         return self.inputLayout
 
 # Must be used in grid layout
@@ -144,9 +207,39 @@ class MediaLayout(QWidget):
         self.mediaViewerLayout.setColumnStretch(1, 7)
     
     def addContents(self):
-        # List of media found
-        self.mediaList = QListWidget()
-        self.mediaViewerLayout.addWidget(self.mediaList, 0, 0)
+        # Filter for the media list by name and media kind
+        self.mediaFilterBox = QHBoxLayout()
+        self.mediaFilterTextBox = QLineEdit()
+        self.mediaFilterTextBox.setPlaceholderText("Filter media by name...")
+        self.mediaFilterTextBox.setClearButtonEnabled(True)
+        self.mediaKindComboBox = QComboBox()
+        self.mediaKindComboBox.addItems(["All Media", "Images", "Videos"])
+        self.mediaViewComboBox = QComboBox()
+        self.mediaViewComboBox.addItems(["List", "Contact Sheet"])
+        self.mediaFilterBox.addWidget(self.mediaFilterTextBox)
+        self.mediaFilterBox.addWidget(self.mediaKindComboBox)
+        self.mediaFilterBox.addWidget(self.mediaViewComboBox)
+        self.mediaViewerLayout.addLayout(self.mediaFilterBox, 0, 0)
+
+        # List of media found; a view over a model so only the rows on screen are ever built, even for folders with 100k+ media
+        self.mediaListModel = MediaListModel()
+        self.mediaFilterProxyModel = MediaFilterProxyModel()
+        self.mediaFilterProxyModel.setSourceModel(self.mediaListModel)
+        self.mediaList = QListView()
+        self.mediaList.setUniformItemSizes(True) # Row heights are never measured one by one
+        self.mediaList.setLayoutMode(QListView.LayoutMode.Batched) # Lays out big lists in chunks instead of blocking the GUI thread
+        self.mediaList.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.mediaList.setModel(self.mediaFilterProxyModel)
+
+        # Thumbnail grid of the same media, sharing the list's selection so clicking a cell previews it too
+        self.mediaGrid = ContactSheetView()
+        self.mediaGrid.setModel(self.mediaFilterProxyModel)
+        self.mediaGrid.setSelectionModel(self.mediaList.selectionModel())
+
+        self.mediaViews = QStackedWidget()
+        self.mediaViews.addWidget(self.mediaList)
+        self.mediaViews.addWidget(self.mediaGrid)
+        self.mediaViewerLayout.addWidget(self.mediaViews, 1, 0)
 
         # Preview of media selected in the list
         self.mediaBoxFrame = QFrame()
@@ -158,7 +251,7 @@ class MediaLayout(QWidget):
         self.mediaBox = QVBoxLayout()
         self.mediaBox.setContentsMargins(15, 15, 15, 15)
 
-        self.mediaViewerLayout.addWidget(self.mediaBoxFrame, 0, 1)
+        self.mediaViewerLayout.addWidget(self.mediaBoxFrame, 0, 1, 2, 1)
         self.mediaViewerLayout.setColumnStretch(0, 4)
         self.mediaViewerLayout.setColumnStretch(1, 6)
         self.mediaViewerLayout.setHorizontalSpacing(20)
@@ -171,7 +264,11 @@ class ActionButtons(QWidget):
         self.buttonsLayout = QGridLayout()
         self.buttonsLayout.setColumnStretch(0, 1)
         self.buttonsLayout.setColumnStretch(1, 1)
-        self.buttonsLayout.setColumnStretch(2, 8)
+        self.buttonsLayout.setColumnStretch(2, 1)
+        self.buttonsLayout.setColumnStretch(3, 1)
+        self.buttonsLayout.setColumnStretch(4, 1)
+        self.buttonsLayout.setColumnStretch(5, 1)
+        self.buttonsLayout.setColumnStretch(6, 8)
         self.buttonsLayout.setHorizontalSpacing(30)
         self.setLayout(self.buttonsLayout)
 
@@ -181,9 +278,32 @@ class ActionButtons(QWidget):
         # Show Button
         self.showButton = self.createShowButton()
 
+        # Undo Button (puts the media of the last rename job back, see rename_journal.py)
+        self.undoButton = self.createUndoButton()
+
+        # Queue Button (renames several media locations side by side, see ingest_queue.py)
+        self.queueButton = self.createQueueButton()
+
+        # Split Button (renames a media location into several events by capture time gaps, see event_segmentation.py)
+        self.splitButton = self.createSplitButton()
+
+        # Stats Button (files and bytes of the whole library per year, month, event and media code, see library_stats.py)
+        self.statsButton = self.createStatsButton()
+
+        # Rename progress (only visible while a rename job is running)
+        self.renameProgressBar = self.createRenameProgressBar()
+        self.cancelButton = self.createCancelButton()
+
         # Adding the buttons to the buttons layout
         self.buttonsLayout.addWidget(self.renameButton, 0, 0)
         self.buttonsLayout.addWidget(self.showButton, 0, 1)
+        self.buttonsLayout.addWidget(self.undoButton, 0, 2)
+        self.buttonsLayout.addWidget(self.queueButton, 0, 3)
+        self.buttonsLayout.addWidget(self.splitButton, 0, 4)
+        self.buttonsLayout.addWidget(self.statsButton, 0, 5)
+        self.buttonsLayout.addWidget(self.renameProgressBar, 0, 6)
+        self.buttonsLayout.addWidget(self.cancelButton, 0, 7)
+        self.hideRenameProgress()
     
     def createRenameButton(self):
         renameButton = QPushButton("RENAME\nMEDIA")
@@ -195,6 +315,48 @@ class ActionButtons(QWidget):
         showButton.setMaximumWidth(100)
         return showButton
 
+    def createUndoButton(self):
+        undoButton = QPushButton("UNDO LAST\nRENAME")
+        undoButton.setMaximumWidth(100)
+        return undoButton
+
+    def createQueueButton(self):
+        queueButton = QPushButton("QUEUE\nMEDIA")
+        queueButton.setMaximumWidth(100)
+        return queueButton
+
+    def createSplitButton(self):
+        splitButton = QPushButton("SPLIT INTO\nEVENTS")
+        splitButton.setMaximumWidth(100)
+        return splitButton
+
+    def createStatsButton(self):
+        statsButton = QPushButton("LIBRARY\nSTATS")
+        statsButton.setMaximumWidth(100)
+        return statsButton
+
+    def createRenameProgressBar(self):
+        renameProgressBar = QProgressBar()
+        renameProgressBar.setTextVisible(True)
+        return renameProgressBar
+
+    def createCancelButton(self):
+        cancelButton = QPushButton("CANCEL")
+        cancelButton.setMaximumWidth(100)
+        return cancelButton
+
+    def showRenameProgress(self, totalMediaCount):
+        self.renameProgressBar.setMaximum(totalMediaCount)
+        self.renameProgressBar.setValue(0)
+        self.renameProgressBar.setFormat(f"0/{totalMediaCount} media  •  Preparing...")
+        self.renameProgressBar.show()
+        self.cancelButton.setEnabled(True)
+        self.cancelButton.show()
+
+    def hideRenameProgress(self):
+        self.renameProgressBar.hide()
+        self.cancelButton.hide()
+
 class StyleSheet:
     def __init__(self, mainLayout, inputLayout, mediaLayout, buttonsLayout):
         self.mainLayout = mainLayout
@@ -221,7 +383,7 @@ class StyleSheet:
                 border: 3px solid #44475A;
                 border-radius: 5px;
             }
-            QDateEdit{
+            QDateEdit, QSpinBox{
                 background-color: #233044;
                 color: #F8F8F2;
                 font-weight: bold;
@@ -246,14 +408,28 @@ class StyleSheet:
         )
         self.mediaLayout.setStyleSheet(
             """
-            QListWidget{
+            QListView{
                 border: 5px solid #44475A;
                 border-radius: 10px;
             }
-            QListWidget::item{
+            QListView::item{
                 color: #F8F8F2;
                 padding: 10px 20px;
             }
+            QLineEdit{
+                font-size: 15px;
+                color: #F8F8F2;
+                background-color: #233044;
+                border: 3px solid #44475A;
+                border-radius: 5px;
+            }
+            QComboBox{
+                background-color: #233044;
+                font-weight: bold;
+                color: #F8F8F2;
+                border: 3px solid #44475A;
+                border-radius: 5px;
+            }
             QFrame#mediaBoxFrame{ /* Modifying the mediaBoxFrame itself only, not the objects that inherits QFrame properties */
                 background-color: #282A36;
                 border: 5px solid #44475A;
@@ -282,5 +458,20 @@ class StyleSheet:
                 border: 3px solid #44475A;
                 border-radius: 5px;
             }
+            QPushButton:disabled{
+                background-color: #44475A;
+                color: #6272A4;
+            }
+            QProgressBar{
+                background-color: #233044;
+                color: #F8F8F2;
+                font-weight: bold;
+                text-align: center;
+                border: 3px solid #44475A;
+                border-radius: 5px;
+            }
+            QProgressBar::chunk{
+                background-color: #50FA7B;
+            }
             """
         )
\ No newline at end of file
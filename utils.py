@@ -1,5 +1,5 @@
 import sys
-from os import path
+from os import path, environ
 from re import sub
 
 def getResourcePath(relativePath):
@@ -9,4 +9,15 @@ def getResourcePath(relativePath):
             return path.join(path.abspath("."), relativePath)
 
 def sanitizeText(textToBeSanitized):
-     return sub("/", "∕", textToBeSanitized) # Substitutes normal slashes with division slashes
\ No newline at end of file
+     return sub("/", "∕", textToBeSanitized) # Substitutes normal slashes with division slashes
+
+def getCacheDirectory(cacheName):
+     # Per-user cache directory that survives restarts (and PyInstaller's temporary _MEIPASS extraction)
+     if sys.platform == "win32":
+          cacheRoot = environ.get("LOCALAPPDATA", path.expanduser("~\\AppData\\Local"))
+     elif sys.platform == "darwin":
+          cacheRoot = path.expanduser("~/Library/Caches")
+     else:
+          cacheRoot = environ.get("XDG_CACHE_HOME", path.expanduser("~/.cache"))
+
+     return path.join(cacheRoot, "PhotoEventOrganizer", cacheName)
@@ -0,0 +1,165 @@
+import os
+import shutil
+import subprocess
+import sys
+from threading import BoundedSemaphore, Lock
+from PyQt6.QtGui import QImage, QPainter, QColor, QFont, QPolygonF
+from PyQt6.QtCore import Qt, QPointF, QRectF
+from capture_time import readVideoInfo
+from preview_cache import PREVIEW_MAX_DIMENSION
+from instrumentation import tracedPhase, traceAnnotate
+
+# Poster frames for videos. ffmpeg seeks to the keyframe nearest a point a little into the clip and decodes only that one frame
+# (-noaccurate_seek, -skip_frame nokey) instead of the stream up to it, so a 4K clip costs about as much as one JPEG. Duration and
+# resolution come from the MP4/MOV headers alone. At most MAX_POSTER_PROCESSES ffmpeg processes run at once, each one is killed
+# after POSTER_TIMEOUT_SECONDS. Posters go into the preview cache (keyed by path + size + mtime), so a revisit never starts ffmpeg
+
+FFMPEG_ENVIRONMENT_VARIABLE = "PEO_FFMPEG" # Path of the ffmpeg binary, otherwise the one on the PATH is used
+MAX_POSTER_PROCESSES = 2
+POSTER_TIMEOUT_SECONDS = 10
+POSTER_OFFSET_FRACTION = 0.1 # Far enough in to skip black first frames and fade-ins
+MAX_POSTER_OFFSET_SECONDS = 3
+DEFAULT_POSTER_OFFSET_SECONDS = 1 # Containers without readable headers (MKV, AVI, WebM, ...)
+VIDEO_CARD_SIZE = (1280, 720) # Stand-in preview of videos without a poster frame
+
+posterProcessSlots = BoundedSemaphore(MAX_POSTER_PROCESSES) # Shared by the preview and the contact sheet thumbnails
+resolvedTools = {} # Tool name -> path, or None if it isn't installed; looked up once
+failedPosterKeys = set() # Preview cache keys of videos ffmpeg got no frame out of, not retried until the video changes
+failedPosterKeysLock = Lock()
+
+def getFfmpegPath():
+    if "ffmpeg" not in resolvedTools:
+        resolvedTools["ffmpeg"] = os.environ.get(FFMPEG_ENVIRONMENT_VARIABLE) or shutil.which("ffmpeg")
+
+    return resolvedTools["ffmpeg"]
+
+def getVideoInfo(mediaPath):
+    # readVideoInfo() for posters, previews and thumbnails: a header it trips over only costs the badge its duration and resolution
+    try:
+        return readVideoInfo(mediaPath)
+    except Exception as e: # General error catching
+        print(f"Could not read video headers of {mediaPath}: {e}")
+        return None
+
+def getPosterOffset(videoInfo):
+    if videoInfo is None or not videoInfo[0]:
+        return DEFAULT_POSTER_OFFSET_SECONDS
+
+    return min(videoInfo[0] * POSTER_OFFSET_FRACTION, MAX_POSTER_OFFSET_SECONDS)
+
+def extractPosterFrame(mediaPath, offsetSeconds):
+    # Returns a preview-sized QImage of the keyframe at or before offsetSeconds, or None
+    ffmpegPath = getFfmpegPath()
+
+    if ffmpegPath is None:
+        return None
+
+    for seekSeconds in dict.fromkeys([offsetSeconds, 0]): # Clips shorter than the offset (or without headers) have no keyframe there, the first frame then
+        ffmpegArguments = [
+            ffmpegPath, "-hide_banner", "-loglevel", "error", "-nostdin",
+            "-noaccurate_seek", "-skip_frame", "nokey", "-ss", f"{seekSeconds:.3f}",
+            "-i", f"file:{mediaPath}", # file: so ffmpeg never reads "2024-05-01: Party" as a protocol
+            "-map", "0:v:0", "-frames:v", "1",
+            "-vf", f"scale='min(iw,{PREVIEW_MAX_DIMENSION})':'min(ih,{PREVIEW_MAX_DIMENSION})':force_original_aspect_ratio=decrease",
+            "-f", "image2pipe", "-c:v", "mjpeg", "-q:v", "3", "-"
+        ]
+
+        try:
+            with posterProcessSlots:
+                ffmpegRun = subprocess.run(ffmpegArguments, capture_output=True, timeout=POSTER_TIMEOUT_SECONDS, creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0) # No console window flashing up per video on Windows
+        except subprocess.TimeoutExpired: # subprocess.run() already killed it
+            print(f"Poster frame of {mediaPath} took longer than {POSTER_TIMEOUT_SECONDS} seconds")
+            return None
+        except OSError as ose:
+            print(f"Could not run ffmpeg: {ose}")
+            return None
+
+        posterImage = QImage.fromData(ffmpegRun.stdout, "JPG")
+
+        if not posterImage.isNull():
+            traceAnnotate(seconds=seekSeconds)
+            return posterImage.convertToFormat(QImage.Format.Format_RGB32)
+
+    return None
+
+def getReadableDuration(durationSeconds):
+    minutes, seconds = divmod(round(durationSeconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def drawVideoBadge(mediaImage, videoInfo):
+    # Play symbol in the middle and "duration  •  width×height" in the bottom left corner, drawn into the poster itself
+    badgePainter = QPainter(mediaImage)
+    badgePainter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    badgePainter.setPen(Qt.PenStyle.NoPen)
+    shortSide = min(mediaImage.width(), mediaImage.height())
+    badgeRadius = shortSide * 0.09
+    badgeCenter = QPointF(mediaImage.width() / 2, mediaImage.height() / 2)
+    badgePainter.setBrush(QColor(0, 0, 0, 140))
+    badgePainter.drawEllipse(badgeCenter, badgeRadius, badgeRadius)
+    badgePainter.setBrush(QColor(255, 255, 255, 230))
+    badgePainter.drawPolygon(QPolygonF([badgeCenter + QPointF(-badgeRadius * 0.35, -badgeRadius * 0.5), badgeCenter + QPointF(-badgeRadius * 0.35, badgeRadius * 0.5), badgeCenter + QPointF(badgeRadius * 0.55, 0)]))
+
+    if videoInfo is not None:
+        videoDuration, videoWidth, videoHeight = videoInfo
+        infoText = f"{getReadableDuration(videoDuration)}  •  {videoWidth}×{videoHeight}" if videoDuration else f"{videoWidth}×{videoHeight}"
+        infoFont = QFont()
+        infoFont.setPixelSize(max(12, round(shortSide / 22)))
+        badgePainter.setFont(infoFont)
+        textMargin = infoFont.pixelSize() * 0.5
+        textRect = badgePainter.fontMetrics().boundingRect(infoText)
+        infoRect = QRectF(textMargin, mediaImage.height() - textRect.height() - textMargin * 3, textRect.width() + textMargin * 2, textRect.height() + textMargin * 2)
+        badgePainter.setBrush(QColor(0, 0, 0, 160))
+        badgePainter.drawRoundedRect(infoRect, textMargin, textMargin)
+        badgePainter.setPen(QColor(255, 255, 255))
+        badgePainter.drawText(infoRect, Qt.AlignmentFlag.AlignCenter, infoText)
+
+    badgePainter.end()
+
+    return mediaImage
+
+def drawVideoCard(videoInfo):
+    # Preview of a video without a poster frame (no ffmpeg, or a codec it can't decode): the play symbol and what the headers know
+    videoCard = QImage(*VIDEO_CARD_SIZE, QImage.Format.Format_RGB32)
+    videoCard.fill(QColor("#282A36"))
+
+    return drawVideoBadge(videoCard, videoInfo)
+
+@tracedPhase
+def getVideoPosterPath(mediaPath, previewCache):
+    # Path of the cached poster (with its badge already drawn in), extracting and caching it first if needed; None if there is none
+    cachedPosterPath = previewCache.getCachedPreviewPath(mediaPath)
+
+    if cachedPosterPath is not None:
+        traceAnnotate(source="cache")
+        return cachedPosterPath
+
+    try:
+        cacheKey = previewCache.getCacheKey(mediaPath)
+    except OSError: # Video is gone
+        return None
+
+    with failedPosterKeysLock:
+        if cacheKey in failedPosterKeys:
+            return None
+
+    videoInfo = getVideoInfo(mediaPath)
+    posterImage = extractPosterFrame(mediaPath, getPosterOffset(videoInfo))
+    traceAnnotate(media=os.path.basename(mediaPath), source="ffmpeg")
+
+    if posterImage is None:
+        with failedPosterKeysLock:
+            failedPosterKeys.add(cacheKey)
+
+        return None
+
+    try:
+        newPosterPath = previewCache.getNewPreviewPath(mediaPath, False)
+
+        if drawVideoBadge(posterImage, videoInfo).save(newPosterPath, "JPG", 90):
+            return previewCache.addCachedPreview(newPosterPath)
+    except OSError as ose: # A full or read-only cache directory means no poster, same as a video ffmpeg can't read
+        print(f"Could not cache poster frame: {ose}")
+
+    return None
@@ -1,18 +1,34 @@
-from os import rename, path, makedirs, scandir, walk
-from shutil import move
-from PyQt6.QtWidgets import QMessageBox, QFileDialog, QInputDialog, QLabel
+import time
+from os import path
+from collections import deque
+from PyQt6.QtWidgets import QMessageBox, QFileDialog, QInputDialog, QLabel, QDialog
 from PyQt6.QtGui import QPixmap
-from PyQt6.QtCore import QObject, Qt, QTimer, QDate, QByteArray, QBuffer
-from utils import getResourcePath, sanitizeText
-from PIL import Image
-import pillow_heif
+from PyQt6.QtCore import QObject, Qt, QTimer, QDate, QThreadPool
+from utils import getResourcePath, sanitizeText, getCacheDirectory
+from organizer_core import supportedImageFormats, eventMonths, getMediaIndex, getHashIndex
+from rename_engine import RenameJob, RenamePlanJob, DuplicateCheckJob, SegmentationJob, UndoJob, IngestQueueSignals
+from rename_journal import getResumableJournals, getUndoableJournal
+from duplicate_dialog import DuplicateDialog, getReadableSize
+from rename_plan_dialog import RenamePlanDialog
+from destination_settings import loadDestinationSettings, saveDestinationSettings
+from preview_cache import PreviewCache, getDefaultCacheBytes
+from preview_loader import PreviewLoader, PREFETCH_DISTANCE
+from thumbnail_loader import ThumbnailLoader
+from decode_service import DecodeService
+from media_watcher import MediaDirectoryWatcher
+from event_catalog import EventCatalog, eventDirectoryPattern, CATALOG_REFRESH_INTERVAL_SECONDS
+from capture_time import MetadataCache
+from media_list_model import MediaScanTask, MediaChangesTask
+from media_snapshot import countMedia, forgetMediaSnapshot, MEDIA_KIND_IMAGE, MEDIA_KIND_VIDEO
+from instrumentation import traced, tracer, startupTimer
+from trace_panel import TracePanel
+from stats_dialog import LibraryStatsDialog
+from ingest_queue import IngestQueue
+from ingest_dialog import IngestDialog
+from event_segmentation import getMediaDestinations
+from segmentation_dialog import SegmentationDialog
 import os
 
-# Register HEIC opener once at module level
-pillow_heif.register_heif_opener()
-
-supportedVideoFormats = [".mp4", ".avi", ".mkv", ".mov", ".wmv", ".flv", ".webm", ".mpeg", ".mpg", ".3gp", ".m4v", ".rm", ".ogv", ".ts", ".vob", ".divx", ".xvid", ".amv"]
-supportedImageFormats = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".tif", ".webp", ".heif", ".heic", ".svg", ".eps", ".ico", ".raw", ".ai", ".exr"]
 
 class Worker(QObject): # QObject makes this class pure-logic only class while still being able to use some widgets
     def __init__(self, inputLayout, mediaLayout, buttonsLayout, parentWidget):
@@ -30,75 +46,228 @@ class Worker(QObject): # QObject makes this class pure-logic only class while st
         self.doesMemoryExists = self.parentWidget.doesMemoryExists
         self.mediaList = self.mediaLayout.mediaList
         self.eventCalendar = self.inputLayout.eventCalendar
-        self.eventMonths = ["January", "February", "March", "April",
-                        "May", "June", "July", "August",
-                        "September", "October", "November", "December"]
-        self.__eventDatesCollection = {} # Event dates container of current media root destination for event name referencing based on dates
+        self.copyConcurrencySpinBox = self.inputLayout.copyConcurrencySpinBox
+        self.mediaOrderingComboBox = self.inputLayout.mediaOrderingComboBox
+        self.metadataCache = MetadataCache(getCacheDirectory("metadata")) # Capture times of media seen before, keyed by path + size + mtime
+        self.eventMonths = eventMonths
+        self.eventCatalog = None # Persistent event directory catalog of the current media root destination, see getEventCatalog()
+        self.eventCatalogRefreshTime = None # time.monotonic() of the catalog's last refresh
+        self.mediaIndex = None # Persistent media counter of the current media root destination, see getMediaIndex()
+        self.previewCache = PreviewCache(getCacheDirectory("previews"), getDefaultCacheBytes()) # Size cap can be changed with the PEO_PREVIEW_CACHE_MB environment variable
+        self.decodeService = DecodeService() # Decoder processes, so a broken or huge media can't freeze or crash the app; PEO_DECODER_PROCESSES=0 turns them off
+        self.previewLoader = PreviewLoader(self.previewCache, supportedImageFormats, self.decodeService)
+        self.previewLoader.previewReady.connect(self.showPreview)
+        self.thumbnailLoader = ThumbnailLoader(self.previewCache, supportedImageFormats, self.decodeService) # Contact sheet thumbnails, see contact_sheet.py
+        self.mediaGrid = self.mediaLayout.mediaGrid
+        self.mediaGrid.setThumbnailLoader(self.thumbnailLoader)
+        self.mediaListModel = self.mediaLayout.mediaListModel
+        self.mediaFilterProxyModel = self.mediaLayout.mediaFilterProxyModel
+        self.listedDirectory = None # Directory currently shown in the media list
+        self.mediaScanGeneration = 0
+        self.runningMediaScanTasks = {} # Scan generation -> background scan task
+        self.finishedMediaScanTasks = deque(maxlen=8)
+        self.mediaDirectoryWatcher = MediaDirectoryWatcher()
+        self.mediaDirectoryWatcher.directoryChanged.connect(self.applyMediaListChanges)
+        self.mediaLabel = ResponsiveMedia() # Single preview widget reused for every selection
+        self.mediaLayout.mediaBox.addWidget(self.mediaLabel)
+        self.mediaLayout.mediaBoxFrame.setLayout(self.mediaLayout.mediaBox)
         self.showButton = self.buttonsLayout.showButton
+        self.renameButton = self.buttonsLayout.renameButton
+        self.undoButton = self.buttonsLayout.undoButton
+        self.cancelButton = self.buttonsLayout.cancelButton
+        self.renameProgressBar = self.buttonsLayout.renameProgressBar
+        self.renameJob = None # Currently running background rename job, None when idle
+        self.duplicateCheckJob = None # Duplicate check that runs before the rename job
+        self.renamePlanJob = None # Dry run that is previewed before the rename job
+        self.segmentationJob = None # Capture time read before SPLIT INTO EVENTS proposes events
+        self.undoJob = None # Currently running undo of a journaled rename job
+        self.tracePanel = None # Created on first Ctrl+Shift+T
+        self.statsDialog = None # Library statistics of the current media root destination, created on the first LIBRARY STATS
+        self.ingestQueue = None # Media locations renamed side by side, created on the first QUEUE MEDIA
+        self.ingestQueueSignals = None
+        self.ingestDialog = None
+        self.queueButton = self.buttonsLayout.queueButton
+        self.splitButton = self.buttonsLayout.splitButton
+        self.hashIndex = None # Persistent hash index of the current media root destination, see getHashIndex()
+        self.renameDestinationDirectory = None
+        self.renameMediaDestinations = None # Media name -> event directory when the media location is split into events
+        self.renameMediaCount = 0
+        self.renameTotalMediaCount = 0
         # self.doesMemoryExists = self.parentWidget.doesMemoryExists # Flag that determines if media code collection file is already present or not yet
         self.eventDirectoryNameChangedWithDropDown = True # Flag that handles media viewer automatically being refreshed when clicking eventDirectoryNameComboBox because its text was set programmatically after selecting date instead of setting the text with dropdown
 
+    def finishStartup(self):
+        # Runs right after the window's first paint, so nothing in here delays the window showing up
         # Fetch media code collection if present
         if self.doesMemoryExists:
             with open(self.memory, "r") as mediaCodeFile:
                 for mediaCode in mediaCodeFile:
                     mediaCode = ''.join(mediaCode.split()) # Removes white spaces including new line for proper displayment. Comment this line and see for yourself
                     self.mediaCodeComboBox.addItem(mediaCode)
+
+        self.decodeService.warmUp() # The first preview doesn't wait for a decoder process to start
+        startupTimer.mark("ready")
+        startupTimer.report()
     
+    @traced
     def browseMediaLocationClicked(self):
         selectedDirectory = QFileDialog.getExistingDirectory(self.inputLayout, "Media Location Directory")
 
         if selectedDirectory: # selectedDirectory is not an empty string
             self.mediaLocationTextBox.setText(selectedDirectory)
-            self.mediaList.clear()
             self.addMediaListItems(selectedDirectory)
     
+    @traced
     def addMediaListItems(self, targetDirectory):
-        self.mediaList.clear()
+        self.clearMediaList()
 
         if path.exists(targetDirectory):
-            scannedItems = scandir(targetDirectory) # From os.scandir
-            sortedScannedItems = list(sorted(scannedItems, key=lambda e: e.stat().st_mtime)) # Sort items based on last modification time, oldest on top and newest on bottom.
+            self.listedDirectory = targetDirectory
+            self.mediaGrid.setMediaDirectory(targetDirectory)
+            self.scanMediaList(targetDirectory) # Only supported image and video files, oldest on top and newest on bottom
 
-            for validFile in sortedScannedItems:
-                if validFile.name.lower().endswith(tuple(supportedImageFormats + supportedVideoFormats)): # Only accepts supported image and video files
-                    self.mediaList.addItem(validFile.name)
-    
+        # Media added or removed outside the app now show up without rescanning everything. A directory that doesn't exist yet
+        # (e.g. an event directory a queued job hasn't created) is listed as soon as it does
+        self.mediaDirectoryWatcher.watchDirectory(targetDirectory)
+
+    def scanMediaList(self, targetDirectory, changesOnly=False):
+        # Scans in the background and streams the media into the list in batches, a newer scan makes older ones stale.
+        # changesOnly only looks at names that are new or gone since the list was filled (directory watcher updates)
+        self.mediaScanGeneration += 1
+
+        if changesOnly:
+            mediaScanTask = MediaChangesTask(targetDirectory, self.mediaScanGeneration, self.mediaListModel.catalog.nameSet, self.mediaOrderingComboBox.currentData(), self.metadataCache)
+        else:
+            mediaScanTask = MediaScanTask(targetDirectory, self.mediaScanGeneration, self.mediaOrderingComboBox.currentData(), self.metadataCache)
+
+        mediaScanTask.setAutoDelete(False) # Python keeps the reference in runningMediaScanTasks until the scan is finished
+        mediaScanTask.signals.batchScanned.connect(self.mediaBatchScanned)
+        mediaScanTask.signals.scanFinished.connect(self.mediaScanFinished)
+        self.runningMediaScanTasks[self.mediaScanGeneration] = mediaScanTask
+        QThreadPool.globalInstance().start(mediaScanTask)
+
+    @traced
+    def mediaBatchScanned(self, scanGeneration, mediaBatch):
+        if scanGeneration == self.mediaScanGeneration:
+            self.mediaListModel.addMedia(mediaBatch)
+
+    @traced
+    def mediaScanFinished(self, scanGeneration, scannedMediaNames):
+        self.finishedMediaScanTasks.append(self.runningMediaScanTasks.pop(scanGeneration, None)) # Released a little later, the scan thread may still be returning from run()
+
+        if scanGeneration != self.mediaScanGeneration:
+            return
+
+        if scannedMediaNames is None: # Listed directory was removed or renamed
+            self.clearMediaList()
+        else:
+            self.mediaListModel.removeMediaNotIn(scannedMediaNames) # Removed (and renamed away) media since the previous scan
+
+    @traced
+    def clearMediaList(self):
+        self.mediaScanGeneration += 1 # Batches of scans that are still running are ignored from now on
+        self.mediaListModel.clearMedia()
+        self.listedDirectory = None
+        self.mediaGrid.setMediaDirectory(None)
+        self.mediaDirectoryWatcher.stopWatching()
+        self.previewLoader.cancelRequest() # Resetting the model drops the current row without a currentChanged signal
+        self.cleanMediaViewer()
+
+    @traced
+    def applyMediaListChanges(self, changedDirectory):
+        # Lists only the names in the background; new media get a stat call and are placed into the order, vanished ones are removed
+        if changedDirectory == self.listedDirectory:
+            forgetMediaSnapshot(changedDirectory) # The watcher also sees changes within the directory mtime's granularity
+            self.scanMediaList(changedDirectory, changesOnly=True)
+        elif self.listedDirectory is None: # The directory that was waited for was just created
+            self.addMediaListItems(changedDirectory)
+
+    @traced
+    def filterMediaList(self):
+        self.mediaFilterProxyModel.setMediaFilter(self.mediaLayout.mediaFilterTextBox.text(), [None, MEDIA_KIND_IMAGE, MEDIA_KIND_VIDEO][self.mediaLayout.mediaKindComboBox.currentIndex()])
+
+    @traced
+    def switchMediaView(self, mediaViewIndex):
+        # List or contact sheet; the contact sheet gets most of the width, the preview still shows the selected media
+        self.mediaLayout.mediaViews.setCurrentIndex(mediaViewIndex)
+        self.mediaLayout.mediaViewerLayout.setColumnStretch(0, 7 if mediaViewIndex == 1 else 4)
+        self.mediaLayout.mediaViewerLayout.setColumnStretch(1, 3 if mediaViewIndex == 1 else 6)
+
+        if mediaViewIndex == 0:
+            self.thumbnailLoader.cancelRequests()
+
+        self.mediaLayout.mediaViews.currentWidget().scrollTo(self.mediaList.currentIndex()) # Keeps the selected media in sight
+
+    @traced
     def browseMediaDestinationClicked(self):
         selectedDirectory = QFileDialog.getExistingDirectory(self.inputLayout, "Media Destination Directory")
 
         if selectedDirectory: # selectedDirectory is not an empty string
             self.mediaDestinationTextBox.setText(selectedDirectory)
 
+    @traced
+    def applyDestinationSettings(self):
+        if not self.mediaDestinationTextBox.text():
+            return
+
+        destinationSettings = loadDestinationSettings(self.mediaDestinationTextBox.text())
+        self.copyConcurrencySpinBox.blockSignals(True) # Avoids writing the value that was just read back to the destination
+        self.copyConcurrencySpinBox.setValue(destinationSettings["copyConcurrency"])
+        self.copyConcurrencySpinBox.blockSignals(False)
+        self.mediaOrderingComboBox.blockSignals(True)
+        self.mediaOrderingComboBox.setCurrentIndex(max(self.mediaOrderingComboBox.findData(destinationSettings["mediaOrdering"]), 0))
+        self.mediaOrderingComboBox.blockSignals(False)
+
+    @traced
+    def saveCopyConcurrency(self, copyConcurrency):
+        if self.mediaDestinationTextBox.text(): # Only destinations that are already chosen can keep their own settings
+            destinationSettings = loadDestinationSettings(self.mediaDestinationTextBox.text())
+            destinationSettings["copyConcurrency"] = copyConcurrency
+            saveDestinationSettings(self.mediaDestinationTextBox.text(), destinationSettings)
+
+    @traced
+    def saveMediaOrdering(self):
+        if self.mediaDestinationTextBox.text():
+            destinationSettings = loadDestinationSettings(self.mediaDestinationTextBox.text())
+            destinationSettings["mediaOrdering"] = self.mediaOrderingComboBox.currentData()
+            saveDestinationSettings(self.mediaDestinationTextBox.text(), destinationSettings)
+
+        if self.listedDirectory is not None: # Re-lists the shown media in the new order
+            self.addMediaListItems(self.listedDirectory)
+
+    @traced
     def showEventDirectories(self):
         yearDirectory, monthDirectory, _ = self.getTargetDirectory()
         eventYear, eventMonth, eventDay = self.eventCalendar.date().year(), self.eventCalendar.date().month(), self.eventCalendar.date().day()
         targetDirectory = f"{self.mediaDestinationTextBox.text()}/{yearDirectory}/{monthDirectory}"
 
+        eventCatalog = self.getEventCatalog(self.mediaDestinationTextBox.text())
+        eventNamesOnDate = eventCatalog.getEventsOn(eventYear, eventMonth, eventDay) if eventCatalog is not None else [] # In-memory lookup, no directory scan on date changes
+
         self.eventDirectoryNameComboBox.clear()
-        self.addEventDirectories(targetDirectory)
+        self.addEventDirectories(eventYear, eventMonth)
 
         if self.showButton.text() == "SHOW MEDIA\nLOCATION":
-            if f"{eventYear}-{eventMonth}-{eventDay}" in self.__eventDatesCollection.keys():
-                eventDirectory = f"{targetDirectory}/{self.eventCalendar.text()}: {self.__eventDatesCollection[f"{eventYear}-{eventMonth}-{eventDay}"]}"
+            if eventNamesOnDate:
+                eventDirectory = f"{targetDirectory}/{self.eventCalendar.text()}: {eventNamesOnDate[-1]}"
 
                 if path.exists(eventDirectory):
-                    self.eventDirectoryNameComboBox.setCurrentText(self.__eventDatesCollection[f"{eventYear}-{eventMonth}-{eventDay}"])
+                    self.eventDirectoryNameComboBox.setCurrentText(eventNamesOnDate[-1])
                     self.eventDirectoryNameChangedWithDropDown = False
                     self.addMediaListItems(eventDirectory)
                 else:
                     # self.eventDirectoryNameComboBox.setCurrentText()
-                    self.mediaList.clear()
+                    self.clearMediaList()
                     self.eventDirectoryNameComboBox.clear()
             else:
-                self.mediaList.clear()
+                self.clearMediaList()
                 self.eventDirectoryNameComboBox.setCurrentText("")
         else:
-            if f"{eventYear}-{eventMonth}-{eventDay}" in self.__eventDatesCollection.keys():
-                eventDirectory = f"{targetDirectory}/{self.eventCalendar.text()}: {self.__eventDatesCollection[f"{eventYear}-{eventMonth}-{eventDay}"]}"
+            if eventNamesOnDate:
+                eventDirectory = f"{targetDirectory}/{self.eventCalendar.text()}: {eventNamesOnDate[-1]}"
 
                 if path.exists(eventDirectory):
-                    self.eventDirectoryNameComboBox.setCurrentText(self.__eventDatesCollection[f"{eventYear}-{eventMonth}-{eventDay}"])
+                    self.eventDirectoryNameComboBox.setCurrentText(eventNamesOnDate[-1])
                     self.eventDirectoryNameChangedWithDropDown = False
                 else:
                     self.eventDirectoryNameComboBox.setCurrentText("")
@@ -113,23 +282,55 @@ class Worker(QObject): # QObject makes this class pure-logic only class while st
 
         return yearDirectory, monthDirectory, eventDirectory
     
-    def addEventDirectories(self, targetDirectory, eventDirectoryCounter=0):
-        if path.exists(targetDirectory):
-            scannedItems = scandir(targetDirectory)
-            sortedScannedItems = list(sorted(scannedItems, key=lambda e: e.stat().st_mtime)) # List all directories based from last modified (creation) date. Oldest on top, newest on bottom
+    @traced
+    def addEventDirectories(self, eventYear, eventMonth):
+        eventCatalog = self.getEventCatalog(self.mediaDestinationTextBox.text())
+        eventsInMonth = eventCatalog.getEventsInMonth(eventYear, eventMonth) if eventCatalog is not None else []
+
+        if eventsInMonth:
             self.eventDirectoryNameComboBox.addItem("")
-            self.__eventDatesCollection.clear()
-
-            for scannedItem in sortedScannedItems:
-                if scannedItem.is_dir():
-                    eventName = scannedItem.name[12:]
-                    eventYear = int(scannedItem.name[0:4])
-                    eventMonth = int(scannedItem.name[5:7])
-                    eventDay = int(scannedItem.name[8:10])
-                    
-                    self.eventDirectoryNameComboBox.addItem(eventName, {"date": (eventYear, eventMonth, eventDay)})
-                    self.__eventDatesCollection[f"{eventYear}-{eventMonth}-{eventDay}"] = eventName # Dictionary as reference for automatically setting event directory name when an event happened in the chosen event date
-    
+
+            for eventName, eventYear, eventMonth, eventDay in eventsInMonth: # Oldest event on top, newest on bottom
+                self.eventDirectoryNameComboBox.addItem(eventName, {"date": (eventYear, eventMonth, eventDay)})
+
+    @traced
+    def getEventCatalog(self, mediaRootDirectory):
+        # Loaded once per media root destination. Date changes and searches refresh it at most every CATALOG_REFRESH_INTERVAL_SECONDS,
+        # which only stats the root, Year and Month directories, so event directories made or renamed outside the app show up too
+        if not mediaRootDirectory or not path.isdir(mediaRootDirectory):
+            self.eventCatalog = None
+            return None
+
+        if self.eventCatalog is None or self.eventCatalog.mediaRootDirectory != path.normpath(mediaRootDirectory):
+            self.eventCatalog = EventCatalog(mediaRootDirectory, self.eventMonths)
+            self.eventCatalogRefreshTime = None
+
+        if self.eventCatalogRefreshTime is None or time.monotonic() - self.eventCatalogRefreshTime >= CATALOG_REFRESH_INTERVAL_SECONDS:
+            self.eventCatalog.refresh() # Only rescans Year/Month directories whose mtime changed since the last visit
+            self.eventCatalogRefreshTime = time.monotonic()
+
+        return self.eventCatalog
+
+    @traced
+    def searchEvents(self, searchText):
+        eventCatalog = self.getEventCatalog(self.mediaDestinationTextBox.text())
+        foundEvents = eventCatalog.findEvents(searchText) if eventCatalog is not None and searchText.strip() else []
+        self.inputLayout.eventSearchModel.setStringList([f"{eventYear:04d}-{eventMonth:02d}-{eventDay:02d}: {eventName}" for eventName, eventYear, eventMonth, eventDay in foundEvents[-200:]]) # Newest 200 matches are plenty for a popup
+
+    @traced
+    def jumpToEvent(self, foundEvent):
+        matchedEventDirectory = eventDirectoryPattern.match(foundEvent)
+
+        if matchedEventDirectory is None:
+            return
+
+        eventYear, eventMonth, eventDay, eventName = matchedEventDirectory.groups()
+        self.eventCalendar.setDate(QDate(int(eventYear), int(eventMonth), int(eventDay))) # Triggers showEventDirectories() which fills in the events of that month
+        self.eventDirectoryNameComboBox.setCurrentIndex(max(self.eventDirectoryNameComboBox.findText(eventName), 0)) # Several events can share a date
+        self.eventDirectoryNameChangedWithDropDown = True
+        self.adjustEventDate()
+
+    @traced
     def addNewMediaCode(self):
         newCode, codeAdded = QInputDialog.getText(self.inputLayout, "New Media Code", "Keep it short.") # newCode = string (code name itself); codeAdded = boolean value (True or False)
         
@@ -154,6 +355,7 @@ class Worker(QObject): # QObject makes this class pure-logic only class while st
         except Exception as e:
             QMessageBox.information(self.parentWidget, "Error!", f"You got an error that says: {e}")
     
+    @traced
     def adjustEventDate(self):
         if self.eventDirectoryNameComboBox.currentText(): # eventDirectoryName text is not an empty string
             eventData = self.eventDirectoryNameComboBox.currentData()
@@ -176,10 +378,11 @@ class Worker(QObject): # QObject makes this class pure-logic only class while st
             self.eventCalendar.blockSignals(False) # Reconnects to showEventDirectories()
             
             if self.showButton.text() == "SHOW MEDIA\nLOCATION":
-                self.mediaList.clear()
+                self.clearMediaList()
     
+    @traced
     def imageSelected(self):
-        currentItemSelected = self.mediaList.currentItem()
+        currentMediaIndex = self.mediaList.currentIndex()
         self.cleanMediaViewer()
 
         if self.showButton.text() == "SHOW MEDIA\nLOCATION":
@@ -188,126 +391,408 @@ class Worker(QObject): # QObject makes this class pure-logic only class while st
         else:
             targetMediaDirectory = self.mediaLocationTextBox.text()
 
-        if currentItemSelected is not None:
-            imageItem = self.mediaList.currentItem().text()
+        if not currentMediaIndex.isValid():
+            self.previewLoader.cancelRequest()
+        else:
+            imageItem = currentMediaIndex.data()
 
             if targetMediaDirectory:
                 mediaPath = f"{targetMediaDirectory}/{imageItem}"
-                ext = os.path.splitext(mediaPath)[1].lower()
-
-                # ✅ Handle HEIC/HEIF images via Pillow
-                if ext in [".heic", ".heif"]:
-                    try:
-                        image = Image.open(mediaPath)
-                        buf = QByteArray()
-                        buffer = QBuffer(buf)
-                        buffer.open(QBuffer.OpenModeFlag.WriteOnly)
-                        image.save(buffer, format="PNG")
-                        mediaPixmap = QPixmap()
-                        mediaPixmap.loadFromData(buf)
-                    except Exception as e:
-                        print(f"Error loading HEIC image: {e}")
-                        mediaPixmap = QPixmap(getResourcePath("assets/images/no_preview.png"))
-
-                elif ext in supportedImageFormats:
-                    mediaPixmap = QPixmap(mediaPath)
+                currentRow = currentMediaIndex.row()
+                neighborRows = [neighborRow for distance in range(1, PREFETCH_DISTANCE + 1) for neighborRow in (currentRow + distance, currentRow - distance) if 0 <= neighborRow < self.mediaFilterProxyModel.rowCount()] # Nearest first, next before previous; rows of the filtered list
+                self.previewLoader.requestPreview(mediaPath, [f"{targetMediaDirectory}/{self.mediaFilterProxyModel.index(neighborRow, 0).data()}" for neighborRow in neighborRows]) # Decodes in the background, showPreview() displays it once it's ready
 
-                else:
-                    mediaPixmap = QPixmap(getResourcePath("assets/images/no_preview.png"))
+    @traced
+    def showPreview(self, mediaPath, mediaImage):
+        # Display the image
+        self.mediaLabel.setMedia(QPixmap.fromImage(mediaImage))
 
-                # Display the image
-                self.mediaLabel = ResponsiveMedia(mediaPixmap)
-                self.mediaLayout.mediaBox.addWidget(self.mediaLabel)
-                self.mediaLayout.mediaBoxFrame.setLayout(self.mediaLayout.mediaBox)
-    
     def cleanMediaViewer(self):
-        # Deletes all widgets added to mediaBox layout
-        while self.mediaLayout.mediaBox.count():
-            item = self.mediaLayout.mediaBox.takeAt(0)
-            itemWidget = item.widget()
-            
-            if itemWidget is not None:
-                itemWidget.deleteLater()
+        # Empties the preview widget; it stays in mediaBox layout and gets reused for the next preview
+        self.mediaLabel.clearMedia()
     
+    @traced
     def renameMedia(self):
         inputComplete = self.mediaLocationTextBox.text() != "" and self.mediaDestinationTextBox.text() != "" and self.eventDirectoryNameComboBox.currentText() != "" and self.mediaCode.currentText() != "" # Determines if all required inputs are complete
 
         # Only rename if all required inputs are complete
         if inputComplete:
-            mediaToBeRenamed = scandir(self.mediaLocationTextBox.text()) # From os.scandir
-            sortedMediaToBeRenamed = list(sorted(mediaToBeRenamed, key=lambda e: e.stat().st_mtime)) # Sort media based on last modified time, oldest on top and newest on bottom.
-            mediaToBeRenamedCount = len([mediaFile for mediaFile in sortedMediaToBeRenamed if mediaFile.name.lower().endswith(tuple(supportedImageFormats + supportedVideoFormats))]) # Counts all supported media files
+            if self.ingestQueue is not None and self.ingestQueue.isQueued(self.mediaLocationTextBox.text()):
+                QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "This media location is already in the ingest queue.")
+                return
+
+            self.renameMediaDestinations = None # Everything goes into the selected event directory
+
+            # A job that was interrupted (crash, power loss, unplugged drive) or cancelled can be finished first without rescanning or renumbering
+            for resumableJournal in getResumableJournals(self.mediaDestinationTextBox.text()):
+                pendingMediaCount = len(resumableJournal.plannedMedia) - resumableJournal.getDoneCount()
+                resumeConfirmation = QMessageBox.question(self.parentWidget, "Resume Rename?", f"A previous rename of {pendingMediaCount} more media from {resumableJournal.jobInfo['source']} into {resumableJournal.jobInfo['destination']} was {resumableJournal.state}.\n\nResume it now? Choosing No forgets about it; it can still be undone.")
+
+                if resumeConfirmation == QMessageBox.StandardButton.Yes:
+                    self.renameDestinationDirectory = resumableJournal.jobInfo["destination"]
+                    self.renameMediaCount = pendingMediaCount
+                    self.renameButton.setEnabled(False)
+                    self.splitButton.setEnabled(False)
+                    self.showButton.setEnabled(False)
+                    self.undoButton.setEnabled(False)
+                    self.startRenameJob({}, resumableJournal)
+                    return
+
+                resumableJournal.setState("abandoned")
+                resumableJournal.close()
+
+            mediaToBeRenamedCount = countMedia(self.mediaLocationTextBox.text()) # Counts all supported media files from the media list's snapshot; sorting and stat calls happen in the background job
+
             yearDirectory, monthDirectory, eventDirectory = self.getTargetDirectory()
             fullNewMediaDestinationDirectory = f"{self.mediaDestinationTextBox.text()}/{yearDirectory}/{monthDirectory}/{eventDirectory}"
-            mediaNumberStartingCount = self.getCurrentNumberOfMedia(self.mediaLocationTextBox.text(), self.mediaDestinationTextBox.text()) + 1
 
             if mediaToBeRenamedCount > 0: # There is at least 1 supported media file to be renamed
-                operationConfirmation = QMessageBox.question(self.parentWidget, "Rename Media?", "Are you sure you want to rename media?")
-                
-                if operationConfirmation == QMessageBox.StandardButton.Yes:
-                    if not path.isdir(fullNewMediaDestinationDirectory): # Make directory if it does not exists yet
-                        makedirs(fullNewMediaDestinationDirectory) # From os.makedirs; makedirs instead of mkdir for nested directories
-
-                    for mediaFile in sortedMediaToBeRenamed:
-                        oldMediaName = f"{self.mediaLocationTextBox.text()}/{mediaFile.name}"
-                        _, newMediaNameExtension = path.splitext(oldMediaName) # From os.path; Get the file extension and ignore root directory
-                        
-                        if mediaFile.name.lower().endswith(tuple(supportedImageFormats + supportedVideoFormats)): # Only renames supported media files
-                            newMediaName = f"{fullNewMediaDestinationDirectory}/{self.mediaCode.currentText()}_{str(mediaNumberStartingCount)}{newMediaNameExtension}"
-
-                            # Handles moving and renaming files with care
-                            try:
-                                rename(oldMediaName, newMediaName) # From os.rename
-                                print(f"{mediaFile.name} successfully renamed to {self.mediaCode.currentText()}_{str(mediaNumberStartingCount)}{newMediaNameExtension}")
-                                mediaNumberStartingCount += 1
-                            except OSError as ose: # OS related errors
-                                if ose.errno == 18: # Invalid cross-device link
-                                    move(oldMediaName, newMediaName) # From shutil.move (fallback if rename() didn't work)
-                                    print(f"{mediaFile.name} successfully renamed to {self.mediaCode.currentText()}_{str(mediaNumberStartingCount)}{newMediaNameExtension}")
-                                    mediaNumberStartingCount += 1
-                                else:
-                                    print(f"The error code is: {ose.errno}")
-                            except Exception as e: # General error catching
-                                print(f"You got an error: {e}")
-
-                    # Cleans media list and media viewer and refreshes event directory names
-                    self.mediaList.clear()
-                    self.cleanMediaViewer()
-                    self.showButton.setText("SHOW MEDIA\nDESTINATION")
-                    self.showEventDirectories() # Refreshes event directory names for cases where the previous selected event directory name was sanitized (Changed normal slashes with division slashes to avoid folder hierarchy disruption)
-                    QTimer.singleShot(50, lambda: QMessageBox.information(self.buttonsLayout, "Operation Successful!", "Renaming media complete!")) # Delays the notification to flush the widgets inside the media container (self.mediaLayout.mediaBox) by 50ms
-                else:
-                    QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Operation was cancelled.")
+                # Media that are already in the library are found first (on a worker thread), the user decides what happens to them.
+                # Nothing moves before the user confirmed the rename plan, see renamePlanned()
+                self.renameDestinationDirectory = fullNewMediaDestinationDirectory
+                self.renameMediaCount = mediaToBeRenamedCount
+                self.renameButton.setEnabled(False)
+                self.splitButton.setEnabled(False)
+                self.showButton.setEnabled(False)
+                self.undoButton.setEnabled(False)
+                self.startDuplicateCheck()
             else:
                 QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Media Location directory is empty! No media to be renamed.")
         else:
             QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Make sure all required information are available!")
 
-    def getCurrentNumberOfMedia(self, mediaLocationDirectory, mediaRootDirectory):
-        mediaCount = 0
+    def startDuplicateCheck(self):
+        self.duplicateCheckJob = DuplicateCheckJob(self.mediaLocationTextBox.text(), self.getHashIndex(self.mediaDestinationTextBox.text()))
+        self.duplicateCheckJob.signals.stage.connect(self.duplicateCheckProgressed)
+        self.duplicateCheckJob.signals.finished.connect(self.duplicateCheckFinished)
+        self.duplicateCheckJob.signals.failed.connect(self.renameFailed)
+        self.buttonsLayout.showRenameProgress(0) # Busy indicator until the duplicate check is done
+        self.cancelButton.setEnabled(False) # Nothing has been moved yet, the check itself can't be cancelled halfway
+        self.renameProgressBar.setFormat("Checking for duplicates...")
+        QThreadPool.globalInstance().start(self.duplicateCheckJob)
+
+    @traced
+    def splitIntoEvents(self):
+        # Like renameMedia(), but the media location is split into events by capture time gaps instead of going into one event directory
+        inputComplete = self.mediaLocationTextBox.text() != "" and self.mediaDestinationTextBox.text() != "" and self.mediaCode.currentText() != "" # Event names come from the proposed events
+
+        if not inputComplete:
+            QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Make sure all required information are available!")
+            return
+
+        if self.ingestQueue is not None and self.ingestQueue.isQueued(self.mediaLocationTextBox.text()):
+            QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "This media location is already in the ingest queue.")
+            return
+
+        if self.renameJob is not None or self.undoJob is not None:
+            QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Wait for the running rename or undo to finish first.")
+            return
+
+        self.segmentationJob = SegmentationJob(self.mediaLocationTextBox.text(), self.metadataCache)
+        self.segmentationJob.signals.finished.connect(self.segmentationFinished)
+        self.segmentationJob.signals.failed.connect(self.renameFailed)
+        self.renameButton.setEnabled(False)
+        self.showButton.setEnabled(False)
+        self.undoButton.setEnabled(False)
+        self.splitButton.setEnabled(False)
+        self.buttonsLayout.showRenameProgress(0) # Busy indicator while capture times are read
+        self.cancelButton.setEnabled(False)
+        self.renameProgressBar.setFormat("Reading capture times...")
+        QThreadPool.globalInstance().start(self.segmentationJob)
+
+    @traced
+    def segmentationFinished(self, captureTimeline):
+        self.segmentationJob = None
+        mediaDestinations = {}
+
+        if len(captureTimeline) > 0:
+            segmentationDialog = SegmentationDialog(captureTimeline, self.getEventCatalog(self.mediaDestinationTextBox.text()), self.parentWidget)
+
+            if segmentationDialog.exec() == QDialog.DialogCode.Accepted:
+                mediaDestinations = getMediaDestinations(captureTimeline, segmentationDialog.getEventProposals(), self.mediaDestinationTextBox.text())
+
+                if not mediaDestinations:
+                    QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "None of the events has a name! No media to be renamed.")
+            else:
+                QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Operation was cancelled.")
+        else:
+            QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Media Location directory is empty! No media to be renamed.")
+
+        if not mediaDestinations:
+            self.renameButton.setEnabled(True)
+            self.splitButton.setEnabled(True)
+            self.showButton.setEnabled(True)
+            self.undoButton.setEnabled(True)
+            self.buttonsLayout.hideRenameProgress()
+            return
+
+        # All events are renamed in one job: one scan, one run of CODE_N numbers in shooting order and one journal to undo
+        self.renameDestinationDirectory = self.mediaDestinationTextBox.text()
+        self.renameMediaDestinations = mediaDestinations
+        self.renameMediaCount = len(mediaDestinations)
+        self.startDuplicateCheck()
+
+    @traced
+    def duplicateCheckProgressed(self, stageName, candidateCount):
+        self.renameProgressBar.setFormat(f"Checking for duplicates  •  {candidateCount} candidates  •  {'first/last block' if stageName == 'partial' else 'full'} hash")
+
+    @traced
+    def duplicateCheckFinished(self, duplicateMedia):
+        self.duplicateCheckJob = None
+        duplicateActions = {}
+
+        if duplicateMedia:
+            duplicateDialog = DuplicateDialog(duplicateMedia, self.mediaDestinationTextBox.text(), self.parentWidget)
+
+            if duplicateDialog.exec() != QDialog.DialogCode.Accepted:
+                self.renameButton.setEnabled(True)
+                self.splitButton.setEnabled(True)
+                self.showButton.setEnabled(True)
+                self.undoButton.setEnabled(True)
+                self.buttonsLayout.hideRenameProgress()
+                QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Operation was cancelled.")
+                return
+
+            duplicateActions = duplicateDialog.getDuplicateActions()
+
+        self.startRenamePlan(duplicateActions)
+
+    def getRenameMediaOrdering(self):
+        return self.mediaOrderingComboBox.currentData() if self.renameMediaDestinations is None else "capture" # Split events are numbered in the order they were shot, like they were found
+
+    def startRenamePlan(self, duplicateActions):
+        # Plans every new name on a worker thread (milliseconds, the media location's snapshot is still fresh from the duplicate check)
+        self.renameDuplicateActions = duplicateActions
+        self.renamePlanJob = RenamePlanJob(self.mediaLocationTextBox.text(), self.renameDestinationDirectory, self.mediaCode.currentText(), self.getMediaIndex(self.mediaDestinationTextBox.text()), self.getRenameMediaOrdering(), self.metadataCache, duplicateActions, self.renameMediaDestinations)
+        self.renamePlanJob.signals.finished.connect(self.renamePlanned)
+        self.renamePlanJob.signals.failed.connect(self.renameFailed)
+        self.renameProgressBar.setFormat("Planning new names...")
+        QThreadPool.globalInstance().start(self.renamePlanJob)
+
+    @traced
+    def renamePlanned(self, renamePlan):
+        renamePlanJob, self.renamePlanJob = self.renamePlanJob, None
+        renamePlanDialog = RenamePlanDialog(renamePlan, self.mediaDestinationTextBox.text(), self.parentWidget)
+
+        if renamePlanDialog.exec() != QDialog.DialogCode.Accepted:
+            renamePlanJob.organizeJob.dropRenamePlan(renamePlan)
+            self.renameButton.setEnabled(True)
+            self.splitButton.setEnabled(True)
+            self.showButton.setEnabled(True)
+            self.undoButton.setEnabled(True)
+            self.buttonsLayout.hideRenameProgress()
+            QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Operation was cancelled.")
+            return
+
+        self.startRenameJob(self.renameDuplicateActions, renamePlan=renamePlan)
+
+    def startRenameJob(self, duplicateActions, resumeJournal=None, renamePlan=None):
+        # Runs the whole rename/move loop on a worker thread so the media list and preview stay usable
+        self.renameJob = RenameJob(self.mediaLocationTextBox.text(), self.renameDestinationDirectory, self.mediaCode.currentText(), self.getMediaIndex(self.mediaDestinationTextBox.text()), self.copyConcurrencySpinBox.value(), self.getRenameMediaOrdering(), self.metadataCache, duplicateActions, resumeJournal, self.renameMediaDestinations, renamePlan)
+        self.renameJob.signals.started.connect(self.renameStarted)
+        self.renameJob.signals.progress.connect(self.renameProgressed)
+        self.renameJob.signals.finished.connect(self.renameFinished)
+        self.renameJob.signals.failed.connect(self.renameFailed)
+        self.buttonsLayout.showRenameProgress(len(renamePlan.plannedMedia) if renamePlan is not None else self.renameMediaCount)
+        QThreadPool.globalInstance().start(self.renameJob)
+
+    @traced
+    def queueMedia(self):
+        # Adds the current inputs to the ingest queue and frees the inputs for the next card right away
+        inputComplete = self.mediaLocationTextBox.text() != "" and self.mediaDestinationTextBox.text() != "" and self.eventDirectoryNameComboBox.currentText() != "" and self.mediaCode.currentText() != "" # Determines if all required inputs are complete
 
-        # rootDirectory = current directory being browsed
-        # mediaFiles = files under rootDirectory
-        for rootDirectory, _, mediaFiles in walk(mediaRootDirectory):
-            if rootDirectory != mediaLocationDirectory: # Count items inside if the current directory being browsed and the mediaLocationDirectory are not the same (use case: only renaming files)
-                for mediaFile in mediaFiles:
-                    if mediaFile.lower().endswith(tuple(supportedImageFormats + supportedVideoFormats)):
-                        mediaCount += 1
-        
-        return mediaCount
+        if not inputComplete:
+            QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Make sure all required information are available!")
+            return
+
+        if self.ingestQueue is None:
+            self.ingestQueue = IngestQueue()
+            self.ingestQueueSignals = IngestQueueSignals()
+            self.ingestQueue.onJobChanged = self.ingestQueueSignals.jobChanged.emit
+            self.ingestQueue.onQueueFinished = self.ingestQueueSignals.queueFinished.emit
+            self.ingestQueueSignals.jobChanged.connect(self.ingestJobChanged)
+            self.ingestQueueSignals.queueFinished.connect(self.ingestQueueFinished)
+            self.ingestDialog = IngestDialog(self.ingestQueue, self.parentWidget)
+
+        mediaLocationDirectory = self.mediaLocationTextBox.text()
+
+        if self.ingestQueue.isQueued(mediaLocationDirectory) or (self.renameJob is not None and path.normpath(self.renameJob.organizeJob.mediaLocationDirectory) == path.normpath(mediaLocationDirectory)):
+            QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "This media location is already being renamed.")
+            return
+
+        yearDirectory, monthDirectory, eventDirectory = self.getTargetDirectory()
+        mediaRootDirectory = self.mediaDestinationTextBox.text()
+
+        try:
+            self.ingestQueue.addJob(mediaLocationDirectory, f"{mediaRootDirectory}/{yearDirectory}/{monthDirectory}/{eventDirectory}", self.mediaCode.currentText(), self.getMediaIndex(mediaRootDirectory), self.copyConcurrencySpinBox.value(), self.mediaOrderingComboBox.currentData(), self.metadataCache, self.ingestDialog.getDuplicateAction(), self.getHashIndex(mediaRootDirectory))
+        except OSError as ose: # Media location vanished (card pulled) between browsing and queueing
+            QMessageBox.warning(self.buttonsLayout, "Operation Failed!", f"Could not queue media location: {ose}")
+            return
+
+        self.ingestDialog.show()
+        self.ingestDialog.raise_()
+
+    @traced
+    def ingestJobChanged(self, ingestJob):
+        self.ingestDialog.showJob(ingestJob)
+
+        if ingestJob.state not in ("queued", "running"):
+            self.previewLoader.clearDecodedPreviews() # Renamed media may reuse paths of media that were decoded before
+            self.thumbnailLoader.clearThumbnails()
+
+            if self.eventCatalog is not None:
+                self.eventCatalog.refresh() # Picks up the event directory the job just created, the inputs are left alone for the next card
+
+    @traced
+    def ingestQueueFinished(self):
+        self.ingestDialog.showThroughput()
+        self.refreshLibraryStats()
+
+    @traced
+    def cancelRenameMedia(self):
+        for runningJob in (self.renameJob, self.undoJob):
+            if runningJob is not None:
+                runningJob.cancel()
+                self.cancelButton.setEnabled(False) # Cancelling only takes effect after the file currently being moved
+
+    @traced
+    def renameStarted(self, totalMediaCount, totalMediaBytes):
+        self.renameTotalMediaCount = totalMediaCount
+        self.renameProgressBar.setMaximum(max(totalMediaCount, 1))
+
+    @traced
+    def renameProgressed(self, renamedMediaCount, renamedMediaBytes, filesPerSecond, megabytesPerSecond, secondsLeft):
+        minutesLeft, secondsLeft = divmod(int(secondsLeft), 60)
+        self.renameProgressBar.setValue(renamedMediaCount)
+        self.renameProgressBar.setFormat(f"{renamedMediaCount}/{self.renameTotalMediaCount} media  •  {filesPerSecond:.1f} files/s  •  {megabytesPerSecond:.1f} MB/s  •  ETA {minutesLeft}:{secondsLeft:02d}")
+        tracer.addCounter("renameThroughput", filesPerSecond=round(filesPerSecond, 1), megabytesPerSecond=round(megabytesPerSecond, 1))
+
+    @traced
+    def renameFinished(self, wasCancelled, organizeResult):
+        self.renameJob = None
+        self.previewLoader.clearDecodedPreviews() # Renamed media may reuse paths of media that were decoded before
+        self.thumbnailLoader.clearThumbnails()
+
+        if self.eventCatalog is not None:
+            self.eventCatalog.refresh() # Picks up the event directory that was just created
+        self.refreshLibraryStats()
+        self.renameButton.setEnabled(True)
+        self.splitButton.setEnabled(True)
+        self.showButton.setEnabled(True)
+        self.undoButton.setEnabled(True)
+        self.buttonsLayout.hideRenameProgress()
+
+        # Cleans media list and media viewer and refreshes event directory names
+        self.clearMediaList()
+        self.cleanMediaViewer()
+        self.showButton.setText("SHOW MEDIA\nDESTINATION")
+        self.showEventDirectories() # Refreshes event directory names for cases where the previous selected event directory name was sanitized (Changed normal slashes with division slashes to avoid folder hierarchy disruption)
+
+        if wasCancelled:
+            QTimer.singleShot(50, lambda: QMessageBox.warning(self.buttonsLayout, "Operation Cancelled!", "Renaming media was cancelled. Media that were not renamed yet are still in the media location.")) # Delays the notification to flush the widgets inside the media container (self.mediaLayout.mediaBox) by 50ms
+        else:
+            duplicateSummary = f"\n\n{len(organizeResult['skipped'])} duplicates skipped, {len(organizeResult['linked'])} linked, {getReadableSize(organizeResult['bytesSaved'])} saved." if organizeResult["skipped"] or organizeResult["linked"] else ""
+            eventSummary = f"\n\nMedia went into {len(organizeResult['destinations'])} event directories." if len(organizeResult["destinations"]) > 1 else ""
+            QTimer.singleShot(50, lambda: QMessageBox.information(self.buttonsLayout, "Operation Successful!", f"Renaming media complete!{eventSummary}{duplicateSummary}")) # Delays the notification to flush the widgets inside the media container (self.mediaLayout.mediaBox) by 50ms
+
+    @traced
+    def renameFailed(self, errorMessage):
+        self.renameJob = None
+        self.duplicateCheckJob = None
+        self.renamePlanJob = None
+        self.segmentationJob = None
+        self.undoJob = None
+        self.splitButton.setEnabled(True)
+        self.renameButton.setEnabled(True)
+        self.showButton.setEnabled(True)
+        self.undoButton.setEnabled(True)
+        self.buttonsLayout.hideRenameProgress()
+        QMessageBox.information(self.parentWidget, "Error!", f"You got an error that says: {errorMessage}")
+
+    @traced
+    def undoLastRename(self):
+        if self.mediaDestinationTextBox.text() == "":
+            QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "Make sure the media destination is available!")
+            return
+
+        renameJournal = getUndoableJournal(self.mediaDestinationTextBox.text())
+
+        if renameJournal is None:
+            QMessageBox.warning(self.buttonsLayout, "Operation Failed!", "There is no rename to undo in this media destination.")
+            return
+
+        undoConfirmation = QMessageBox.question(self.parentWidget, "Undo Rename?", f"Move {renameJournal.getDoneCount()} media from {renameJournal.jobInfo['destination']} back to {renameJournal.jobInfo['source']} under their original names?")
+
+        if undoConfirmation != QMessageBox.StandardButton.Yes:
+            return
+
+        # Replays the job's journal in reverse on a worker thread, same progress bar and cancel button as renaming
+        self.undoJob = UndoJob(renameJournal)
+        self.undoJob.signals.progress.connect(self.undoProgressed)
+        self.undoJob.signals.finished.connect(self.undoFinished)
+        self.undoJob.signals.failed.connect(self.renameFailed)
+        self.renameButton.setEnabled(False)
+        self.splitButton.setEnabled(False)
+        self.showButton.setEnabled(False)
+        self.undoButton.setEnabled(False)
+        self.buttonsLayout.showRenameProgress(renameJournal.getDoneCount())
+        self.renameProgressBar.setFormat("Undoing...")
+        QThreadPool.globalInstance().start(self.undoJob)
+
+    @traced
+    def undoProgressed(self, undoneMediaCount, totalMediaCount):
+        self.renameProgressBar.setMaximum(max(totalMediaCount, 1))
+        self.renameProgressBar.setValue(undoneMediaCount)
+        self.renameProgressBar.setFormat(f"Undoing  •  {undoneMediaCount}/{totalMediaCount} media restored")
+
+    @traced
+    def undoFinished(self, wasCancelled, failedMedia):
+        self.undoJob = None
+        self.previewLoader.clearDecodedPreviews() # Restored media reuse their old paths
+        self.thumbnailLoader.clearThumbnails()
+
+        if self.eventCatalog is not None:
+            self.eventCatalog.refresh() # The event directory may be gone again
+        self.refreshLibraryStats()
+        self.renameButton.setEnabled(True)
+        self.splitButton.setEnabled(True)
+        self.showButton.setEnabled(True)
+        self.undoButton.setEnabled(True)
+        self.buttonsLayout.hideRenameProgress()
+        self.clearMediaList()
+        self.cleanMediaViewer()
+        self.showButton.setText("SHOW MEDIA\nDESTINATION")
+        self.showEventDirectories()
+
+        if wasCancelled:
+            QTimer.singleShot(50, lambda: QMessageBox.warning(self.buttonsLayout, "Operation Cancelled!", "Undo was cancelled. Pressing UNDO again restores the rest."))
+        elif failedMedia:
+            QTimer.singleShot(50, lambda: QMessageBox.warning(self.buttonsLayout, "Operation Failed!", f"{len(failedMedia)} media could not be restored, e.g. {failedMedia[0][0]}: {failedMedia[0][1]}"))
+        else:
+            QTimer.singleShot(50, lambda: QMessageBox.information(self.buttonsLayout, "Operation Successful!", "Undo complete! Media are back in the media location."))
 
+    def getMediaIndex(self, mediaRootDirectory):
+        self.mediaIndex = getMediaIndex(mediaRootDirectory, self.mediaIndex)
+
+        return self.mediaIndex
+
+    def getHashIndex(self, mediaRootDirectory):
+        self.hashIndex = getHashIndex(mediaRootDirectory, self.hashIndex)
+
+        return self.hashIndex
+
+    @traced
     def showDirectoryContents(self):
         inputComplete = self.mediaLocationTextBox.text() != "" and self.mediaDestinationTextBox.text() != "" and self.eventDirectoryNameComboBox.currentText() != "" and self.mediaCode.currentText() != "" # Determines if all required inputs are complete
 
         if inputComplete:
-            self.mediaList.clear() # Refreshes the media list items
+            self.clearMediaList() # Refreshes the media list items
 
             if self.showButton.text() == "SHOW MEDIA\nDESTINATION":
                 yearDirectory, monthDirectory, eventDirectory = self.getTargetDirectory()
                 fullNewMediaDestinationDirectory = f"{self.mediaDestinationTextBox.text()}/{yearDirectory}/{monthDirectory}/{eventDirectory}"
 
-                if path.exists(f"{fullNewMediaDestinationDirectory}"): # This means media from media location were already renamed and moved to media destination
-                    self.addMediaListItems(fullNewMediaDestinationDirectory)
+                self.addMediaListItems(fullNewMediaDestinationDirectory) # Lists the event directory if media were already moved there, otherwise waits for it to be created
                     
                 self.showButton.setText("SHOW MEDIA\nLOCATION")
             else:
@@ -316,16 +801,80 @@ class Worker(QObject): # QObject makes this class pure-logic only class while st
         else:
             QMessageBox.warning(self.parentWidget, "Operation Failed!", "Make sure all required information are available!")
 
+    def showLibraryStats(self):
+        mediaRootDirectory = self.mediaDestinationTextBox.text()
+
+        if mediaRootDirectory == "" or not path.isdir(mediaRootDirectory):
+            QMessageBox.warning(self.parentWidget, "Operation Failed!", "Choose an existing media root destination first!")
+            return
+
+        mediaIndex = self.getMediaIndex(mediaRootDirectory)
+
+        if self.statsDialog is None or self.statsDialog.mediaIndex is not mediaIndex: # Another media root destination, its index has its own statistics
+            if self.statsDialog is not None:
+                self.statsDialog.close()
+
+            self.statsDialog = LibraryStatsDialog(mediaIndex, self.parentWidget)
+
+        self.statsDialog.show()
+        self.statsDialog.raise_()
+        self.statsDialog.loadStats()
+
+    def refreshLibraryStats(self):
+        # An open statistics window follows the app's own renames and undos
+        if self.statsDialog is not None and self.statsDialog.isVisible():
+            self.statsDialog.loadStats()
+
+    def showTracePanel(self):
+        # Not traced itself, so opening the panel doesn't show up as one of the slowest operations
+        if self.tracePanel is None:
+            self.tracePanel = TracePanel(self.parentWidget)
+
+        self.tracePanel.show()
+        self.tracePanel.raise_()
+
 class ResponsiveMedia(QLabel):
+    RESIZE_DEBOUNCE_MS = 120 # Smooth rescaling waits until the window edge stops moving
+    MIP_MAX_DIMENSION = 1024 # Small copy of the preview that fast-scales while resizing
+
     # Gets executed upon creating an instance of the class
-    def __init__(self, originalMedia: QPixmap):
+    def __init__(self, originalMedia: QPixmap = None):
         super().__init__()
-        self.originalMedia = originalMedia
         self.setAlignment(Qt.AlignmentFlag.AlignCenter)
-    
+        self.resizeTimer = QTimer(self)
+        self.resizeTimer.setSingleShot(True)
+        self.resizeTimer.setInterval(self.RESIZE_DEBOUNCE_MS)
+        self.resizeTimer.timeout.connect(self.scaleMediaSmoothly)
+        self.setMedia(originalMedia)
+
+    def setMedia(self, originalMedia: QPixmap):
+        # The same widget is reused for every selection instead of creating and deleting one per preview
+        self.originalMedia = originalMedia if originalMedia is not None and not originalMedia.isNull() else None
+        self.mediaMip = None
+
+        if self.originalMedia is None:
+            self.clear()
+            return
+
+        if max(self.originalMedia.width(), self.originalMedia.height()) > self.MIP_MAX_DIMENSION:
+            self.mediaMip = self.originalMedia.scaled(self.MIP_MAX_DIMENSION, self.MIP_MAX_DIMENSION, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+        else:
+            self.mediaMip = self.originalMedia
+
+        self.scaleMediaSmoothly()
+
+    def clearMedia(self):
+        self.resizeTimer.stop()
+        self.setMedia(None)
+
+    def scaleMediaSmoothly(self):
+        if self.originalMedia:
+            self.setPixmap(self.originalMedia.scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+
     def resizeEvent(self, event):
         if self.originalMedia:
-            scaledMedia = self.originalMedia.scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.setPixmap(scaledMedia)
+            # Cheap scaling of the small mip while the window is being dragged, one smooth pass once it settles
+            self.setPixmap(self.mediaMip.scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.FastTransformation))
+            self.resizeTimer.start()
         
-        super().resizeEvent(event)
\ No newline at end of file
+        super().resizeEvent(event)